@@ -26,6 +26,41 @@ const generateSmartTitle = async (messages) => {
     }
 };
 
+// Helper function to read a Server-Sent Events chat stream from /chat/stream.
+// Calls onToken with the text assembled so far and resolves with the full reply.
+const readChatStream = async (response, onToken) => {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let text = '';
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        // Events are separated by a blank line
+        const events = buffer.split('\n\n');
+        buffer = events.pop();
+
+        for (const rawEvent of events) {
+            const lines = rawEvent.split('\n');
+            const event = lines.find(l => l.startsWith('event: '))?.slice(7);
+            const data = JSON.parse(lines.find(l => l.startsWith('data: '))?.slice(6) || '{}');
+
+            if (event === 'token') {
+                text += data.token;
+                onToken(text);
+            } else if (event === 'done') {
+                text = data.response;
+            } else if (event === 'error') {
+                throw new Error(data.detail);
+            }
+        }
+    }
+    return text;
+};
+
 // Helper function to format timestamp
 const formatTimestamp = (date) => {
     const now = new Date();
@@ -300,7 +335,7 @@ export default function Home() {
         setIsLoading(true);
 
         try {
-            const response = await fetch(`${API_URL}/chat/message`, {
+            const response = await fetch(`${API_URL}/chat/stream`, {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
@@ -314,8 +349,17 @@ export default function Home() {
             });
 
             if (response.ok) {
-                const data = await response.json();
-                const finalMessages = [...updatedMessages, { role: 'assistant', content: data.response }];
+                // Render tokens as they arrive
+                const reply = await readChatStream(response, (partial) => {
+                    setConversations((prev) => ({
+                        ...prev,
+                        [activeConversationId]: {
+                            ...prev[activeConversationId],
+                            messages: [...updatedMessages, { role: 'assistant', content: partial }],
+                        },
+                    }));
+                });
+                const finalMessages = [...updatedMessages, { role: 'assistant', content: reply }];
 
                 setConversations((prev) => ({
                     ...prev,
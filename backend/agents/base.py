@@ -1,56 +1,195 @@
-from typing import List, Dict, Any, Optional
-from backend.llm.groq_client import get_groq_client
-from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
+import time
+from typing import List, Dict, Any, Optional, AsyncIterator, Tuple
+from backend.llm.groq_client import get_groq_client, get_model_for_tier, TieringPolicy, TIER_FAST, TIER_FULL
+from backend.llm.scheduler import Priority
+from backend.llm.resilience import get_caller
+from backend.services.response_cache import response_cache
+from backend.services.single_flight import llm_flight
+from backend.agents.context_builder import ContextBuilder, PromptStats
+from backend.config import settings
+from langchain_core.messages import AIMessage
+
+# Sent (and saved) when neither the primary nor the fallback model answers in time
+UNAVAILABLE_REPLY = "Sorry, I'm having trouble answering right now. Please try again in a moment."
 
 class BaseAgent:
-    def __init__(self, name: str, role: str, system_prompt: str):
+    def __init__(self, name: str, role: str, system_prompt: str, context_token_budget: int = None,
+                 tiering: TieringPolicy = None):
         self.name = name
         self.role = role
         self.system_prompt = system_prompt
         self.llm = get_groq_client()
+        self.tiering = tiering or TieringPolicy()
+        self.fast_llm = get_groq_client(model=get_model_for_tier(TIER_FAST)) if self.tiering.enabled else None
+        self.fallback_llm = get_groq_client(model=settings.GROQ_FALLBACK_MODEL) if settings.GROQ_FALLBACK_MODEL else None
+        self.llm_caller = get_caller("chat") # Deadline, hedging, fallback and circuit breaker (shared by all agents)
         self.memory = [] # Simple in-memory list for now, should use DB in prod
+        self.cache = response_cache # Pluggable reply cache; set to None to disable for this agent
+        self.context_builder = ContextBuilder(context_token_budget or settings.AGENT_CONTEXT_TOKEN_BUDGET)
+        self.prompt_stats = PromptStats()
 
-    async def run(self, user_input: str, user_id: str = "guest", user_details: Dict[str, Any] = None, context: Dict[str, Any] = None) -> str:
+    async def _load_memory(self, user_id: str, user_details: Dict[str, Any] = None) -> Dict[str, Any]:
         """
-        Main execution method for the agent.
+        Retrieve Memory (Summary + Recent) for the user.
         """
         from backend.services.chat_history import chat_history
-        
-        # 1. Retrieve Memory (Summary + Recent)
+
         full_name = user_details.get("full_name") if user_details else None
         email = user_details.get("email") if user_details else None
-        
-        memory_ctx = chat_history.get_context(user_id, full_name=full_name, email=email)
-        
-        # 2. Construct Prompt
-        messages = [
-            SystemMessage(content=self.system_prompt)
-        ]
-        
-        # Inject Memory Summary
-        if memory_ctx.get("summary"):
-            messages.append(SystemMessage(content=f"MEMORY SUMMARY (Previous Context):\n{memory_ctx['summary']}"))
-            
-        # Inject Recent History (Last 10 turns)
-        for msg in memory_ctx.get("history", []):
-            if msg["sender"] == "user":
-                messages.append(HumanMessage(content=msg["content"]))
-            elif msg["sender"] == "agent":
-                messages.append(AIMessage(content=msg["content"]))
-
-        # Add generic context if provided
-        if context:
-            context_str = "\n".join([f"{k}: {v}" for k, v in context.items()])
-            messages.append(SystemMessage(content=f"Current Context:\n{context_str}"))
-
-        # Add current user input
-        messages.append(HumanMessage(content=user_input))
-
-        # 3. Invoke LLM
-        response = self.llm.invoke(messages)
-        agent_resp = response.content
-        
-        # 4. Save Interaction (and trigger async summarization)
-        chat_history.save_interaction(user_id, user_input, agent_resp)
-        
+
+        return await chat_history.aget_context(user_id, full_name=full_name, email=email)
+
+    def _build_messages(self, user_input: str, memory_ctx: Dict[str, Any], context: Dict[str, Any] = None) -> List[Any]:
+        """
+        Construct the prompt (system prompt, memory summary, recent history, context, user input)
+        within this agent's token budget, recording its size.
+        """
+        messages, stats = self.context_builder.build(
+            self.system_prompt,
+            user_input,
+            summary=memory_ctx.get("summary", ""),
+            history=memory_ctx.get("history", []),
+            context=context
+        )
+        self.prompt_stats.record(stats)
+        if stats["truncated"] or stats["history_dropped"]:
+            print(f"[{self.name}] Prompt trimmed to {stats['prompt_tokens']}/{stats['budget']} tokens "
+                  f"(dropped {stats['history_dropped']} history messages)")
+        return messages
+
+    def _cache_key(self, user_input: str, memory_ctx: Dict[str, Any], context: Dict[str, Any] = None) -> Optional[str]:
+        """
+        Cache key for this turn, or None when the reply depends on per-user state
+        (memory summary, recent history or extra context) and must not be shared.
+        """
+        if self.cache is None or context or memory_ctx.get("summary") or memory_ctx.get("history"):
+            return None
+        return self.cache.make_key(self.name, self.system_prompt, user_input)
+
+    def _select_llm(self, user_input: str, context: Dict[str, Any] = None, route_confidence: float = None) -> Tuple[Any, Dict[str, Any]]:
+        """
+        Picks the model tier for this turn. Returns the client and the reply meta to record.
+        """
+        tier, reason = self.tiering.choose(user_input, route_confidence=route_confidence, has_context=bool(context))
+        llm = self.fast_llm if tier == TIER_FAST and self.fast_llm is not None else self.llm
+        if llm is self.llm:
+            tier = TIER_FULL
+        model = getattr(llm, "model_name", None) or get_model_for_tier(tier)
+        if self.tiering.enabled:
+            print(f"[{self.name}] Model tier {tier} ({reason})")
+        return llm, {"model": model, "model_tier": tier}
+
+    def _fallback(self, messages: List[Any], reply_meta: Dict[str, Any]):
+        """
+        Fallback call on the alternate model (None if not configured); marks the reply meta when used.
+        """
+        if self.fallback_llm is None:
+            return None
+
+        async def call():
+            response = await self.fallback_llm.ainvoke(messages)
+            reply_meta.update({"model": settings.GROQ_FALLBACK_MODEL, "model_tier": "fallback"})
+            return response
+        return call
+
+    async def run(self, user_input: str, user_id: str = "guest", user_details: Dict[str, Any] = None, context: Dict[str, Any] = None,
+                  memory_ctx: Dict[str, Any] = None, persist: bool = True, route_confidence: float = None,
+                  turn_meta: Dict[str, Any] = None) -> str:
+        """
+        Main execution method for the agent.
+        Batch callers can pass a preloaded `memory_ctx` and `persist=False` to save turns themselves;
+        `turn_meta` (if given) is filled with the model, tier and latency of the reply.
+        """
+        from backend.services.chat_history import chat_history
+
+        # 1. Retrieve Memory (Summary + Recent)
+        if memory_ctx is None:
+            memory_ctx = await self._load_memory(user_id, user_details)
+
+        # 2. Serve repeated context-free prompts from the reply cache
+        started = time.perf_counter()
+        cache_key = self._cache_key(user_input, memory_ctx, context)
+        agent_resp = self.cache.get(cache_key) if cache_key else None
+        reply_meta = {"model": None, "model_tier": "cache"}
+
+        if agent_resp is None:
+            # 3. Construct Prompt
+            messages = self._build_messages(user_input, memory_ctx, context)
+
+            # 4. Invoke LLM (async so the event loop keeps serving other chats), under a deadline
+            # with fallback to the alternate model and then a canned reply.
+            # Identical prompts already in flight share one upstream call, and the meta
+            # (model, tier, fallback) of the call that actually answered.
+            llm, reply_meta = self._select_llm(user_input, context, route_confidence)
+            flight_key = llm_flight.make_key(self.name, reply_meta["model"], *[f"{m.type}:{m.content}" for m in messages])
+
+            async def call(meta=reply_meta):
+                response = await self.llm_caller.call(
+                    lambda: llm.ainvoke(messages),
+                    fallback=self._fallback(messages, meta),
+                    canned=AIMessage(content=UNAVAILABLE_REPLY),
+                    priority=Priority.CHAT
+                )
+                return response, dict(meta)
+
+            response, shared_meta = await llm_flight.do(flight_key, call)
+            reply_meta = dict(shared_meta) # copy: latency is per caller
+            agent_resp = response.content
+            if agent_resp == UNAVAILABLE_REPLY:
+                reply_meta.update({"model": None, "model_tier": "canned"})
+            if cache_key and reply_meta["model_tier"] not in ("fallback", "canned"):
+                self.cache.set(cache_key, agent_resp)
+        reply_meta["latency_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        if turn_meta is not None:
+            turn_meta.update(reply_meta)
+
+        # 5. Save Interaction (and trigger async summarization)
+        if persist:
+            await chat_history.asave_interaction(user_id, user_input, agent_resp, reply_meta)
+
         return agent_resp
+
+    async def stream(self, user_input: str, user_id: str = "guest", user_details: Dict[str, Any] = None, context: Dict[str, Any] = None,
+                     route_confidence: float = None) -> AsyncIterator[str]:
+        """
+        Streaming variant of run(): yields response tokens as the LLM generates them.
+        The assembled reply is saved once the stream completes.
+        """
+        from backend.services.chat_history import chat_history
+
+        memory_ctx = await self._load_memory(user_id, user_details)
+
+        started = time.perf_counter()
+        cache_key = self._cache_key(user_input, memory_ctx, context)
+        agent_resp = self.cache.get(cache_key) if cache_key else None
+        reply_meta = {"model": None, "model_tier": "cache"}
+
+        if agent_resp is not None:
+            yield agent_resp
+        else:
+            messages = self._build_messages(user_input, memory_ctx, context)
+            llm, reply_meta = self._select_llm(user_input, context, route_confidence)
+
+            async def tokens():
+                async for chunk in llm.astream(messages):
+                    if chunk.content:
+                        yield chunk.content
+
+            fallback = self._fallback(messages, reply_meta)
+
+            async def fallback_text():
+                return (await fallback()).content
+
+            parts = []
+            async for token in self.llm_caller.stream(tokens, fallback=fallback_text if fallback else None,
+                                                      canned=UNAVAILABLE_REPLY, priority=Priority.CHAT):
+                parts.append(token)
+                yield token
+            agent_resp = "".join(parts)
+            if agent_resp == UNAVAILABLE_REPLY:
+                reply_meta.update({"model": None, "model_tier": "canned"})
+            if cache_key and reply_meta["model_tier"] not in ("fallback", "canned"):
+                self.cache.set(cache_key, agent_resp)
+        reply_meta["latency_ms"] = round((time.perf_counter() - started) * 1000, 1)
+
+        await chat_history.asave_interaction(user_id, user_input, agent_resp, reply_meta)
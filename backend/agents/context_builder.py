@@ -0,0 +1,131 @@
+"""
+Context Builder
+Packs the system prompt, memory summary, recent history and turn context into a
+per-agent token budget so long contexts don't bloat prompts and slow generation.
+"""
+from typing import Any, Dict, List, Tuple
+from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
+
+
+def count_tokens(text: str) -> int:
+    """
+    Cheap token estimate (~4 characters per token for English / Llama tokenizers).
+    Good enough for budgeting; avoids shipping a tokenizer.
+    """
+    return (len(text) + 3) // 4 if text else 0
+
+
+def truncate_to_tokens(text: str, max_tokens: int, keep: str = "head") -> str:
+    """Cuts text to roughly max_tokens, keeping its start ("head") or end ("tail")."""
+    if count_tokens(text) <= max_tokens:
+        return text
+    if max_tokens <= 0:
+        return ""
+    max_chars = max_tokens * 4 - 3
+    if keep == "tail":
+        return "..." + text[-max_chars:]
+    return text[:max_chars] + "..."
+
+
+class ContextBuilder:
+    """
+    Budget order: system prompt and user input are always kept; the turn context
+    and the summary get up to their share of what's left (truncated if longer);
+    the rest goes to history, newest first, so the oldest messages drop first.
+    """
+
+    def __init__(self, max_tokens: int, context_share: float = 0.5, summary_share: float = 0.25):
+        self.max_tokens = max_tokens
+        self.context_share = context_share
+        self.summary_share = summary_share
+
+    def build(self, system_prompt: str, user_input: str, summary: str = "", history: List[Dict[str, str]] = None,
+              context: Dict[str, Any] = None) -> Tuple[List[Any], Dict[str, Any]]:
+        history = history or []
+        stats = {
+            "budget": self.max_tokens,
+            "system_tokens": count_tokens(system_prompt),
+            "input_tokens": count_tokens(user_input),
+            "summary_tokens": 0,
+            "context_tokens": 0,
+            "history_tokens": 0,
+            "history_kept": 0,
+            "history_dropped": 0,
+            "truncated": False
+        }
+        remaining = self.max_tokens - stats["system_tokens"] - stats["input_tokens"]
+
+        # Turn context (e.g. product search results)
+        context_str = ""
+        if context:
+            context_str = "\n".join([f"{k}: {v}" for k, v in context.items()])
+            allowed = int(max(remaining, 0) * self.context_share)
+            if count_tokens(context_str) > allowed:
+                context_str = truncate_to_tokens(context_str, allowed)
+                stats["truncated"] = True
+            stats["context_tokens"] = count_tokens(context_str)
+            remaining -= stats["context_tokens"]
+
+        # Memory summary (keep its most recent part)
+        if summary:
+            allowed = int(max(remaining, 0) * self.summary_share)
+            if count_tokens(summary) > allowed:
+                summary = truncate_to_tokens(summary, allowed, keep="tail")
+                stats["truncated"] = True
+            stats["summary_tokens"] = count_tokens(summary)
+            remaining -= stats["summary_tokens"]
+
+        # Recent history, newest first, until the budget runs out
+        kept = []
+        for msg in reversed(history):
+            cost = count_tokens(msg["content"])
+            if cost > remaining:
+                break
+            kept.append(msg)
+            remaining -= cost
+            stats["history_tokens"] += cost
+        kept.reverse()
+        stats["history_kept"] = len(kept)
+        stats["history_dropped"] = len(history) - len(kept)
+
+        messages = [SystemMessage(content=system_prompt)]
+        if summary:
+            messages.append(SystemMessage(content=f"MEMORY SUMMARY (Previous Context):\n{summary}"))
+        for msg in kept:
+            if msg["sender"] == "user":
+                messages.append(HumanMessage(content=msg["content"]))
+            elif msg["sender"] == "agent":
+                messages.append(AIMessage(content=msg["content"]))
+        if context_str:
+            messages.append(SystemMessage(content=f"Current Context:\n{context_str}"))
+        messages.append(HumanMessage(content=user_input))
+
+        stats["prompt_tokens"] = sum(stats[k] for k in ("system_tokens", "input_tokens", "summary_tokens", "context_tokens", "history_tokens"))
+        return messages, stats
+
+
+class PromptStats:
+    """Running prompt-size counters for one agent."""
+
+    def __init__(self):
+        self.turns = 0
+        self.prompt_tokens = 0
+        self.max_prompt_tokens = 0
+        self.history_dropped = 0
+        self.truncated_turns = 0
+
+    def record(self, stats: Dict[str, Any]):
+        self.turns += 1
+        self.prompt_tokens += stats["prompt_tokens"]
+        self.max_prompt_tokens = max(self.max_prompt_tokens, stats["prompt_tokens"])
+        self.history_dropped += stats["history_dropped"]
+        self.truncated_turns += int(stats["truncated"])
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "turns": self.turns,
+            "avg_prompt_tokens": round(self.prompt_tokens / self.turns, 1) if self.turns else 0.0,
+            "max_prompt_tokens": self.max_prompt_tokens,
+            "history_messages_dropped": self.history_dropped,
+            "truncated_turns": self.truncated_turns
+        }
@@ -2,9 +2,14 @@
 Market Intelligence Agent
 Uses SerpAPI to provide market insights, competitor analysis, and trend forecasting.
 """
+import asyncio
 from typing import Dict, Any, List
 from backend.services.serpapi_service import serpapi_service
 from backend.llm.groq_client import get_groq_client
+from backend.llm.scheduler import Priority
+from backend.llm.resilience import get_caller
+from backend.config import settings
+from backend.services.single_flight import llm_flight
 import logging
 
 logger = logging.getLogger(__name__)
@@ -21,15 +26,26 @@ class MarketIntelligenceAgent:
         self.role = "market_intelligence"
         self.serpapi = serpapi_service
         self.llm = get_groq_client(temperature=0.7)
+        self.fallback_llm = get_groq_client(model=settings.GROQ_FALLBACK_MODEL, temperature=0.7) if settings.GROQ_FALLBACK_MODEL else None
+        self.llm_caller = get_caller("report")
     
-    def _get_ai_response(self, prompt: str) -> str:
+    async def _get_ai_response(self, prompt: str) -> str:
         """Helper method to get AI response using LangChain"""
         try:
             messages = [
                 {"role": "system", "content": self.get_system_prompt()},
                 {"role": "user", "content": prompt}
             ]
-            response = self.llm.invoke(messages)
+            # Identical concurrent reports (e.g. admins refreshing) share one LLM call
+            key = llm_flight.make_key(self.name, prompt)
+            fallback = None
+            if self.fallback_llm is not None:
+                fallback = lambda: self.fallback_llm.ainvoke(messages)
+            response = await llm_flight.do(key, lambda: self.llm_caller.call(
+                lambda: self.llm.ainvoke(messages),
+                fallback=fallback,
+                priority=Priority.REPORT
+            ))
             return response.content
         except Exception as e:
             logger.error(f"AI response error: {str(e)}")
@@ -73,19 +89,22 @@ Format your responses in a business-friendly manner with clear recommendations."
         """
         try:
             # Get market trends
-            trends = self.serpapi.get_market_trends(
+            trends = await asyncio.to_thread(
+                self.serpapi.get_market_trends,
                 category=product_category,
                 timeframe="today 3-m"
             )
             
             # Search for products in this category
-            products = self.serpapi.search_products(
+            products = await asyncio.to_thread(
+                self.serpapi.search_products,
                 query=f"trending {product_category} 2024",
                 num_results=20
             )
             
             # Get recent news
-            news = self.serpapi.search_news(
+            news = await asyncio.to_thread(
+                self.serpapi.search_news,
                 query=f"{product_category} fashion trends",
                 num_results=5
             )
@@ -121,7 +140,7 @@ Provide:
 
 Be specific and data-driven."""
             
-            ai_response = self._get_ai_response(prompt)
+            ai_response = await self._get_ai_response(prompt)
             
             return {
                 "category": product_category,
@@ -158,13 +177,15 @@ Be specific and data-driven."""
         """
         try:
             # Get competitor data
-            competitor_data = self.serpapi.analyze_competitors(
+            competitor_data = await asyncio.to_thread(
+                self.serpapi.analyze_competitors,
                 brand_name=competitor_name,
                 category="fashion retail"
             )
             
             # Search for competitor products
-            products = self.serpapi.search_products(
+            products = await asyncio.to_thread(
+                self.serpapi.search_products,
                 query=f"{competitor_name} products",
                 num_results=15
             )
@@ -195,7 +216,7 @@ Provide:
 
 Be strategic and actionable."""
             
-            ai_response = self._get_ai_response(prompt)
+            ai_response = await self._get_ai_response(prompt)
             
             return {
                 "competitor": competitor_name,
@@ -231,7 +252,7 @@ Be strategic and actionable."""
         """
         try:
             # Get price insights
-            price_data = self.serpapi.get_price_insights(product_name)
+            price_data = await asyncio.to_thread(self.serpapi.get_price_insights, product_name)
             
             # Get AI recommendation
             data_summary = f"""
@@ -256,7 +277,7 @@ Provide:
 
 Be specific with numbers."""
             
-            ai_response = self._get_ai_response(prompt)
+            ai_response = await self._get_ai_response(prompt)
             
             return {
                 "product": product_name,
@@ -287,13 +308,15 @@ Be specific with numbers."""
         """
         try:
             # Get fashion trends
-            trends = self.serpapi.get_market_trends(
+            trends = await asyncio.to_thread(
+                self.serpapi.get_market_trends,
                 category="fashion trends",
                 timeframe=timeframe
             )
             
             # Get news
-            news = self.serpapi.search_news(
+            news = await asyncio.to_thread(
+                self.serpapi.search_news,
                 query="fashion trends 2024",
                 num_results=10
             )
@@ -322,7 +345,7 @@ Provide:
 
 Be trend-forward and actionable."""
             
-            ai_response = self._get_ai_response(prompt)
+            ai_response = await self._get_ai_response(prompt)
             
             return {
                 "timeframe": timeframe,
@@ -1,4 +1,9 @@
+import logging
+from typing import Any, AsyncIterator, Dict
 from backend.agents.base import BaseAgent
+from backend.config import settings
+
+logger = logging.getLogger(__name__)
 
 SALES_SYSTEM_PROMPT = """
 You are a friendly fashion assistant helping customers find what they're looking for. Think of yourself as a helpful friend who knows fashion, not a salesperson.
@@ -78,3 +83,40 @@ class SalesAgent(BaseAgent):
             role="Sales and Recommendations",
             system_prompt=SALES_SYSTEM_PROMPT
         )
+
+    async def _catalog_context(self, user_input: str, context: Dict[str, Any] = None) -> Dict[str, Any]:
+        """
+        Adds the catalog's best full-text matches for the message to the turn context
+        (opt-in via SALES_CATALOG_MATCHES). A turn with matches has extra context, so it
+        bypasses the reply cache and uses the full model; without matches it is unchanged.
+        """
+        if not settings.SALES_CATALOG_MATCHES:
+            return context
+        from backend.database import AsyncSessionLocal
+        from backend.services.product_search import product_search
+
+        try:
+            async with AsyncSessionLocal() as db:
+                result = await product_search.search(db, user_input, limit=settings.SALES_CATALOG_MATCHES,
+                                                     available_only=True, prefix=False)
+        except Exception as e:
+            logger.warning(f"[SalesAgent] Catalog search failed: {e}")
+            return context
+        if not result["items"]:
+            return context
+        matches = "\n".join(
+            f"- {p['name']} ({p['category']}, ${p['price']}, {p['stock_quantity']} in stock): {p['snippet']}"
+            for p in result["items"]
+        )
+        return {**(context or {}), "Catalog Matches": matches}
+
+    async def run(self, user_input: str, user_id: str = "guest", user_details: Dict[str, Any] = None,
+                  context: Dict[str, Any] = None, **kwargs) -> str:
+        context = await self._catalog_context(user_input, context)
+        return await super().run(user_input, user_id=user_id, user_details=user_details, context=context, **kwargs)
+
+    async def stream(self, user_input: str, user_id: str = "guest", user_details: Dict[str, Any] = None,
+                     context: Dict[str, Any] = None, **kwargs) -> AsyncIterator[str]:
+        context = await self._catalog_context(user_input, context)
+        async for token in super().stream(user_input, user_id=user_id, user_details=user_details, context=context, **kwargs):
+            yield token
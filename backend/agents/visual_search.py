@@ -1,3 +1,4 @@
+from typing import AsyncIterator
 from backend.agents.base import BaseAgent
 from backend.services.image_search import image_search_service
 
@@ -17,23 +18,38 @@ class VisualSearchAgent(BaseAgent):
             system_prompt=VISUAL_SEARCH_SYSTEM_PROMPT
         )
 
-    async def run_with_image(self, user_text: str, image_url: str, user_id: str = "guest", user_details: dict = None) -> str:
+    async def _image_context(self, image_url: str) -> dict:
         """
-        Specialized run method for image inputs.
+        Runs the image search and formats the results as agent context.
         """
         # 1. Perform image search
-        results = image_search_service.search_by_image(image_url)
-        
+        results = await image_search_service.search_by_image(image_url)
+
         # 2. Format results for the LLM
         results_str = "\n".join([f"- {item['name']} (${item['price']}) - ImageURL: {item['image_url']}" for item in results])
-        
+
         # 3. Create context
-        context = {
+        return {
             "User Image URL": image_url,
             "Visual Search Results": results_str,
             "Instruction": "You MUST display the product images using Markdown: ![Product Name](ImageURL). Do not just list them."
         }
-        
+
+    async def run_with_image(self, user_text: str, image_url: str, user_id: str = "guest", user_details: dict = None, **run_kwargs) -> str:
+        """
+        Specialized run method for image inputs.
+        """
+        context = await self._image_context(image_url)
+
         # 4. Invoke LLM
-        response = await self.run(user_text or "Find something like this.", context=context, user_id=user_id, user_details=user_details)
+        response = await self.run(user_text or "Find something like this.", context=context, user_id=user_id, user_details=user_details, **run_kwargs)
         return response
+
+    async def stream_with_image(self, user_text: str, image_url: str, user_id: str = "guest", user_details: dict = None) -> AsyncIterator[str]:
+        """
+        Streaming variant of run_with_image().
+        """
+        context = await self._image_context(image_url)
+
+        async for token in self.stream(user_text or "Find something like this.", context=context, user_id=user_id, user_details=user_details):
+            yield token
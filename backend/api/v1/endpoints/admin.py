@@ -1,46 +1,95 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List, Dict, Any
-from backend.database import get_db
+from datetime import datetime
+from fastapi import APIRouter, Body, Depends, HTTPException, Query
+from sqlalchemy import or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+from typing import List, Dict, Any, Optional
+from backend.api.v1.pagination import MAX_PAGE_SIZE, keyset_page, page_result
+from backend.database import get_async_db, get_async_read_db
 from backend.models import Conversation, Message, User, Order
 
 router = APIRouter()
 
 @router.get("/conversations")
-def get_conversations(skip: int = 0, limit: int = 50, db: Session = Depends(get_db)):
+async def get_conversations(
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    platform: Optional[str] = None,
+    customer_id: Optional[int] = None,
+    customer: Optional[str] = Query(None, description="Customer phone number or email"),
+    since: Optional[datetime] = Query(None, description="Last active at or after"),
+    until: Optional[datetime] = Query(None, description="Last active before"),
+    db: AsyncSession = Depends(get_async_read_db)
+):
     """
-    Get all conversations with summaries for the admin dashboard.
+    Get conversations with summaries for the admin dashboard, most recently active first.
+    Pass the returned `next_cursor` back as `cursor` for the next page.
+    One statement per page: the customer and the last message's sender are joined
+    in, and only the columns the list shows are selected.
     """
-    conversations = db.query(Conversation).order_by(Conversation.last_message_at.desc()).offset(skip).limit(limit).all()
+    last_message = aliased(Message)
+    stmt = (
+        select(
+            Conversation.id,
+            Conversation.platform,
+            Conversation.summary,
+            Conversation.last_message_at,
+            Conversation.message_count,
+            Conversation.last_message_id,
+            Conversation.summarized_through_id,
+            User.full_name,
+            User.phone_number,
+            User.email,
+            last_message.sender.label("last_sender"),
+        )
+        .outerjoin(User, User.id == Conversation.customer_id)
+        .outerjoin(last_message, last_message.id == Conversation.last_message_id)
+    )
+    if platform:
+        stmt = stmt.where(Conversation.platform == platform)
+    if customer_id is not None:
+        stmt = stmt.where(Conversation.customer_id == customer_id)
+    if customer:
+        stmt = stmt.where(or_(User.phone_number == customer, User.email == customer))
+    if since:
+        stmt = stmt.where(Conversation.last_message_at >= since)
+    if until:
+        stmt = stmt.where(Conversation.last_message_at < until)
+    stmt = keyset_page(stmt, Conversation.last_message_at, Conversation.id, cursor, limit, db.bind.dialect.name)
+    rows, next_cursor = page_result((await db.execute(stmt)).all(), limit, entities=False)
     
     results = []
-    for conv in conversations:
-        # Get customer details
-        customer = db.query(User).filter(User.id == conv.customer_id).first()
-        customer_name = customer.full_name if customer else "Unknown"
-        customer_contact = customer.phone_number or customer.email or "N/A"
+    for row in rows:
+        customer_name = row.full_name or "Unknown"
+        customer_contact = row.phone_number or row.email or "N/A"
         
         results.append({
-            "id": conv.id,
+            "id": row.id,
             "customer": f"{customer_name} ({customer_contact})",
-            "platform": conv.platform,
-            "summary": conv.summary or "No summary available yet.",
-            "last_active": conv.last_message_at,
-            "link": f"/conversations/{conv.id}" # For frontend routing if needed
+            "platform": row.platform,
+            "summary": row.summary or "No summary available yet.",
+            "last_active": row.last_message_at,
+            "message_count": row.message_count,
+            "last_sender": row.last_sender,
+            "last_message_id": row.last_message_id,
+            "summarized_through_id": row.summarized_through_id,
+            "link": f"/conversations/{row.id}" # For frontend routing if needed
         })
     
-    return results
+    return {"items": results, "next_cursor": next_cursor}
 
 @router.get("/conversations/{conversation_id}")
-def get_conversation_details(conversation_id: int, db: Session = Depends(get_db)):
+async def get_conversation_details(conversation_id: int, db: AsyncSession = Depends(get_async_read_db)):
     """
     Get messages for a specific conversation.
     """
-    conv = db.query(Conversation).filter(Conversation.id == conversation_id).first()
+    conv = await db.get(Conversation, conversation_id)
     if not conv:
         raise HTTPException(status_code=404, detail="Conversation not found")
         
-    messages = db.query(Message).filter(Message.conversation_id == conv.id).order_by(Message.timestamp.asc()).all()
+    messages = (await db.execute(
+        select(Message).where(Message.conversation_id == conv.id).order_by(Message.timestamp.asc(), Message.id.asc())
+    )).scalars().all()
     
     return {
         "id": conv.id,
@@ -54,24 +103,228 @@ def get_conversation_details(conversation_id: int, db: Session = Depends(get_db)
         ]
     }
 
+@router.put("/conversations/{conversation_id}/summary")
+async def update_conversation_summary(conversation_id: int, summary: str = Body(..., embed=True), db: AsyncSession = Depends(get_async_db)):
+    """
+    Edit a conversation's memory summary (e.g. to remove wrong or sensitive details).
+    """
+    from backend.services.chat_history import chat_history
+    conv = await db.get(Conversation, conversation_id)
+    if not conv:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    conv.summary = summary
+    await db.commit()
+    customer = await db.get(User, conv.customer_id) if conv.customer_id else None
+    if customer:
+        chat_history.invalidate_context(customer.phone_number, customer.email)
+    return {"id": conv.id, "summary": conv.summary}
+
+@router.delete("/context-cache/{identifier}")
+def invalidate_context_cache(identifier: str):
+    """
+    Drop the cached conversation context for one customer (phone number or email).
+    """
+    from backend.services.chat_history import chat_history
+    chat_history.invalidate_context(identifier)
+    return {"status": "invalidated", "identifier": identifier}
+
+@router.delete("/context-cache")
+def clear_context_cache():
+    """
+    Drop all cached conversation contexts (e.g. after bulk edits in the database).
+    """
+    from backend.services.chat_history import chat_history
+    if chat_history.context_cache is not None:
+        chat_history.context_cache.clear()
+    return {"status": "cleared"}
+
 @router.get("/orders")
-def get_orders(skip: int = 0, limit: int = 50, db: Session = Depends(get_db)):
+async def get_orders(
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    status: Optional[str] = None,
+    customer_id: Optional[int] = None,
+    since: Optional[datetime] = Query(None, description="Created at or after"),
+    until: Optional[datetime] = Query(None, description="Created before"),
+    db: AsyncSession = Depends(get_async_read_db)
+):
     """
-    Get all orders for admin verification.
+    Get orders for admin verification, newest first.
+    Pass the returned `next_cursor` back as `cursor` for the next page.
     """
-    orders = db.query(models.Order).order_by(models.Order.created_at.desc()).offset(skip).limit(limit).all()
-    return orders
+    stmt = select(Order)
+    if status:
+        stmt = stmt.where(Order.status == status)
+    if customer_id is not None:
+        stmt = stmt.where(Order.customer_id == customer_id)
+    if since:
+        stmt = stmt.where(Order.created_at >= since)
+    if until:
+        stmt = stmt.where(Order.created_at < until)
+    stmt = keyset_page(stmt, Order.created_at, Order.id, cursor, limit, db.bind.dialect.name)
+    orders, next_cursor = page_result((await db.execute(stmt)).all(), limit)
+    return {"items": orders, "next_cursor": next_cursor}
 
 @router.post("/orders/{order_id}/verify")
-def verify_order(order_id: int, status: str, db: Session = Depends(get_db)):
+async def verify_order(order_id: int, status: str, db: AsyncSession = Depends(get_async_db)):
     """
     Update order status (e.g. to 'paid', 'shipped', 'cancelled').
     """
-    order = db.query(models.Order).filter(models.Order.id == order_id).first()
+    order = await db.get(Order, order_id)
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
     
     order.status = status
-    db.commit()
-    db.refresh(order)
+    await db.commit()
+    await db.refresh(order)
     return order
+
+@router.get("/metrics/response-cache")
+def get_response_cache_stats():
+    """
+    Hit/miss counters for the agent reply cache.
+    """
+    from backend.services.response_cache import response_cache
+    if response_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **response_cache.stats()}
+
+@router.get("/metrics/single-flight")
+def get_single_flight_stats():
+    """
+    How many LLM / SerpAPI calls were deduplicated by request coalescing.
+    """
+    from backend.services.single_flight import llm_flight, serpapi_flight
+    return {"llm": llm_flight.stats(), "serpapi": serpapi_flight.stats()}
+
+@router.get("/metrics/llm-scheduler")
+def get_llm_scheduler_stats():
+    """
+    LLM dispatch queue depth, in-flight calls and wait times per priority.
+    """
+    from backend.llm.scheduler import llm_scheduler
+    return llm_scheduler.stats()
+
+@router.get("/metrics/message-writer")
+def get_message_writer_stats():
+    """
+    Write-behind chat persistence: queue depth, batch sizes, flush failures and journal recovery.
+    """
+    from backend.services.chat_history import chat_history
+    if chat_history.writer is None:
+        return {"enabled": False}
+    return {"enabled": True, **chat_history.writer.stats()}
+
+@router.get("/metrics/context-cache")
+def get_context_cache_stats():
+    """
+    Conversation context cache: hit rate, fills, write-throughs, invalidations and size.
+    """
+    from backend.services.chat_history import chat_history
+    if chat_history.context_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **chat_history.context_cache.stats()}
+
+@router.get("/metrics/db-pool")
+def get_db_pool_stats():
+    """
+    Database connection pool utilization for the sync and async engines (and the effective SQLite pragmas),
+    plus read-replica routing.
+    """
+    from backend.database import pool_monitor, async_pool_monitor, async_replica_pool_monitor, replica_router
+    return {
+        **pool_monitor.stats(),
+        "async": async_pool_monitor.stats(),
+        "replica": async_replica_pool_monitor.stats() if async_replica_pool_monitor else None,
+        "routing": replica_router.stats()
+    }
+
+@router.get("/metrics/sql")
+def get_sql_stats():
+    """
+    SQL statements and DB time per endpoint and per agent turn, most DB time first
+    (db_share = DB time / wall time), plus slow-query and statement-heavy counts.
+    """
+    from backend.database import sql_instrumentation
+    return sql_instrumentation.stats()
+
+@router.get("/metrics/enrichment")
+def get_enrichment_stats():
+    """
+    Product enrichment queue: jobs by status, completions, retries, failures and average time per step.
+    """
+    from backend.services.product_enrichment import enrichment_queue
+    return enrichment_queue.stats()
+
+@router.get("/metrics/search")
+def get_product_search_stats():
+    """
+    Product full-text search: searches run, all-terms queries that fell back to any term, average latency.
+    """
+    from backend.services.product_search import product_search
+    return product_search.stats()
+
+@router.api_route("/enrichment/drain", methods=["GET", "POST"])
+def drain_enrichment_queue(max_seconds: float = Query(20, gt=0, le=300)):
+    """
+    Processes due product enrichment jobs for up to `max_seconds`, for deployments
+    without worker threads (ENRICHMENT_WORKERS=0, the default on serverless).
+    Call it from a cron job (GET is accepted for Vercel Cron).
+    """
+    from backend.services.product_enrichment import enrichment_queue
+    return enrichment_queue.drain(max_seconds)
+
+@router.get("/metrics/summaries")
+def get_summary_worker_stats():
+    """
+    Background summarization: pending/retrying conversations, LLM summaries run and messages folded.
+    """
+    from backend.services.chat_history import chat_history
+    return chat_history.summaries.stats()
+
+@router.get("/metrics/llm-resilience")
+def get_llm_resilience_stats():
+    """
+    Per call kind (chat, summary, vision, report, router): circuit state, latency p50/p95,
+    timeouts, hedges, fallbacks and canned replies.
+    """
+    from backend.llm.resilience import all_caller_stats
+    return all_caller_stats()
+
+@router.get("/metrics/prompt-tokens")
+def get_prompt_token_stats():
+    """
+    Prompt size statistics per agent (estimated tokens after budgeting).
+    """
+    from backend.services.agent_router import AGENTS_BY_INTENT
+    return {
+        agent.name: {"budget": agent.context_builder.max_tokens, **agent.prompt_stats.summary()}
+        for agent in AGENTS_BY_INTENT.values()
+    }
+
+@router.get("/metrics/model-tiers")
+async def get_model_tier_stats(db: AsyncSession = Depends(get_async_read_db)):
+    """
+    Agent reply count and latency per model tier / model, for comparing cost and speed.
+    """
+    from sqlalchemy import func
+    rows = (await db.execute(select(
+        Message.model_tier,
+        Message.model,
+        func.count(Message.id),
+        func.avg(Message.latency_ms),
+        func.max(Message.latency_ms)
+    ).where(
+        Message.sender == "agent",
+        Message.model_tier.isnot(None)
+    ).group_by(Message.model_tier, Message.model))).all()
+
+    return [
+        {
+            "tier": tier,
+            "model": model,
+            "replies": count,
+            "avg_latency_ms": round(avg_ms or 0, 1),
+            "max_latency_ms": round(max_ms or 0, 1)
+        } for tier, model, count, avg_ms, max_ms in rows
+    ]
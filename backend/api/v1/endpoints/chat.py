@@ -1,6 +1,10 @@
+import json
+from typing import List
 from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
-from backend.services.agent_router import route_and_process
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from backend.config import settings
+from backend.services.agent_router import route_and_process, route_and_stream
 
 router = APIRouter()
 
@@ -14,6 +18,13 @@ class ChatRequest(BaseModel):
 class ChatResponse(BaseModel):
     response: str
 
+class BatchChatRequest(BaseModel):
+    requests: List[ChatRequest]
+    concurrency: int | None = Field(None, ge=1, le=settings.BATCH_CHAT_CONCURRENCY) # default: BATCH_CHAT_CONCURRENCY
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
 @router.post("/message", response_model=ChatResponse)
 async def chat_message(request: ChatRequest):
     """
@@ -33,3 +44,50 @@ async def chat_message(request: ChatRequest):
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Agent Error: {str(e)}")
+
+@router.post("/stream")
+async def chat_stream(request: ChatRequest):
+    """
+    Streaming chat endpoint for Web UI (Server-Sent Events).
+    Emits `token` events as the agent generates, then a single `done` event
+    carrying the full response (or an `error` event).
+    """
+    user_details = {"full_name": request.user_name, "email": request.email}
+
+    async def event_stream():
+        parts = []
+        try:
+            async for token in route_and_stream(
+                request.message,
+                request.image_url,
+                user_id=request.user_id or "guest",
+                user_details=user_details
+            ):
+                parts.append(token)
+                yield _sse("token", {"token": token})
+            yield _sse("done", {"response": "".join(parts)})
+        except Exception as e:
+            import traceback
+            traceback.print_exc()
+            yield _sse("error", {"detail": f"Agent Error: {str(e)}"})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.post("/batch")
+async def chat_batch(request: BatchChatRequest):
+    """
+    Bulk chat endpoint for offline QA, backfills and campaign replies.
+    Streams one NDJSON line per request as it completes (with timing),
+    then a final summary line.
+    """
+    from backend.services.batch_chat import process_batch
+
+    async def ndjson_stream():
+        async for result in process_batch(request.requests, request.concurrency):
+            yield json.dumps(result, default=str) + "\n"
+
+    return StreamingResponse(ndjson_stream(), media_type="application/x-ndjson")
@@ -1,6 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from backend.database import get_db
+import asyncio
+import os
+import uuid
+from datetime import datetime
+from fastapi import APIRouter, Depends, File, HTTPException, Query, UploadFile, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from backend.api.v1.pagination import MAX_PAGE_SIZE, keyset_page, page_result
+from backend.config import settings
+from backend.database import get_async_db, get_async_read_db
 from backend import models
 from pydantic import BaseModel
 from typing import Optional, List
@@ -8,6 +15,7 @@ from typing import Optional, List
 router = APIRouter()
 
 class ProductBase(BaseModel):
+    sku: Optional[str] = None
     name: str
     description: str
     price: float
@@ -24,39 +32,238 @@ class Product(ProductBase):
     id: int
     is_available: bool
     visual_description: Optional[str] = None
+    enrichment_status: str = models.EnrichmentStatus.DONE.value # pending / processing / done / failed
 
     class Config:
         orm_mode = True
 
-@router.get("/", response_model=List[Product])
-def read_products(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    products = db.query(models.Product).offset(skip).limit(limit).all()
-    return products
+class EnrichmentJobStatus(BaseModel):
+    id: int
+    status: str
+    step: Optional[str] = None # last step completed
+    attempts: int
+    run_after: datetime
+    last_error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        orm_mode = True
+
+class ProductEnrichment(BaseModel):
+    product_id: int
+    enrichment_status: str
+    visual_description: Optional[str] = None
+    embedding_id: Optional[str] = None
+    job: Optional[EnrichmentJobStatus] = None # latest job
+
+class ProductPage(BaseModel):
+    items: List[Product]
+    next_cursor: Optional[str] = None # pass back as `cursor` for the next page
+
+class ProductSearchHit(BaseModel):
+    id: int
+    sku: Optional[str] = None
+    name: str
+    category: Optional[str] = None
+    price: Optional[float] = None
+    image_url: Optional[str] = None
+    stock_quantity: Optional[int] = None
+    is_available: bool
+    score: float # higher is better; only comparable within one search
+    snippet: Optional[str] = None # best-matching passage, matched terms in **bold**
+
+class ProductSearchResults(BaseModel):
+    query: str
+    terms: List[str]
+    matched: Optional[str] = None # "all" terms, or "any" when no product had them all
+    items: List[ProductSearchHit]
+
+@router.get("/", response_model=ProductPage)
+async def read_products(
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    category: Optional[str] = None,
+    available: Optional[bool] = None,
+    since: Optional[datetime] = Query(None, description="Created at or after"),
+    until: Optional[datetime] = Query(None, description="Created before"),
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    stmt = select(models.Product)
+    if category:
+        stmt = stmt.where(models.Product.category == category)
+    if available is not None:
+        stmt = stmt.where(models.Product.is_available == available)
+    if since:
+        stmt = stmt.where(models.Product.created_at >= since)
+    if until:
+        stmt = stmt.where(models.Product.created_at < until)
+    stmt = keyset_page(stmt, models.Product.created_at, models.Product.id, cursor, limit, db.bind.dialect.name)
+    products, next_cursor = page_result((await db.execute(stmt)).all(), limit)
+    return {"items": products, "next_cursor": next_cursor}
+
+@router.get("/search", response_model=ProductSearchResults)
+async def search_products(
+    q: str = Query(..., min_length=1, max_length=500),
+    limit: int = Query(20, ge=1, le=50),
+    category: Optional[str] = None,
+    available: bool = Query(False, description="Only products that are available"),
+    prefix: bool = Query(True, description="Last term matches as a prefix (search-as-you-type)"),
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    """
+    Full-text search over name, category, description and visual description,
+    ranked by relevance (BM25 on SQLite), with a highlighted snippet per hit.
+    """
+    from sqlalchemy.exc import DBAPIError
+    from backend.services.product_search import product_search
+
+    try:
+        return await product_search.search(db, q, limit=limit, category=category, available_only=available, prefix=prefix)
+    except DBAPIError as e:
+        # Typically a database that predates the index: python migrate.py creates it
+        raise HTTPException(status_code=503, detail=f"Product search unavailable: {e.orig}")
 
 @router.post("/", response_model=Product)
-def create_product(product: ProductCreate, db: Session = Depends(get_db)):
-    # 1. Generate Visual Description if image provided
-    visual_desc = ""
-    if product.image_url:
-        from backend.services.vision_service import vision_service
-        # Background task ideally, but doing sync for simplicity per prototype
-        print(f"Products Endpoint received image_url: {product.image_url}")
-        visual_desc = vision_service.analyze_image(product.image_url)
-        print(f"Generated Description: {visual_desc}")
-    
-    # 2. Create Product
-    product_data = product.dict()
-    db_product = models.Product(**product_data)
-    db_product.visual_description = visual_desc
-    
+async def create_product(product: ProductCreate, db: AsyncSession = Depends(get_async_db)):
+    """
+    Creates the product and returns right away with enrichment_status "pending";
+    the vision description, embedding and indexing run on the enrichment queue.
+    Poll GET /products/{id}/enrichment for progress.
+    """
+    from backend.services.product_enrichment import enrichment_queue, new_job
+
+    db_product = models.Product(**product.dict(), enrichment_status=models.EnrichmentStatus.PENDING)
     db.add(db_product)
-    db.commit()
-    db.refresh(db_product)
+    await db.flush()
+    db.add(new_job(db_product.id)) # same transaction: no product without its job
+    await db.commit()
+    await db.refresh(db_product)
+    enrichment_queue.notify()
     return db_product
 
+@router.post("/import", status_code=status.HTTP_202_ACCEPTED)
+async def import_catalog(
+    file: UploadFile = File(..., description="CSV with a header row, or JSON Lines (.jsonl / .ndjson)"),
+    mode: str = Query("skip", pattern="^(skip|update)$", description="What a duplicate SKU / name does"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Bulk catalog import. The upload is saved and imported in the background in
+    batches; poll GET /products/imports/{id} for progress and per-row errors.
+    """
+    from backend.services.catalog_import import catalog_importer, detect_format, import_summary
+
+    try:
+        detect_format(file.filename)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    os.makedirs(settings.CATALOG_IMPORT_DIR, exist_ok=True)
+    path = os.path.join(settings.CATALOG_IMPORT_DIR, f"{uuid.uuid4().hex}-{os.path.basename(file.filename)}")
+    size = 0
+    with open(path, "wb") as out:
+        while chunk := await file.read(1 << 20):
+            size += len(chunk)
+            if size > settings.CATALOG_IMPORT_MAX_MB * 1_048_576:
+                out.close()
+                os.remove(path)
+                raise HTTPException(status_code=413, detail=f"Catalog larger than {settings.CATALOG_IMPORT_MAX_MB} MB")
+            out.write(chunk)
+
+    import_id = await asyncio.to_thread(catalog_importer.create, file.filename, path, mode)
+    catalog_importer.start(import_id)
+    return import_summary(await db.get(models.CatalogImport, import_id))
+
+@router.get("/imports/{import_id}")
+async def get_catalog_import(
+    import_id: int,
+    errors_limit: int = Query(50, ge=0, le=1000),
+    errors_after: int = Query(0, ge=0, description="Row number to list errors after"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Progress of a catalog import (counts, fraction of the file read) and its row errors, in row order.
+    """
+    from backend.services.catalog_import import import_summary
+
+    imp = await db.get(models.CatalogImport, import_id)
+    if imp is None:
+        raise HTTPException(status_code=404, detail="Import not found")
+    errors = (await db.execute(
+        select(models.CatalogImportError)
+        .where(models.CatalogImportError.import_id == import_id, models.CatalogImportError.row_number > errors_after)
+        .order_by(models.CatalogImportError.row_number)
+        .limit(errors_limit)
+    )).scalars().all()
+    return import_summary(imp, errors)
+
+@router.post("/imports/{import_id}/resume", status_code=status.HTTP_202_ACCEPTED)
+async def resume_catalog_import(import_id: int, db: AsyncSession = Depends(get_async_db)):
+    """
+    Continues an interrupted or failed import after its last committed row.
+    """
+    from backend.services.catalog_import import catalog_importer, import_summary
+
+    try:
+        await asyncio.to_thread(catalog_importer.check_resumable, import_id)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    catalog_importer.start(import_id)
+    return import_summary(await db.get(models.CatalogImport, import_id))
+
+async def _enrichment_status(db: AsyncSession, product_id: int) -> dict:
+    db_product = await db.get(models.Product, product_id)
+    if db_product is None:
+        raise HTTPException(status_code=404, detail="Product not found")
+    job = (await db.execute(
+        select(models.EnrichmentJob)
+        .where(models.EnrichmentJob.product_id == product_id)
+        .order_by(models.EnrichmentJob.id.desc())
+        .limit(1)
+    )).scalar()
+    return {
+        "product_id": db_product.id,
+        "enrichment_status": db_product.enrichment_status,
+        "visual_description": db_product.visual_description,
+        "embedding_id": db_product.embedding_id,
+        "job": job
+    }
+
+@router.get("/{product_id}/enrichment", response_model=ProductEnrichment)
+async def get_product_enrichment(product_id: int, db: AsyncSession = Depends(get_async_db)):
+    """
+    Enrichment progress for a product (read from the primary: pollers want the latest state).
+    """
+    return await _enrichment_status(db, product_id)
+
+@router.post("/{product_id}/enrichment", response_model=ProductEnrichment)
+async def retry_product_enrichment(product_id: int, db: AsyncSession = Depends(get_async_db)):
+    """
+    Queues a fresh enrichment job (e.g. after a failure). A job already pending or running is left alone.
+    """
+    from backend.services.product_enrichment import enrichment_queue, new_job
+
+    db_product = await db.get(models.Product, product_id)
+    if db_product is None:
+        raise HTTPException(status_code=404, detail="Product not found")
+    active = (await db.execute(
+        select(models.EnrichmentJob.id).where(
+            models.EnrichmentJob.product_id == product_id,
+            models.EnrichmentJob.status.in_([models.EnrichmentStatus.PENDING, models.EnrichmentStatus.PROCESSING])
+        ).limit(1)
+    )).scalar()
+    if active is None:
+        db_product.enrichment_status = models.EnrichmentStatus.PENDING
+        db.add(new_job(product_id))
+        await db.commit()
+        enrichment_queue.notify()
+    return await _enrichment_status(db, product_id)
+
 @router.get("/{product_id}", response_model=Product)
-def read_product(product_id: int, db: Session = Depends(get_db)):
-    db_product = db.query(models.Product).filter(models.Product.id == product_id).first()
+async def read_product(product_id: int, db: AsyncSession = Depends(get_async_read_db)):
+    db_product = await db.get(models.Product, product_id)
     if db_product is None:
         raise HTTPException(status_code=404, detail="Product not found")
     return db_product
@@ -19,38 +19,36 @@ async def process_message(form_data: dict):
         image_url = form_data.get("MediaUrl0")
             
     # Implement Opt-in Logic
-    from backend.database import SessionLocal
+    from backend.database import AsyncSessionLocal
     from backend.models import User
+    from sqlalchemy import select
     
-    db = SessionLocal()
-    try:
-        # Check if user exists
-        user = db.query(User).filter(User.phone_number == from_number).first()
-        
-        if not user:
-            # Create new user
-            user = User(phone_number=from_number, role="customer", bot_opt_in=False)
-            db.add(user)
-            db.commit()
-            db.refresh(user)
+    async with AsyncSessionLocal() as db:
+        try:
+            # Check if user exists
+            user = (await db.execute(select(User).where(User.phone_number == from_number))).scalars().first()
             
-        if not user.bot_opt_in:
-            # Check if message is a confirmation
-            if body.strip().upper() in ["YES", "Y", "START"]:
-                user.bot_opt_in = True
-                db.commit()
-                response_text = "Great! You are now connected to the ShopBuddy AI Assistant. How can I help you today?"
-            else:
-                response_text = "Hello! Would you like to speak with our AI assistant for faster responses? Reply YES to connect."
-                # We skip routing to agents until they opt-in
-                twilio_service.send_whatsapp_message(from_number, response_text)
-                return
+            if not user:
+                # Create new user
+                user = User(phone_number=from_number, role="customer", bot_opt_in=False)
+                db.add(user)
+                await db.commit()
+                
+            if not user.bot_opt_in:
+                # Check if message is a confirmation
+                if body.strip().upper() in ["YES", "Y", "START"]:
+                    user.bot_opt_in = True
+                    await db.commit()
+                    response_text = "Great! You are now connected to the ShopBuddy AI Assistant. How can I help you today?"
+                else:
+                    response_text = "Hello! Would you like to speak with our AI assistant for faster responses? Reply YES to connect."
+                    # We skip routing to agents until they opt-in
+                    twilio_service.send_whatsapp_message(from_number, response_text)
+                    return
 
-    except Exception as e:
-        print(f"Error in WhatsApp Opt-in: {e}")
-        # Fallback to allowing access or just logging error
-    finally:
-        db.close()
+        except Exception as e:
+            print(f"Error in WhatsApp Opt-in: {e}")
+            # Fallback to allowing access or just logging error
 
     # If opted in, delegate to router
     response_text = await route_and_process(body, image_url, user_id=from_number)
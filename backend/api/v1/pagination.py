@@ -0,0 +1,72 @@
+"""
+Keyset (cursor) pagination for newest-first admin lists.
+
+A page is ordered by (sort column, id) descending; its opaque cursor holds the
+last row's pair and the next page continues strictly below it, so deep pages
+cost the same as the first one (given an index on (sort column, id)).
+
+SQLite keeps datetimes as text, and rows written by CURRENT_TIMESTAMP and by
+Python differ in format ("... 10:00:00" vs "... 10:00:00.000000"). There the
+cursor carries the stored text and compares text to text; other databases get
+a real timestamp.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+from fastapi import HTTPException
+from sqlalchemy import String, bindparam, tuple_, type_coerce
+from sqlalchemy.sql import Select
+
+MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(sort_value: Any, row_id: int) -> str:
+    if isinstance(sort_value, datetime):
+        sort_value = sort_value.isoformat()
+    raw = json.dumps([sort_value, row_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[Any, int]:
+    try:
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return sort_value, int(row_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def keyset_page(stmt: Select, sort_col, id_col, cursor: Optional[str], limit: int, dialect: str) -> Select:
+    """
+    Adds keyset ordering, the cursor condition and the limit (plus one row, to tell
+    whether there's a next page) to `stmt`. It also selects the raw sort value and the
+    id as "cursor_sort" / "cursor_id"; pass the rows to `page_result`.
+    """
+    sortable = type_coerce(sort_col, String) if dialect == "sqlite" else sort_col
+    stmt = stmt.add_columns(sortable.label("cursor_sort"), id_col.label("cursor_id"))
+    if cursor:
+        sort_value, last_id = decode_cursor(cursor)
+        if dialect == "sqlite":
+            value = bindparam(None, str(sort_value), type_=String)
+        else:
+            try:
+                value = datetime.fromisoformat(sort_value) if isinstance(sort_value, str) else sort_value
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+            value = bindparam(None, value, type_=sort_col.type)
+        # Row-value comparison: a range scan on the (sort, id) index. The equivalent
+        # "a < x OR (a = x AND id < y)" makes SQLite scan the whole index.
+        stmt = stmt.where(tuple_(sortable, id_col) < tuple_(value, last_id))
+    return stmt.order_by(sort_col.desc(), id_col.desc()).limit(limit + 1)
+
+
+def page_result(rows: List[Any], limit: int, entities: bool = True) -> Tuple[List[Any], Optional[str]]:
+    """
+    Entities of a keyset page (first selected column) and the next page's cursor
+    (None on the last page). `entities=False` returns the rows themselves, for
+    column projections.
+    """
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = encode_cursor(rows[-1].cursor_sort, rows[-1].cursor_id) if has_more else None
+    return ([row[0] for row in rows] if entities else rows), next_cursor
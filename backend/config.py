@@ -1,5 +1,9 @@
+import os
 from pydantic_settings import BaseSettings
 
+# Vercel / AWS Lambda (Mangum): read-only filesystem, and background threads freeze between invocations
+SERVERLESS = bool(os.getenv("VERCEL") or os.getenv("AWS_LAMBDA_FUNCTION_NAME"))
+
 class Settings(BaseSettings):
     PROJECT_NAME: str = "Agentic AI CRM"
     API_V1_STR: str = "/api/v1"
@@ -12,6 +16,29 @@ class Settings(BaseSettings):
     POSTGRES_DB: str | None = None
     DATABASE_URL: str | None = None
 
+    # Connection profile: SQLite pragmas (set on every connection)
+    SQLITE_WAL: bool = True
+    SQLITE_SYNCHRONOUS: str = "NORMAL" # NORMAL is durable with WAL except on power loss; FULL for strict
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    SQLITE_MMAP_MB: int = 256
+    SQLITE_CACHE_MB: int = 64
+    # Connection profile: server databases (Postgres)
+    DB_POOL_SIZE: int = 10 # per process; keep workers x (pool + overflow) under max_connections
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT_SECONDS: float = 10
+    DB_POOL_RECYCLE_SECONDS: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    DB_STATEMENT_TIMEOUT_MS: int = 15000 # 0 disables
+    # Read replica for admin/analytics reads (None = everything on the primary)
+    DATABASE_REPLICA_URL: str | None = None
+    DB_REPLICA_STICKY_SECONDS: float = 5 # a client reads from the primary this long after it writes
+    # SQL instrumentation: statement count and DB time per HTTP request and per agent turn
+    SQL_INSTRUMENTATION_ENABLED: bool = True
+    SQL_DEBUG_HEADERS: bool = False # X-DB-* response headers; debug only, they show query text
+    SQL_SLOW_QUERY_MS: float = 200 # statements at least this slow are logged (0 disables)
+    SQL_SCOPE_MAX_STATEMENTS: int = 25 # requests / turns running more statements are logged (0 disables)
+    SQL_SLOWEST_KEPT: int = 3 # slowest statements kept per request / turn
+
     # Security
     SECRET_KEY: str
     ALGORITHM: str = "HS256"
@@ -21,6 +48,82 @@ class Settings(BaseSettings):
     GROQ_API_KEY: str
     GROQ_MODEL: str = "llama-3.3-70b-versatile"
 
+    # Model tiering: simple turns go to a small fast model
+    MODEL_TIERING_ENABLED: bool = False
+    GROQ_FAST_MODEL: str = "llama-3.1-8b-instant"
+    MODEL_TIERING_MAX_FAST_WORDS: int = 12
+    MODEL_TIERING_MIN_CONFIDENCE: float = 0.8
+
+    # LLM resilience: deadlines, hedging, fallback model, circuit breaker
+    GROQ_BASE_URL: str | None = None # e.g. http://localhost:8090 for fake_llm_server.py
+    GROQ_FALLBACK_MODEL: str | None = "llama-3.1-8b-instant" # empty disables the model fallback
+    LLM_DEADLINE_SECONDS: float = 30
+    LLM_HEDGE_ENABLED: bool = False
+    LLM_HEDGE_MIN_SAMPLES: int = 20 # latency samples needed before hedging at p95
+    LLM_CIRCUIT_FAILURE_THRESHOLD: int = 5
+    LLM_CIRCUIT_RESET_SECONDS: float = 30
+
+    # LLM dispatch scheduler (shared by all agents)
+    LLM_MAX_CONCURRENCY: int = 8
+    LLM_RATE_LIMIT_PER_MINUTE: float = 0 # 0 = no limit; set to your Groq plan's requests per minute
+    LLM_RATE_LIMIT_BURST: int = 10
+
+    # Default prompt token budget per agent (agents can override)
+    AGENT_CONTEXT_TOKEN_BUDGET: int = 3000
+
+    # Write-behind chat persistence (turns are journaled, then batch-inserted)
+    MESSAGE_WRITE_BEHIND_ENABLED: bool = not SERVERLESS # off on serverless: turns are written inline
+    MESSAGE_FLUSH_MAX_LATENCY_MS: int = 500
+    MESSAGE_FLUSH_BATCH_SIZE: int = 200 # turns; a full batch flushes immediately
+    MESSAGE_FLUSH_MAX_ATTEMPTS: int = 3 # an entry failing this often while others write is set aside
+    MESSAGE_JOURNAL_DIR: str | None = "./message_journal" # crash-safe local journal; empty disables
+    MESSAGE_JOURNAL_FSYNC: bool = True
+
+    # Per-user conversation context cache (write-through)
+    CONTEXT_CACHE_ENABLED: bool | None = None # None = on only with a shared CONTEXT_CACHE_BACKEND (safe with several workers)
+    CONTEXT_CACHE_MAX_ENTRIES: int = 10000
+    CONTEXT_CACHE_MAX_MB: float = 64 # in-process backend only
+    CONTEXT_CACHE_TTL_SECONDS: int = 900
+    CONTEXT_CACHE_BACKEND: str | None = None # None = in-process; share between workers with sqlite:///./context_cache.db or redis://localhost:6379/0
+
+    # Background conversation summaries (debounced per conversation)
+    SUMMARY_EVERY_MESSAGES: int = 6 # new messages before a refresh (6 = every 3 turns)
+    SUMMARY_IDLE_SECONDS: int = 120 # or this long after the last message
+    SUMMARY_MAX_MESSAGES: int = 50 # messages folded per refresh
+    SUMMARY_MAX_RETRIES: int = 3
+    SUMMARY_RETRY_BACKOFF_SECONDS: float = 5
+
+    # Product enrichment queue (vision description, embedding, index) after POST /products
+    ENRICHMENT_WORKERS: int = 0 if SERVERLESS else 2 # threads per process; 0 = drain with the CLI or POST /admin/enrichment/drain
+    ENRICHMENT_MAX_ATTEMPTS: int = 5
+    ENRICHMENT_RETRY_BACKOFF_SECONDS: float = 10 # doubles per attempt
+    ENRICHMENT_POLL_SECONDS: float = 5 # idle workers look for jobs queued by other processes this often
+    ENRICHMENT_LEASE_SECONDS: float = 300 # a job claimed longer ago than this (crashed worker) is requeued
+
+    # Bulk catalog import (POST /products/import, import_catalog.py)
+    CATALOG_IMPORT_DIR: str = "./catalog_imports" # uploads are kept here until the import finishes
+    CATALOG_IMPORT_BATCH_SIZE: int = 500 # rows per transaction
+    CATALOG_IMPORT_MAX_MB: int = 200
+    CATALOG_IMPORT_STALE_SECONDS: float = 120 # a "running" import idle this long was interrupted and may be resumed
+
+    # Product full-text search: catalog matches added to the sales agent's context (0 = off).
+    # Turns with matches skip the reply cache and the fast model tier
+    SALES_CATALOG_MATCHES: int = 0
+
+    # Batch chat: users processed in parallel
+    BATCH_CHAT_CONCURRENCY: int = 8
+
+    # Reply cache for repeated context-free prompts
+    RESPONSE_CACHE_ENABLED: bool = True
+    RESPONSE_CACHE_MAX_ENTRIES: int = 1000
+    RESPONSE_CACHE_TTL_SECONDS: int = 3600
+    RESPONSE_CACHE_SQLITE_PATH: str | None = None # e.g. ./response_cache.db
+
+    # Local intent router (below this confidence we ask the LLM instead)
+    INTENT_CONFIDENCE_THRESHOLD: float = 0.6
+    INTENT_LLM_FALLBACK: bool = True
+    INTENT_LLM_DEADLINE_SECONDS: float = 5 # past this (or with its circuit open) the classifier's pick stands
+
     # Services
     TWILIO_ACCOUNT_SID: str | None = None
     TWILIO_AUTH_TOKEN: str | None = None
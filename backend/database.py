@@ -1,4 +1,15 @@
-from sqlalchemy import create_engine
+import heapq
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+from fastapi import Request, Response
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 from backend.config import settings
 
@@ -16,12 +27,404 @@ else:
     SQLALCHEMY_DATABASE_URL = "sqlite:///./agentic_crm.db"
     print("WARNING: No DATABASE_URL or Postgres config found. Using default SQLite DB.")
 
-connect_args = {}
-if "sqlite" in SQLALCHEMY_DATABASE_URL:
-    connect_args = {"check_same_thread": False}
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args=connect_args)
+def engine_options(url: str) -> dict:
+    """create_engine keyword arguments for the configured connection profile."""
+    if url.startswith("sqlite"):
+        return {"connect_args": {"check_same_thread": False, "timeout": settings.SQLITE_BUSY_TIMEOUT_MS / 1000}}
+    options = {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT_SECONDS,
+        "pool_recycle": settings.DB_POOL_RECYCLE_SECONDS,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+    if url.startswith("postgresql") and settings.DB_STATEMENT_TIMEOUT_MS:
+        options["connect_args"] = {"options": f"-c statement_timeout={settings.DB_STATEMENT_TIMEOUT_MS}"}
+    return options
+
+
+# libpq URL parameters that asyncpg.connect() rejects (hosted Postgres URLs carry them,
+# e.g. "?sslmode=require"). async_url drops them; async_engine_options maps the ones
+# asyncpg has an equivalent for (sslmode -> ssl, which takes the same mode names).
+LIBPQ_ONLY_PARAMS = ("sslmode", "channel_binding", "gssencmode", "target_session_attrs",
+                     "application_name", "connect_timeout")
+
+
+def _query_value(url: str, name: str):
+    value = make_url(url).query.get(name)
+    return value[-1] if isinstance(value, tuple) else value
+
+
+def async_url(url: str) -> str:
+    """Same database through its asyncio driver (aiosqlite / asyncpg)."""
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend == "sqlite":
+        return parsed.set(drivername="sqlite+aiosqlite").render_as_string(hide_password=False)
+    if backend == "postgresql":
+        parsed = parsed.difference_update_query(LIBPQ_ONLY_PARAMS)
+        return parsed.set(drivername="postgresql+asyncpg").render_as_string(hide_password=False)
+    raise ValueError(f"No async driver configured for {backend}")
+
+
+def async_engine_options(url: str) -> dict:
+    options = engine_options(url)
+    if url.startswith("sqlite"):
+        options["connect_args"] = {"timeout": settings.SQLITE_BUSY_TIMEOUT_MS / 1000}
+    elif url.startswith("postgresql"):
+        # asyncpg takes server settings directly instead of libpq "options"
+        connect_args, server_settings = {}, {}
+        if _query_value(url, "sslmode"):
+            connect_args["ssl"] = _query_value(url, "sslmode")
+        if _query_value(url, "connect_timeout"):
+            connect_args["timeout"] = float(_query_value(url, "connect_timeout"))
+        if _query_value(url, "application_name"):
+            server_settings["application_name"] = _query_value(url, "application_name")
+        if settings.DB_STATEMENT_TIMEOUT_MS:
+            server_settings["statement_timeout"] = str(settings.DB_STATEMENT_TIMEOUT_MS)
+        if server_settings:
+            connect_args["server_settings"] = server_settings
+        options["connect_args"] = connect_args
+    return options
+
+
+def sqlite_pragmas() -> dict:
+    pragmas = {
+        "synchronous": settings.SQLITE_SYNCHRONOUS,
+        "busy_timeout": settings.SQLITE_BUSY_TIMEOUT_MS,
+        "mmap_size": settings.SQLITE_MMAP_MB * 1_048_576,
+        "cache_size": -settings.SQLITE_CACHE_MB * 1024, # negative = KiB
+    }
+    if settings.SQLITE_WAL:
+        pragmas = {"journal_mode": "WAL", **pragmas}
+    return pragmas
+
+
+class PoolMonitor:
+    """Pool utilization counters from pool events (checkouts, peak concurrency, invalidations)."""
+    def __init__(self, engine):
+        self.engine = engine
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.connects = 0
+        self.invalidations = 0
+        self.checked_out = 0
+        self.peak_checked_out = 0
+        event.listen(engine.pool, "connect", self._on_connect)
+        event.listen(engine.pool, "checkout", self._on_checkout)
+        event.listen(engine.pool, "checkin", self._on_checkin)
+        event.listen(engine.pool, "invalidate", self._on_invalidate)
+
+    def _on_connect(self, dbapi_connection, connection_record):
+        with self._lock:
+            self.connects += 1
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        with self._lock:
+            self.checkouts += 1
+            self.checked_out += 1
+            self.peak_checked_out = max(self.peak_checked_out, self.checked_out)
+
+    def _on_checkin(self, dbapi_connection, connection_record):
+        with self._lock:
+            self.checked_out = max(self.checked_out - 1, 0)
+
+    def _on_invalidate(self, dbapi_connection, connection_record, exception):
+        with self._lock:
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        pool = self.engine.pool
+        capacity = None
+        if hasattr(pool, "size") and hasattr(pool, "_max_overflow"):
+            capacity = pool.size() + max(pool._max_overflow, 0)
+        stats = {
+            "dialect": self.engine.dialect.name,
+            "pool": type(pool).__name__,
+            "checked_out": self.checked_out,
+            "peak_checked_out": self.peak_checked_out,
+            "capacity": capacity,
+            "utilization": round(self.checked_out / capacity, 3) if capacity else None,
+            "checkouts": self.checkouts,
+            "connections_opened": self.connects,
+            "invalidations": self.invalidations,
+        }
+        if hasattr(pool, "checkedin"):
+            stats["idle"] = pool.checkedin()
+            stats["overflow"] = pool.overflow()
+            stats["pool_timeout_seconds"] = pool._timeout
+        if self.engine.dialect.name == "sqlite" and not self.engine.dialect.is_async:
+            with self.engine.connect() as conn:
+                stats["pragmas"] = {
+                    name: conn.exec_driver_sql(f"PRAGMA {name}").scalar() for name in sqlite_pragmas()
+                }
+        return stats
+
+
+sql_logger = logging.getLogger("backend.sql")
+
+# Scope (request / agent turn) the running code's statements are charged to.
+# asyncio tasks and to_thread workers inherit it.
+_sql_scope: ContextVar[Optional["QueryStats"]] = ContextVar("sql_scope", default=None)
+
+
+def _one_line(statement: str, limit: int = 300) -> str:
+    statement = " ".join(statement.split())
+    return statement if len(statement) <= limit else statement[:limit] + "..."
+
+
+class QueryStats:
+    """Statements run inside one scope; a nested scope (a turn inside a request) also counts toward its parent."""
+    def __init__(self, name: str, parent: Optional["QueryStats"] = None, keep_slowest: int = 3):
+        self.name = name
+        self.parent = parent
+        self.keep_slowest = keep_slowest
+        self.statements = 0
+        self.db_seconds = 0.0
+        self.slowest = [] # min-heap of (seconds, statement)
+        self.started = time.perf_counter()
+        self._lock = threading.Lock() # a scope's statements may run on several worker threads at once
+
+    def record(self, statement: str, seconds: float):
+        scope = self
+        while scope is not None:
+            with scope._lock:
+                scope.statements += 1
+                scope.db_seconds += seconds
+                if len(scope.slowest) < scope.keep_slowest:
+                    heapq.heappush(scope.slowest, (seconds, statement))
+                elif scope.slowest and seconds > scope.slowest[0][0]:
+                    heapq.heapreplace(scope.slowest, (seconds, statement))
+            scope = scope.parent
+
+    def summary(self) -> dict:
+        return {
+            "scope": self.name,
+            "statements": self.statements,
+            "db_ms": round(self.db_seconds * 1000, 2),
+            "wall_ms": round((time.perf_counter() - self.started) * 1000, 2),
+            "slowest": [
+                {"ms": round(seconds * 1000, 2), "statement": _one_line(statement)}
+                for seconds, statement in sorted(self.slowest, reverse=True)
+            ],
+        }
+
+
+class SqlInstrumentation:
+    """
+    Times every statement through engine events and charges it to the current
+    scope (an HTTP request, an agent turn; see `scope`). Slow statements and
+    scopes running more than `max_statements` (N+1 suspects) are logged to
+    "backend.sql" as JSON lines; per-scope totals feed /admin/metrics/sql.
+    """
+    def __init__(self, enabled: bool, slow_query_ms: float, max_statements: int, keep_slowest: int):
+        self.enabled = enabled
+        self.slow_query_ms = slow_query_ms
+        self.max_statements = max_statements
+        self.keep_slowest = keep_slowest
+        self._lock = threading.Lock()
+        self.totals = {} # scope name -> counters
+        self.slow_queries = 0
+        self.heavy_scopes = 0
+
+    def attach(self, engine):
+        if not self.enabled:
+            return
+        event.listen(engine, "before_cursor_execute", self._before_execute)
+        event.listen(engine, "after_cursor_execute", self._after_execute)
+        event.listen(engine, "handle_error", self._on_error)
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("sql_started", []).append(time.perf_counter())
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.get("sql_started")
+        if not started:
+            return
+        seconds = time.perf_counter() - started.pop()
+        scope = _sql_scope.get()
+        if scope is not None:
+            scope.record(statement, seconds)
+        if self.slow_query_ms and seconds * 1000 >= self.slow_query_ms:
+            with self._lock:
+                self.slow_queries += 1
+            self._log(
+                "slow_query", ms=round(seconds * 1000, 2), statement=_one_line(statement, 1000),
+                scope=scope.name if scope else None, dialect=conn.dialect.name
+            )
+
+    def _on_error(self, exception_context):
+        # The failed statement never reaches after_cursor_execute
+        if exception_context.connection is not None:
+            exception_context.connection.info.pop("sql_started", None)
+
+    @contextmanager
+    def scope(self, name: str):
+        """Charges the statements run inside the block (and in tasks / threads it starts) to `name`."""
+        stats = QueryStats(name, parent=_sql_scope.get(), keep_slowest=self.keep_slowest)
+        if not self.enabled:
+            yield stats
+            return
+        token = _sql_scope.set(stats)
+        try:
+            yield stats
+        finally:
+            try:
+                _sql_scope.reset(token)
+            except ValueError:
+                pass # an async generator closed from another context
+            self.finish(stats)
+
+    def finish(self, stats: QueryStats):
+        wall_seconds = time.perf_counter() - stats.started
+        with self._lock:
+            totals = self.totals.setdefault(stats.name, {
+                "count": 0, "statements": 0, "db_seconds": 0.0, "wall_seconds": 0.0, "max_statements": 0
+            })
+            totals["count"] += 1
+            totals["statements"] += stats.statements
+            totals["db_seconds"] += stats.db_seconds
+            totals["wall_seconds"] += wall_seconds
+            totals["max_statements"] = max(totals["max_statements"], stats.statements)
+        if self.max_statements and stats.statements > self.max_statements:
+            with self._lock:
+                self.heavy_scopes += 1
+            self._log("statement_heavy_scope", **stats.summary())
+
+    @staticmethod
+    def _log(event_name: str, **fields):
+        sql_logger.warning(json.dumps({"event": event_name, **fields}, default=str))
+
+    def stats(self) -> dict:
+        with self._lock:
+            totals = {name: dict(t) for name, t in self.totals.items()}
+            slow_queries, heavy_scopes = self.slow_queries, self.heavy_scopes
+        scopes = [
+            {
+                "scope": name,
+                "count": t["count"],
+                "avg_statements": round(t["statements"] / t["count"], 2),
+                "max_statements": t["max_statements"],
+                "avg_db_ms": round(t["db_seconds"] / t["count"] * 1000, 2),
+                "total_db_ms": round(t["db_seconds"] * 1000, 1),
+                "db_share": round(t["db_seconds"] / t["wall_seconds"], 3) if t["wall_seconds"] else None,
+            }
+            for name, t in totals.items()
+        ]
+        scopes.sort(key=lambda s: s["total_db_ms"], reverse=True) # most DB-bound first
+        return {
+            "enabled": self.enabled,
+            "slow_query_ms": self.slow_query_ms,
+            "max_statements": self.max_statements,
+            "slow_queries": slow_queries,
+            "heavy_scopes": heavy_scopes,
+            "scopes": scopes,
+        }
+
+
+sql_instrumentation = SqlInstrumentation(
+    settings.SQL_INSTRUMENTATION_ENABLED, settings.SQL_SLOW_QUERY_MS,
+    settings.SQL_SCOPE_MAX_STATEMENTS, settings.SQL_SLOWEST_KEPT
+)
+
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **engine_options(SQLALCHEMY_DATABASE_URL))
+
+# Async engine on the same database, for handlers running on the event loop
+async_engine = create_async_engine(async_url(SQLALCHEMY_DATABASE_URL), **async_engine_options(SQLALCHEMY_DATABASE_URL))
+
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for name, value in sqlite_pragmas().items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+if engine.dialect.name == "sqlite":
+    event.listen(engine, "connect", _apply_sqlite_pragmas)
+    event.listen(async_engine.sync_engine, "connect", _apply_sqlite_pragmas)
+
+pool_monitor = PoolMonitor(engine)
+async_pool_monitor = PoolMonitor(async_engine.sync_engine)
+sql_instrumentation.attach(engine)
+sql_instrumentation.attach(async_engine.sync_engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+# Optional read replica (async only: the routed endpoints are async)
+async_replica_engine = None
+async_replica_pool_monitor = None
+AsyncReplicaSessionLocal = None
+if settings.DATABASE_REPLICA_URL:
+    async_replica_engine = create_async_engine(
+        async_url(settings.DATABASE_REPLICA_URL), **async_engine_options(settings.DATABASE_REPLICA_URL)
+    )
+    if async_replica_engine.dialect.name == "sqlite":
+        event.listen(async_replica_engine.sync_engine, "connect", _apply_sqlite_pragmas)
+    async_replica_pool_monitor = PoolMonitor(async_replica_engine.sync_engine)
+    sql_instrumentation.attach(async_replica_engine.sync_engine)
+    AsyncReplicaSessionLocal = async_sessionmaker(
+        async_replica_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+    )
+
+
+class ReplicaRouter:
+    """
+    Decides per request whether a read may go to the replica. A client that just
+    wrote reads from the primary for `sticky_seconds` (read-your-writes despite
+    replication lag). The window travels in a cookie, so it holds across uvicorn
+    workers; clients without a cookie jar fall back to a per-process entry keyed
+    by their address.
+    """
+    COOKIE = "crm_primary_until"
+
+    def __init__(self, sticky_seconds: float):
+        self.sticky_seconds = sticky_seconds
+        self._until = {} # client address -> primary-until timestamp
+        self._lock = threading.Lock()
+        self.replica_reads = 0
+        self.primary_reads = 0
+        self.sticky_reads = 0
+        self.writes = 0
+
+    @staticmethod
+    def _client(request: Request) -> str:
+        return request.client.host if request.client else "unknown"
+
+    def mark_write(self, request: Request, response: Response):
+        until = time.time() + self.sticky_seconds
+        with self._lock:
+            self.writes += 1
+            self._until[self._client(request)] = until
+            if len(self._until) > 10_000: # drop expired entries now and then
+                now = time.time()
+                self._until = {k: v for k, v in self._until.items() if v > now}
+        response.set_cookie(self.COOKIE, f"{until:.3f}", max_age=int(self.sticky_seconds) + 1, httponly=True, samesite="lax")
+
+    def use_primary(self, request: Request) -> bool:
+        now = time.time()
+        try:
+            cookie_until = float(request.cookies.get(self.COOKIE, 0))
+        except ValueError:
+            cookie_until = 0
+        with self._lock:
+            sticky = max(cookie_until, self._until.get(self._client(request), 0)) > now
+            if sticky:
+                self.sticky_reads += 1
+            return sticky
+
+    def stats(self) -> dict:
+        return {
+            "replica_configured": AsyncReplicaSessionLocal is not None,
+            "sticky_seconds": self.sticky_seconds,
+            "replica_reads": self.replica_reads,
+            "primary_reads": self.primary_reads,
+            "sticky_reads": self.sticky_reads,
+            "writes": self.writes,
+        }
+
+
+replica_router = ReplicaRouter(settings.DB_REPLICA_STICKY_SECONDS)
 
 Base = declarative_base()
 
@@ -31,3 +434,21 @@ def get_db():
         yield db
     finally:
         db.close()
+
+async def get_async_db(request: Request, response: Response):
+    """Primary session for endpoints that write; a commit starts the client's read-your-writes window."""
+    async with AsyncSessionLocal() as db:
+        if AsyncReplicaSessionLocal is not None:
+            event.listen(db.sync_session, "after_commit", lambda session: replica_router.mark_write(request, response))
+        yield db
+
+async def get_async_read_db(request: Request):
+    """Session for read-only endpoints: the replica when configured, unless this client wrote recently."""
+    if AsyncReplicaSessionLocal is None or replica_router.use_primary(request):
+        replica_router.primary_reads += 1
+        session_factory = AsyncSessionLocal
+    else:
+        replica_router.replica_reads += 1
+        session_factory = AsyncReplicaSessionLocal
+    async with session_factory() as db:
+        yield db
@@ -9,8 +9,10 @@ def get_groq_client(model: str = None, temperature: float = 0.7):
     
     llm = ChatGroq(
         groq_api_key=settings.GROQ_API_KEY,
+        groq_api_base=settings.GROQ_BASE_URL, # None = Groq cloud; set to point at a proxy or fake server
         model_name=model_name,
-        temperature=temperature
+        temperature=temperature,
+        request_timeout=settings.LLM_DEADLINE_SECONDS # Bounds calls abandoned by the resilience layer
     )
     return llm
 
@@ -20,3 +22,46 @@ def get_llm_scout():
     For now, maps to the main Groq model.
     """
     return get_groq_client(temperature=0.2) # Lower temp for more deterministic tasks
+
+# --- Model tiering ---
+
+TIER_FAST = "fast"
+TIER_FULL = "full"
+
+# Topics where a weaker answer costs more than the latency we'd save
+DEFAULT_ESCALATE_KEYWORDS = [
+    "refund", "complaint", "cancel", "damaged", "broken", "wrong", "charged",
+    "angry", "upset", "escalate", "manager", "unacceptable", "lawyer"
+]
+
+def get_model_for_tier(tier: str) -> str:
+    return settings.GROQ_FAST_MODEL if tier == TIER_FAST else settings.GROQ_MODEL
+
+class TieringPolicy:
+    """
+    Decides which model tier handles a turn. Short, simple, confidently-routed
+    turns go to the small fast model; long, sensitive or uncertain ones escalate
+    to the full model.
+    """
+
+    def __init__(self, enabled: bool = None, max_fast_words: int = None, min_confidence: float = None,
+                 escalate_keywords: list = None):
+        self.enabled = settings.MODEL_TIERING_ENABLED if enabled is None else enabled
+        self.max_fast_words = max_fast_words or settings.MODEL_TIERING_MAX_FAST_WORDS
+        self.min_confidence = settings.MODEL_TIERING_MIN_CONFIDENCE if min_confidence is None else min_confidence
+        self.escalate_keywords = DEFAULT_ESCALATE_KEYWORDS if escalate_keywords is None else escalate_keywords
+
+    def choose(self, text: str, route_confidence: float = None, has_context: bool = False) -> tuple:
+        """Returns (tier, reason)."""
+        if not self.enabled:
+            return TIER_FULL, "tiering disabled"
+        if has_context:
+            return TIER_FULL, "extra context"
+        if len(text.split()) > self.max_fast_words:
+            return TIER_FULL, "long message"
+        text_lower = text.lower()
+        if any(k in text_lower for k in self.escalate_keywords):
+            return TIER_FULL, "sensitive intent"
+        if route_confidence is not None and route_confidence < self.min_confidence:
+            return TIER_FULL, "low routing confidence"
+        return TIER_FAST, "simple turn"
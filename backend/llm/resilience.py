@@ -0,0 +1,386 @@
+"""
+Resilient LLM Invocation
+Wraps provider calls with a per-call deadline, optional hedging (a second request
+fired once the call is slower than its p95), fallback to an alternate model or a
+canned response, and a circuit breaker that skips a failing provider for a while.
+
+Calls made with a `priority` run in an LLM scheduler slot, and their deadline starts
+once the slot is granted: time spent queued locally is not provider slowness and
+never trips the breaker.
+"""
+import asyncio
+import concurrent.futures
+import contextlib
+import threading
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional
+from backend.config import settings
+from backend.llm.scheduler import llm_scheduler, Priority
+import logging
+
+logger = logging.getLogger(__name__)
+
+_NO_CANNED = object()
+
+
+class LLMUnavailableError(Exception):
+    """Primary and fallback both failed and no canned response was configured."""
+
+
+class CircuitBreaker:
+    """
+    closed -> open after `failure_threshold` consecutive failures;
+    open -> half_open after `reset_seconds` (one trial call allowed);
+    half_open -> closed on success, back to open on failure or if the trial is
+    cancelled (client disconnect), so the next trial comes after a fresh reset period.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_seconds: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_seconds:
+                self.state = "half_open"
+                return True
+            return self.state == "closed"
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    self.times_opened += 1
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+    def record_abandoned(self):
+        """A call was cancelled before it finished: tells nothing about the provider, but frees a half-open trial."""
+        with self._lock:
+            if self.state == "half_open":
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies (seconds)."""
+
+    def __init__(self, window: int = 200):
+        self._samples = deque(maxlen=window)
+
+    def record(self, seconds: float):
+        self._samples.append(seconds)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+
+class ResilientCaller:
+    """
+    One caller per kind of upstream call (chat, summary, vision, report), each
+    with its own breaker and latency history.
+
+    `primary` / `fallback` are zero-argument factories so a hedge can start a
+    fresh request. With a `priority`, each of them runs in its own scheduler slot.
+    """
+
+    def __init__(self, name: str, deadline_seconds: float = None, hedge: bool = None,
+                 failure_threshold: int = None, reset_seconds: float = None):
+        self.name = name
+        self.deadline_seconds = deadline_seconds or settings.LLM_DEADLINE_SECONDS
+        self.hedge = settings.LLM_HEDGE_ENABLED if hedge is None else hedge
+        self.breaker = CircuitBreaker(
+            failure_threshold or settings.LLM_CIRCUIT_FAILURE_THRESHOLD,
+            reset_seconds or settings.LLM_CIRCUIT_RESET_SECONDS
+        )
+        self.latency = LatencyTracker()
+        self.counters = {"calls": 0, "timeouts": 0, "errors": 0, "hedges": 0, "hedge_wins": 0,
+                         "fallbacks": 0, "canned": 0, "short_circuited": 0}
+
+    def _hedge_after(self) -> Optional[float]:
+        if not self.hedge or len(self.latency) < settings.LLM_HEDGE_MIN_SAMPLES:
+            return None
+        p95 = self.latency.percentile(0.95)
+        return p95 if p95 and p95 < self.deadline_seconds else None
+
+    @staticmethod
+    def _slot(priority: Optional[Priority]):
+        return llm_scheduler.slot(priority) if priority is not None else contextlib.nullcontext()
+
+    # --- Async ---
+
+    async def _attempt(self, fn: Callable[[], Awaitable[Any]], priority: Priority = None) -> Any:
+        """Runs fn under the deadline (the caller holds its slot), hedging once if it's slower than p95."""
+        started = time.monotonic()
+        deadline = started + self.deadline_seconds
+        tasks = [asyncio.ensure_future(fn())]
+        hedge_after = self._hedge_after()
+        last_error = None
+        try:
+            while tasks:
+                now = time.monotonic()
+                if now >= deadline:
+                    break
+                timeout = deadline - now
+                if hedge_after is not None and len(tasks) == 1:
+                    timeout = min(timeout, max(started + hedge_after - now, 0))
+                done, _ = await asyncio.wait(tasks, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                for task in done:
+                    tasks.remove(task)
+                    if task.exception() is None:
+                        self.latency.record(time.monotonic() - started)
+                        return task.result()
+                    last_error = task.exception()
+
+                if not done and hedge_after is not None and time.monotonic() < deadline:
+                    # Primary is slower than usual: fire one hedge and take whichever answers first
+                    self.counters["hedges"] += 1
+                    tasks.append(asyncio.ensure_future(self._hedged(fn, priority)))
+                    hedge_after = None
+                elif not tasks:
+                    break
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        if last_error is not None and not tasks and time.monotonic() < deadline:
+            raise last_error
+        self.counters["timeouts"] += 1
+        raise asyncio.TimeoutError(f"{self.name} LLM call exceeded {self.deadline_seconds}s")
+
+    async def _hedged(self, fn: Callable[[], Awaitable[Any]], priority: Priority = None) -> Any:
+        async with self._slot(priority):
+            result = await fn()
+        self.counters["hedge_wins"] += 1
+        return result
+
+    async def call(self, primary: Callable[[], Awaitable[Any]], fallback: Callable[[], Awaitable[Any]] = None,
+                   canned: Any = _NO_CANNED, priority: Priority = None) -> Any:
+        self.counters["calls"] += 1
+        if self.breaker.allow():
+            try:
+                async with self._slot(priority):
+                    result = await self._attempt(primary, priority)
+                self.breaker.record_success()
+                return result
+            except Exception as e:
+                if not isinstance(e, asyncio.TimeoutError):
+                    self.counters["errors"] += 1
+                self.breaker.record_failure()
+                logger.warning(f"[{self.name}] Primary LLM call failed: {e!r}")
+            except BaseException:
+                self.breaker.record_abandoned() # cancelled (e.g. the client went away)
+                raise
+        else:
+            self.counters["short_circuited"] += 1
+
+        if fallback is not None:
+            try:
+                self.counters["fallbacks"] += 1
+                async with self._slot(priority):
+                    return await asyncio.wait_for(fallback(), timeout=self.deadline_seconds)
+            except Exception as e:
+                logger.warning(f"[{self.name}] Fallback LLM call failed: {e!r}")
+
+        return self._canned(canned)
+
+    async def stream(self, primary: Callable[[], AsyncIterator[Any]], fallback: Callable[[], Awaitable[Any]] = None,
+                     canned: Any = _NO_CANNED, priority: Priority = None) -> AsyncIterator[Any]:
+        """
+        Streams chunks from primary, with the deadline applied to each chunk.
+        Falls back (as a single chunk) only if nothing has been yielded yet;
+        a stream that breaks midway re-raises. Streams are not hedged.
+        """
+        self.counters["calls"] += 1
+        if self.breaker.allow():
+            yielded = False
+            try:
+                async with self._slot(priority):
+                    chunks = primary().__aiter__()
+                    while True:
+                        try:
+                            chunk = await asyncio.wait_for(chunks.__anext__(), timeout=self.deadline_seconds)
+                        except StopAsyncIteration:
+                            break
+                        yielded = True
+                        yield chunk
+                self.breaker.record_success()
+                return
+            except Exception as e:
+                self.counters["timeouts" if isinstance(e, asyncio.TimeoutError) else "errors"] += 1
+                self.breaker.record_failure()
+                logger.warning(f"[{self.name}] Primary LLM stream failed: {e!r}")
+                if yielded:
+                    raise
+            except BaseException:
+                # Consumer stopped (SSE client disconnected): chunks already received show the provider answers
+                if yielded:
+                    self.breaker.record_success()
+                else:
+                    self.breaker.record_abandoned()
+                raise
+        else:
+            self.counters["short_circuited"] += 1
+
+        if fallback is not None:
+            try:
+                self.counters["fallbacks"] += 1
+                async with self._slot(priority):
+                    reply = await asyncio.wait_for(fallback(), timeout=self.deadline_seconds)
+                yield reply
+                return
+            except Exception as e:
+                logger.warning(f"[{self.name}] Fallback LLM call failed: {e!r}")
+
+        yield self._canned(canned)
+
+    # --- Sync (worker threads) ---
+
+    _executor = concurrent.futures.ThreadPoolExecutor(max_workers=16, thread_name_prefix="llm-call")
+
+    def _submit(self, fn: Callable[[], Any], priority: Priority = None) -> concurrent.futures.Future:
+        """
+        Runs fn on the executor, in a scheduler slot held by the worker thread (so a call
+        abandoned at its deadline keeps its slot until it really finishes). Returns once
+        the slot is granted, so the caller's deadline doesn't count time spent queued.
+        """
+        if priority is None:
+            return self._executor.submit(fn)
+        granted = threading.Event()
+
+        def run():
+            try:
+                with llm_scheduler.slot_sync(priority):
+                    granted.set()
+                    return fn()
+            finally:
+                granted.set() # also when the slot couldn't be taken, so the caller never waits on a dead job
+
+        future = self._executor.submit(run)
+        # Blocks until the scheduler grants the slot; the deadline only starts after that
+        granted.wait()
+        return future
+
+    def _attempt_sync(self, fn: Callable[[], Any], priority: Priority = None) -> Any:
+        futures = [self._submit(fn, priority)]
+        started = time.monotonic()
+        deadline = started + self.deadline_seconds
+        hedge_after = self._hedge_after()
+        last_error = None
+
+        while futures:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            timeout = deadline - now
+            if hedge_after is not None and len(futures) == 1:
+                timeout = min(timeout, max(started + hedge_after - now, 0))
+            done, _ = concurrent.futures.wait(futures, timeout=timeout, return_when=concurrent.futures.FIRST_COMPLETED)
+
+            for future in done:
+                futures.remove(future)
+                if future.exception() is None:
+                    self.latency.record(time.monotonic() - started)
+                    return future.result()
+                last_error = future.exception()
+
+            if not done and hedge_after is not None and time.monotonic() < deadline:
+                self.counters["hedges"] += 1
+                futures.append(self._executor.submit(self._hedged_sync, fn, priority))
+                hedge_after = None
+            elif not futures:
+                break
+
+        # Threads can't be cancelled; abandoned calls finish in the background
+        for future in futures:
+            future.cancel()
+        if last_error is not None and not futures and time.monotonic() < deadline:
+            raise last_error
+        self.counters["timeouts"] += 1
+        raise TimeoutError(f"{self.name} LLM call exceeded {self.deadline_seconds}s")
+
+    def _hedged_sync(self, fn: Callable[[], Any], priority: Priority = None) -> Any:
+        if priority is None:
+            result = fn()
+        else:
+            with llm_scheduler.slot_sync(priority):
+                result = fn()
+        self.counters["hedge_wins"] += 1
+        return result
+
+    def call_sync(self, primary: Callable[[], Any], fallback: Callable[[], Any] = None, canned: Any = _NO_CANNED,
+                  priority: Priority = None) -> Any:
+        self.counters["calls"] += 1
+        if self.breaker.allow():
+            try:
+                result = self._attempt_sync(primary, priority)
+                self.breaker.record_success()
+                return result
+            except Exception as e:
+                if not isinstance(e, TimeoutError):
+                    self.counters["errors"] += 1
+                self.breaker.record_failure()
+                logger.warning(f"[{self.name}] Primary LLM call failed: {e!r}")
+            except BaseException:
+                self.breaker.record_abandoned()
+                raise
+        else:
+            self.counters["short_circuited"] += 1
+
+        if fallback is not None:
+            try:
+                self.counters["fallbacks"] += 1
+                return self._submit(fallback, priority).result(timeout=self.deadline_seconds)
+            except Exception as e:
+                logger.warning(f"[{self.name}] Fallback LLM call failed: {e!r}")
+
+        return self._canned(canned)
+
+    def _canned(self, canned: Any) -> Any:
+        if canned is _NO_CANNED:
+            raise LLMUnavailableError(f"{self.name}: LLM unavailable")
+        self.counters["canned"] += 1
+        return canned
+
+    def stats(self) -> Dict[str, Any]:
+        p50, p95 = self.latency.percentile(0.5), self.latency.percentile(0.95)
+        return {
+            "deadline_seconds": self.deadline_seconds,
+            "hedging": self.hedge,
+            "circuit": self.breaker.state,
+            "circuit_opened": self.breaker.times_opened,
+            "latency_p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+            "latency_p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+            **self.counters
+        }
+
+
+_callers: Dict[str, ResilientCaller] = {}
+
+def get_caller(name: str, **kwargs) -> ResilientCaller:
+    """Shared caller per upstream call kind (so agents share one breaker)."""
+    if name not in _callers:
+        _callers[name] = ResilientCaller(name, **kwargs)
+    return _callers[name]
+
+def all_caller_stats() -> Dict[str, Any]:
+    return {name: caller.stats() for name, caller in _callers.items()}
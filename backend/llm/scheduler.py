@@ -0,0 +1,197 @@
+"""
+LLM Dispatch Scheduler
+Every Groq call goes through one process-wide scheduler that bounds concurrency,
+applies a token-bucket rate limit and serves waiting calls by priority, so live
+chat never queues behind summarization or market reports.
+
+A call is granted a slot only once a rate-limit token is available too, and both
+go to the highest-priority waiter: nobody holds a slot while waiting for a token,
+and no low-priority call books future tokens ahead of a chat call.
+"""
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from enum import IntEnum
+from typing import Any, Awaitable, Callable, Dict
+from backend.config import settings
+
+
+class Priority(IntEnum):
+    """Lower value = served first."""
+    CHAT = 0       # live WhatsApp / web chat
+    SUMMARY = 1    # conversation summarization
+    REPORT = 2     # market intelligence reports
+
+
+class _Waiter:
+    def __init__(self, priority: Priority, seq: int, wake: Callable[[], None]):
+        self.priority = priority
+        self.seq = seq
+        self.wake = wake
+        self.granted = False
+        self.cancelled = False
+
+    def __lt__(self, other: "_Waiter") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class LLMScheduler:
+    """
+    Priority scheduler for LLM calls. Usable from the event loop (`slot`, `run`)
+    and from worker threads (`slot_sync`).
+    """
+
+    def __init__(self, max_concurrency: int = 8, rate_per_minute: float = 0, burst: int = 1):
+        self.max_concurrency = max_concurrency
+        self.rate_per_second = rate_per_minute / 60.0
+        self.burst = max(burst, 1)
+        self._tokens = float(self.burst)
+        self._last_refill = time.monotonic()
+
+        self._lock = threading.Lock()
+        self._timer = None # re-runs the grant loop when the next token is due
+        self._queue = []
+        self._seq = itertools.count()
+        self._active = 0
+        self._queued = {p: 0 for p in Priority}
+        self._completed = {p: 0 for p in Priority}
+        self._waits = {p: deque(maxlen=1000) for p in Priority}
+
+    # --- Core ---
+
+    def _enqueue(self, priority: Priority, wake: Callable[[], None]) -> _Waiter:
+        with self._lock:
+            waiter = _Waiter(priority, next(self._seq), wake)
+            heapq.heappush(self._queue, waiter)
+            self._queued[priority] += 1
+            self._grant_locked()
+            return waiter
+
+    def _grant_locked(self):
+        while self._queue and self._active < self.max_concurrency:
+            if self._queue[0].cancelled:
+                heapq.heappop(self._queue)
+                continue
+            if not self._take_token_locked():
+                return
+            waiter = heapq.heappop(self._queue)
+            self._queued[waiter.priority] -= 1
+            self._active += 1
+            waiter.granted = True
+            waiter.wake()
+
+    def _abandon(self, waiter: _Waiter):
+        """Caller gave up while waiting (e.g. request cancelled)."""
+        with self._lock:
+            if not waiter.granted:
+                waiter.cancelled = True
+                self._queued[waiter.priority] -= 1
+                return
+        self._release(waiter.priority, completed=False)
+
+    def _release(self, priority: Priority, completed: bool = True):
+        with self._lock:
+            self._active -= 1
+            if completed:
+                self._completed[priority] += 1
+            self._grant_locked()
+
+    def _take_token_locked(self) -> bool:
+        """
+        Takes a token from the bucket if one is available; otherwise schedules the
+        grant loop for when the next one is due (whoever is first in line then gets it).
+        """
+        if not self.rate_per_second:
+            return True
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * self.rate_per_second)
+        self._last_refill = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return True
+        if self._timer is None:
+            self._timer = threading.Timer((1 - self._tokens) / self.rate_per_second, self._on_token_due)
+            self._timer.daemon = True
+            self._timer.start()
+        return False
+
+    def _on_token_due(self):
+        with self._lock:
+            self._timer = None
+            self._grant_locked()
+
+    # --- Public API ---
+
+    @asynccontextmanager
+    async def slot(self, priority: Priority = Priority.CHAT):
+        loop = asyncio.get_running_loop()
+        granted = loop.create_future()
+
+        def wake():
+            loop.call_soon_threadsafe(lambda: granted.done() or granted.set_result(None))
+
+        started = time.monotonic()
+        waiter = self._enqueue(priority, wake)
+        try:
+            await granted
+        except BaseException:
+            self._abandon(waiter)
+            raise
+        self._waits[priority].append(time.monotonic() - started)
+
+        try:
+            yield
+        finally:
+            self._release(priority)
+
+    @contextmanager
+    def slot_sync(self, priority: Priority = Priority.CHAT):
+        granted = threading.Event()
+        started = time.monotonic()
+        waiter = self._enqueue(priority, granted.set)
+        try:
+            granted.wait()
+        except BaseException:
+            self._abandon(waiter)
+            raise
+        self._waits[priority].append(time.monotonic() - started)
+
+        try:
+            yield
+        finally:
+            self._release(priority)
+
+    async def run(self, priority: Priority, fn: Callable[[], Awaitable[Any]]) -> Any:
+        async with self.slot(priority):
+            return await fn()
+
+    def stats(self) -> Dict[str, Any]:
+        by_priority = {}
+        for p in Priority:
+            waits = sorted(self._waits[p])
+            by_priority[p.name.lower()] = {
+                "queued": self._queued[p],
+                "completed": self._completed[p],
+                "wait_avg_ms": round(sum(waits) / len(waits) * 1000, 1) if waits else 0.0,
+                "wait_p95_ms": round(waits[int(len(waits) * 0.95) - 1 if len(waits) > 1 else 0] * 1000, 1) if waits else 0.0,
+                "wait_max_ms": round(waits[-1] * 1000, 1) if waits else 0.0
+            }
+        return {
+            "max_concurrency": self.max_concurrency,
+            "rate_limit_per_minute": self.rate_per_second * 60,
+            "in_flight": self._active,
+            "queue_depth": sum(self._queued.values()),
+            "priorities": by_priority
+        }
+
+
+# Singleton instance
+llm_scheduler = LLMScheduler(
+    max_concurrency=settings.LLM_MAX_CONCURRENCY,
+    rate_per_minute=settings.LLM_RATE_LIMIT_PER_MINUTE,
+    burst=settings.LLM_RATE_LIMIT_BURST
+)
@@ -1,8 +1,8 @@
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
 from backend.config import settings
-from backend.database import engine, Base, get_db
+from backend.database import engine, Base, get_db, sql_instrumentation
 # Import models to ensure tables are created
 from backend import models
 import os
@@ -44,6 +44,41 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+def _route_template(request: Request) -> str:
+    """Matched route with its router prefix, e.g. /api/v1/admin/conversations/{conversation_id}."""
+    route = request.scope.get("route")
+    if route is None:
+        return "(no route)"
+    # Routes of included routers carry their own path only; the prefix is what precedes it in the URL
+    concrete = route.path_format
+    for name, value in request.path_params.items():
+        concrete = concrete.replace("{" + name + "}", str(value))
+    path = request.url.path
+    prefix = path[:len(path) - len(concrete)] if path.endswith(concrete) else ""
+    return prefix + route.path
+
+@app.middleware("http")
+async def sql_instrumentation_middleware(request: Request, call_next):
+    """
+    Statement count and DB time per request (totals at /admin/metrics/sql), plus
+    X-DB-* response headers when SQL_DEBUG_HEADERS is on. For streamed responses
+    this covers the work done before the first byte; agent turns have their own scope.
+    """
+    if not sql_instrumentation.enabled:
+        return await call_next(request)
+    with sql_instrumentation.scope(f"{request.method} {request.url.path}") as sql:
+        response = await call_next(request)
+        # Name by route template so /conversations/1 and /conversations/2 add up
+        sql.name = f"{request.method} {_route_template(request)}"
+    if settings.SQL_DEBUG_HEADERS:
+        summary = sql.summary()
+        response.headers["X-DB-Statements"] = str(summary["statements"])
+        response.headers["X-DB-Time-Ms"] = str(summary["db_ms"])
+        if summary["slowest"]:
+            slowest = summary["slowest"][0]
+            response.headers["X-DB-Slowest"] = f"{slowest['ms']}ms {slowest['statement'][:200]}".encode("ascii", "replace").decode()
+    return response
+
 @app.get("/")
 def read_root():
     return {
@@ -69,6 +104,29 @@ def health_check(db: Session = Depends(get_db)):
 from backend.api.v1.api import api_router
 app.include_router(api_router, prefix=settings.API_V1_STR)
 
+from backend.services.chat_history import chat_history
+
+@app.on_event("startup")
+def start_chat_history_workers():
+    # Replays any journaled turns a previous process didn't get to write
+    chat_history.start()
+
+@app.on_event("shutdown")
+def stop_chat_history_workers():
+    # Flushes queued turns before exit
+    chat_history.shutdown()
+
+from backend.services.product_enrichment import enrichment_queue
+
+@app.on_event("startup")
+def start_enrichment_workers():
+    # Also requeues jobs a crashed worker left claimed
+    enrichment_queue.start()
+
+@app.on_event("shutdown")
+def stop_enrichment_workers():
+    enrichment_queue.stop()
+
 from fastapi.staticfiles import StaticFiles
 app.mount("/static", StaticFiles(directory="backend/static"), name="static")
 
@@ -0,0 +1,203 @@
+"""
+Versioned Schema Migrations
+Each Migration has a version, an idempotent schema step (`up`) and optionally a
+batched Backfill. Applied versions are recorded in `schema_migrations`; a
+backfill's progress (last key done) is recorded in `schema_migration_progress`
+after every batch, so an interrupted run resumes where it stopped.
+
+Works on SQLite and Postgres. On Postgres, schema steps run with a short
+lock_timeout (fail fast instead of queueing behind long transactions), indexes
+are built CONCURRENTLY, and an advisory lock keeps two runners from racing.
+
+Usage: see migrate.py
+"""
+import time
+from typing import Callable, Dict, List, Optional
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine
+
+ADVISORY_LOCK_ID = 74_210_016 # arbitrary, shared by all migration runners
+
+
+class Backfill:
+    """
+    Runs `sql` over `table` in key ranges: the statement gets :low and :high and must
+    only touch rows with low < key <= high. Each batch is its own short transaction.
+    """
+    def __init__(self, table: str, sql: str, key: str = "id", batch_size: int = 1000, pause_seconds: float = 0.0,
+                 dialect: Optional[str] = None):
+        self.table = table
+        self.sql = text(sql)
+        self.key = key
+        self.batch_size = batch_size
+        self.pause_seconds = pause_seconds # breathing room between batches on a busy database
+        self.dialect = dialect # only run on this database backend (e.g. "postgresql")
+
+
+class Migration:
+    def __init__(self, version: int, name: str, up: Optional[Callable[[Connection], None]] = None,
+                 backfill: Optional[Backfill] = None):
+        self.version = version
+        self.name = name
+        self.up = up
+        self.backfill = backfill
+
+
+# --- Idempotent schema helpers (for use in Migration.up) ---
+
+def add_column(conn: Connection, table: str, name: str, col_type: str):
+    columns = [c["name"] for c in inspect(conn).get_columns(table)]
+    if name in columns:
+        print(f"  {table}.{name} already exists")
+        return
+    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {col_type}"))
+    print(f"  Added {table}.{name}")
+
+
+def create_index(conn: Connection, name: str, table: str, columns: List[str], unique: bool = False,
+                 using: Optional[str] = None):
+    """
+    CREATE INDEX IF NOT EXISTS; CONCURRENTLY on Postgres so writes aren't blocked while it builds.
+    `using` picks a Postgres index method (e.g. "gin").
+    """
+    cols = ", ".join(columns)
+    create = "CREATE UNIQUE INDEX" if unique else "CREATE INDEX"
+    if conn.dialect.name == "postgresql":
+        # A failed concurrent build leaves an INVALID index behind; drop it so the retry rebuilds it
+        invalid = conn.execute(text(
+            "SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+            "WHERE c.relname = :name AND NOT i.indisvalid"
+        ), {"name": name}).first()
+        if invalid:
+            conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+        method = f" USING {using}" if using else ""
+        conn.execute(text(f"{create} CONCURRENTLY IF NOT EXISTS {name} ON {table}{method} ({cols})"))
+    else:
+        conn.execute(text(f"{create} IF NOT EXISTS {name} ON {table} ({cols})"))
+    print(f"  Index {name} on {table} ({cols}) ready")
+
+
+class MigrationRunner:
+    def __init__(self, engine: Engine, migrations: List[Migration], lock_timeout: str = "5s"):
+        versions = [m.version for m in migrations]
+        if versions != sorted(set(versions)):
+            raise ValueError("Migration versions must be unique and ascending")
+        self.engine = engine
+        self.migrations = migrations
+        self.lock_timeout = lock_timeout
+        self.is_postgres = engine.dialect.name == "postgresql"
+
+    def _connect(self) -> Connection:
+        # Autocommit: every step commits on its own, and CONCURRENTLY needs to run outside a transaction
+        conn = self.engine.connect().execution_options(isolation_level="AUTOCOMMIT")
+        if self.is_postgres:
+            conn.execute(text(f"SET lock_timeout = '{self.lock_timeout}'"))
+        return conn
+
+    def _ensure_tables(self, conn: Connection):
+        conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_migrations ("
+            "version INTEGER PRIMARY KEY, name VARCHAR NOT NULL, applied_at VARCHAR NOT NULL)"
+        ))
+        conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_migration_progress ("
+            "version INTEGER PRIMARY KEY, last_key BIGINT NOT NULL, updated_at VARCHAR NOT NULL)"
+        ))
+
+    def applied_versions(self, conn: Connection) -> Dict[int, str]:
+        self._ensure_tables(conn)
+        return {row[0]: row[1] for row in conn.execute(text("SELECT version, applied_at FROM schema_migrations"))}
+
+    def status(self) -> List[Dict]:
+        with self._connect() as conn:
+            applied = self.applied_versions(conn)
+            progress = {row[0]: row[1] for row in conn.execute(
+                text("SELECT version, last_key FROM schema_migration_progress")
+            )}
+        return [
+            {
+                "version": m.version,
+                "name": m.name,
+                "applied_at": applied.get(m.version),
+                "backfill_last_key": progress.get(m.version) if m.version not in applied else None
+            }
+            for m in self.migrations
+        ]
+
+    def upgrade(self, target: Optional[int] = None) -> int:
+        """Applies pending migrations up to `target` (default: all). Returns how many were applied."""
+        with self._connect() as conn:
+            if self.is_postgres:
+                if not conn.execute(text("SELECT pg_try_advisory_lock(:id)"), {"id": ADVISORY_LOCK_ID}).scalar():
+                    raise RuntimeError("Another migration run holds the lock")
+            try:
+                applied = self.applied_versions(conn)
+                count = 0
+                for migration in self.migrations:
+                    if migration.version in applied or (target is not None and migration.version > target):
+                        continue
+                    self._apply(conn, migration)
+                    count += 1
+                if not count:
+                    print("Database is up to date")
+                return count
+            finally:
+                if self.is_postgres:
+                    conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": ADVISORY_LOCK_ID})
+
+    def _apply(self, conn: Connection, migration: Migration):
+        print(f"Applying {migration.version:04d} {migration.name}...")
+        started = time.perf_counter()
+        if migration.up is not None:
+            migration.up(conn)
+        if migration.backfill is not None and migration.backfill.dialect in (None, conn.dialect.name):
+            self._run_backfill(conn, migration)
+        conn.execute(
+            text("INSERT INTO schema_migrations (version, name, applied_at) VALUES (:v, :n, :t)"),
+            {"v": migration.version, "n": migration.name, "t": _now()}
+        )
+        conn.execute(text("DELETE FROM schema_migration_progress WHERE version = :v"), {"v": migration.version})
+        print(f"Applied {migration.version:04d} in {time.perf_counter() - started:.1f}s")
+
+    def _run_backfill(self, conn: Connection, migration: Migration):
+        backfill = migration.backfill
+        low = conn.execute(
+            text("SELECT last_key FROM schema_migration_progress WHERE version = :v"), {"v": migration.version}
+        ).scalar()
+        if low is None:
+            low = (conn.execute(text(f"SELECT MIN({backfill.key}) FROM {backfill.table}")).scalar() or 1) - 1
+        else:
+            print(f"  Resuming backfill after {backfill.table}.{backfill.key} = {low}")
+        max_key = conn.execute(text(f"SELECT MAX({backfill.key}) FROM {backfill.table}")).scalar() or 0
+
+        rows = 0
+        while low < max_key:
+            high = low + backfill.batch_size
+            # Batch and its progress marker commit together, in a short transaction of their own
+            with self.engine.begin() as tx:
+                if self.is_postgres:
+                    tx.execute(text(f"SET LOCAL lock_timeout = '{self.lock_timeout}'"))
+                result = tx.execute(backfill.sql, {"low": low, "high": high})
+                rows += max(result.rowcount, 0)
+                _save_progress(tx, migration.version, high)
+            low = high
+            print(f"  Backfilled {backfill.table} up to {backfill.key} {min(high, max_key)} of {max_key}")
+            if backfill.pause_seconds:
+                time.sleep(backfill.pause_seconds)
+        print(f"  Backfill done ({rows} rows)")
+
+
+def _save_progress(conn: Connection, version: int, last_key: int):
+    updated = conn.execute(
+        text("UPDATE schema_migration_progress SET last_key = :k, updated_at = :t WHERE version = :v"),
+        {"k": last_key, "t": _now(), "v": version}
+    ).rowcount
+    if not updated:
+        conn.execute(
+            text("INSERT INTO schema_migration_progress (version, last_key, updated_at) VALUES (:v, :k, :t)"),
+            {"v": version, "k": last_key, "t": _now()}
+        )
+
+
+def _now() -> str:
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
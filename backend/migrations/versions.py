@@ -0,0 +1,62 @@
+"""
+Schema history, oldest first. Append new migrations with the next version number;
+never edit or renumber one that has shipped.
+
+Every step is idempotent: databases that already ran the old migrate_db*.py
+scripts (versions 1-4) or were created by create_all just get them recorded.
+"""
+from backend.migrations.runner import Backfill, Migration, add_column, create_index
+from backend.services.product_search import POSTGRES_BACKFILL, install_search_index
+
+
+def product_search_index(conn):
+    if conn.dialect.name == "postgresql":
+        # Column and GIN index first, so the index builds CONCURRENTLY (install_search_index's own is a no-op then)
+        add_column(conn, "products", "search_vector", "TSVECTOR")
+        create_index(conn, "ix_products_search_vector", "products", ["search_vector"], using="gin")
+    install_search_index(conn)
+
+
+MIGRATIONS = [
+    Migration(1, "users.bot_opt_in", lambda conn: add_column(conn, "users", "bot_opt_in", "BOOLEAN DEFAULT FALSE")),
+    Migration(2, "products.visual_description", lambda conn: add_column(conn, "products", "visual_description", "TEXT")),
+    Migration(3, "messages reply metadata", lambda conn: (
+        add_column(conn, "messages", "model", "VARCHAR"),
+        add_column(conn, "messages", "model_tier", "VARCHAR"),
+        add_column(conn, "messages", "latency_ms", "FLOAT"),
+    )),
+    Migration(4, "conversations.summarized_through_id",
+              lambda conn: add_column(conn, "conversations", "summarized_through_id", "INTEGER")),
+    Migration(5, "composite indexes for history and latest-conversation lookups", lambda conn: (
+        create_index(conn, "ix_messages_conversation_timestamp", "messages", ["conversation_id", "timestamp"]),
+        create_index(conn, "ix_conversations_customer_platform_last", "conversations",
+                     ["customer_id", "platform", "last_message_at"]),
+    )),
+    Migration(6, "conversation counters", lambda conn: (
+        add_column(conn, "conversations", "message_count", "INTEGER NOT NULL DEFAULT 0"),
+        add_column(conn, "conversations", "last_message_id", "INTEGER"),
+    ), backfill=Backfill("conversations", """
+        UPDATE conversations SET
+            message_count = (SELECT COUNT(*) FROM messages WHERE messages.conversation_id = conversations.id),
+            last_message_id = (SELECT MAX(messages.id) FROM messages WHERE messages.conversation_id = conversations.id)
+        WHERE conversations.id > :low AND conversations.id <= :high
+    """)),
+    Migration(7, "keyset pagination indexes for admin lists", lambda conn: (
+        create_index(conn, "ix_conversations_last_message_at_id", "conversations", ["last_message_at", "id"]),
+        create_index(conn, "ix_orders_created_at_id", "orders", ["created_at", "id"]),
+        create_index(conn, "ix_orders_status_created_at_id", "orders", ["status", "created_at", "id"]),
+        create_index(conn, "ix_orders_customer_created_at_id", "orders", ["customer_id", "created_at", "id"]),
+        create_index(conn, "ix_products_created_at_id", "products", ["created_at", "id"]),
+    )),
+    # The enrichment_jobs table itself comes from create_all (migrate.py runs it first)
+    Migration(8, "products.enrichment_status",
+              lambda conn: add_column(conn, "products", "enrichment_status", "VARCHAR NOT NULL DEFAULT 'done'")),
+    # catalog_imports / catalog_import_errors come from create_all
+    Migration(9, "products.sku for catalog import dedupe", lambda conn: (
+        add_column(conn, "products", "sku", "VARCHAR"),
+        create_index(conn, "ux_products_sku", "products", ["sku"], unique=True),
+    )),
+    # SQLite fills the new FTS5 index in one pass; Postgres backfills search_vector in batches
+    Migration(10, "product full-text search index and sync triggers", product_search_index,
+              backfill=Backfill("products", POSTGRES_BACKFILL, dialect="postgresql")),
+]
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, Float, Text, JSON, Enum
+from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, Float, Text, JSON, Enum, Index, event
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 import enum
@@ -19,6 +19,12 @@ class ComplaintStatus(str, enum.Enum):
     RESOLVED = "resolved"
     ESCALATED = "escalated"
 
+class EnrichmentStatus(str, enum.Enum):
+    PENDING = "pending"
+    PROCESSING = "processing"
+    DONE = "done"
+    FAILED = "failed"
+
 class Role(str, enum.Enum):
     SUPER_ADMIN = "super_admin"
     ADMIN = "admin"
@@ -51,6 +57,7 @@ class Product(Base):
     __tablename__ = "products"
 
     id = Column(Integer, primary_key=True, index=True)
+    sku = Column(String, nullable=True) # supplier SKU; catalog imports deduplicate on it (or on name without one)
     name = Column(String, index=True)
     description = Column(Text)
     category = Column(String, index=True)
@@ -63,9 +70,25 @@ class Product(Base):
     embedding_id = Column(String, nullable=True) # Reference to vector DB ID
     metadata_json = Column(JSON, nullable=True)
     is_available = Column(Boolean, default=True)
+    # Vision description + embedding + index, run by the enrichment queue; rows predating it count as done
+    enrichment_status = Column(String, nullable=False, default=EnrichmentStatus.PENDING, server_default="done")
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     order_items = relationship("OrderItem", back_populates="product")
+    enrichment_jobs = relationship("EnrichmentJob", back_populates="product")
+
+    __table_args__ = (
+        # Keyset pagination (newest first)
+        Index("ix_products_created_at_id", "created_at", "id"),
+        Index("ux_products_sku", "sku", unique=True), # NULLs don't collide
+    )
+
+
+@event.listens_for(Product.__table__, "after_create")
+def _create_product_search_index(target, connection, **kw):
+    # Full-text index + sync triggers aren't expressible as table metadata (migration 10 adds them to old databases)
+    from backend.services.product_search import install_search_index
+    install_search_index(connection)
 
 
 class Order(Base):
@@ -84,6 +107,73 @@ class Order(Base):
     items = relationship("OrderItem", back_populates="order")
     refunds = relationship("Refund", back_populates="order")
 
+    __table_args__ = (
+        # Keyset pagination (newest first), unfiltered and by status / customer
+        Index("ix_orders_created_at_id", "created_at", "id"),
+        Index("ix_orders_status_created_at_id", "status", "created_at", "id"),
+        Index("ix_orders_customer_created_at_id", "customer_id", "created_at", "id"),
+    )
+
+
+class EnrichmentJob(Base):
+    """Durable product enrichment work item (see services/product_enrichment.py)."""
+    __tablename__ = "enrichment_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False, index=True)
+    status = Column(String, nullable=False, default=EnrichmentStatus.PENDING)
+    step = Column(String, nullable=True) # last step completed: describe, embed, index
+    attempts = Column(Integer, nullable=False, default=0)
+    run_after = Column(DateTime(timezone=True), nullable=False) # not before (retry backoff)
+    locked_at = Column(DateTime(timezone=True), nullable=True) # claimed by a worker; stale claims are requeued
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+    product = relationship("Product", back_populates="enrichment_jobs")
+
+    __table_args__ = (
+        # Workers claim the oldest due pending job
+        Index("ix_enrichment_jobs_status_run_after", "status", "run_after"),
+    )
+
+
+class CatalogImport(Base):
+    """A bulk catalog upload (CSV / JSONL), processed in batches; see services/catalog_import.py."""
+    __tablename__ = "catalog_imports"
+
+    id = Column(Integer, primary_key=True, index=True)
+    filename = Column(String, nullable=False)
+    path = Column(String, nullable=False) # file being read (kept so the import can resume)
+    format = Column(String, nullable=False) # csv, jsonl
+    mode = Column(String, nullable=False, default="skip") # duplicates: skip, update
+    status = Column(String, nullable=False, default="running") # running, done, failed
+    file_bytes = Column(Integer, nullable=True)
+    bytes_read = Column(Integer, nullable=False, default=0)
+    rows_done = Column(Integer, nullable=False, default=0) # rows committed; a resume continues after this one
+    inserted = Column(Integer, nullable=False, default=0)
+    updated = Column(Integer, nullable=False, default=0)
+    duplicates = Column(Integer, nullable=False, default=0)
+    invalid = Column(Integer, nullable=False, default=0)
+    error = Column(Text, nullable=True) # why the import stopped, if it failed
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), nullable=True) # last committed batch
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+    errors = relationship("CatalogImportError", back_populates="catalog_import")
+
+
+class CatalogImportError(Base):
+    __tablename__ = "catalog_import_errors"
+
+    id = Column(Integer, primary_key=True, index=True)
+    import_id = Column(Integer, ForeignKey("catalog_imports.id"), nullable=False, index=True)
+    row_number = Column(Integer, nullable=False) # CSV: data row after the header; JSONL: line number (1-based)
+    error = Column(Text, nullable=False)
+    raw = Column(Text, nullable=True)
+
+    catalog_import = relationship("CatalogImport", back_populates="errors")
+
 
 class OrderItem(Base):
     __tablename__ = "order_items"
@@ -121,11 +211,22 @@ class Conversation(Base):
     platform = Column(String, default="whatsapp") # whatsapp, web, etc.
     log_file_path = Column(String, nullable=True) # Or store messages in a structured way
     summary = Column(Text, nullable=True)
+    summarized_through_id = Column(Integer, nullable=True) # last message folded into summary
+    # Maintained with each message insert (backfilled by migration 6, see migrate.py)
+    message_count = Column(Integer, default=0, server_default="0", nullable=False)
+    last_message_id = Column(Integer, nullable=True)
     last_message_at = Column(DateTime(timezone=True), server_default=func.now())
     
     messages = relationship("Message", back_populates="conversation")
     customer = relationship("User", back_populates="conversations")
 
+    __table_args__ = (
+        # Latest conversation for a customer on a platform
+        Index("ix_conversations_customer_platform_last", "customer_id", "platform", "last_message_at"),
+        # Admin list keyset pagination (most recently active first)
+        Index("ix_conversations_last_message_at_id", "last_message_at", "id"),
+    )
+
 
 class Message(Base):
     __tablename__ = "messages"
@@ -135,9 +236,18 @@ class Message(Base):
     sender = Column(String) # user, bot, agent
     content = Column(Text)
     timestamp = Column(DateTime(timezone=True), server_default=func.now())
+    # Agent replies only: which model answered and how long it took
+    model = Column(String, nullable=True)
+    model_tier = Column(String, nullable=True) # fast, full, cache
+    latency_ms = Column(Float, nullable=True)
     
     conversation = relationship("Conversation", back_populates="messages")
 
+    __table_args__ = (
+        # Recent history of a conversation
+        Index("ix_messages_conversation_timestamp", "conversation_id", "timestamp"),
+    )
+
 
 class Complaint(Base):
     __tablename__ = "complaints"
@@ -1,6 +1,5 @@
 from typing import List, Dict, Any
 from langchain_core.embeddings import Embeddings
-from langchain_community.vectorstores import Pinecone
 from backend.config import settings
 import time
 
@@ -43,11 +42,16 @@ class RAGService:
             {"id": 3, "name": "Leather Jacket", "price": 120.00, "similarity": 0.82}
         ]
 
-    def add_product_to_index(self, product_text: str, metadata: Dict[str, Any]):
+    def add_product_to_index(self, product_text: str, metadata: Dict[str, Any], embedding: List[float] = None) -> str:
         """
-        Embed and index a product.
+        Embed (unless `embedding` is given) and index a product. Returns its vector id,
+        derived from the product id so re-indexing replaces the entry.
         """
-        # self.vector_store.add_texts([product_text], metadatas=[metadata])
+        vector_id = f"product-{metadata['id']}"
+        if embedding is None:
+            embedding = self.embeddings.embed_documents([product_text])[0]
+        # self.vector_store.add_embeddings([(product_text, embedding)], metadatas=[metadata], ids=[vector_id])
         print(f"[MOCK] Indexed product: {metadata.get('name')}")
+        return vector_id
 
 rag_service = RAGService()
@@ -1,32 +1,125 @@
+from typing import AsyncIterator, Tuple
+from langchain_core.messages import HumanMessage
+from backend.config import settings
+from backend.agents.base import BaseAgent
 from backend.agents.sales import SalesAgent
 from backend.agents.support import SupportAgent
 from backend.agents.visual_search import VisualSearchAgent
+from backend.database import sql_instrumentation
+from backend.llm.groq_client import get_groq_client
+from backend.llm.resilience import get_caller
+from backend.llm.scheduler import Priority
+from backend.services.intent_classifier import IntentClassifier, LABELS
 
 # Instantiate agents once (singleton pattern for checking)
 sales_agent = SalesAgent()
 support_agent = SupportAgent()
 visual_search_agent = VisualSearchAgent()
 
-async def route_and_process(text: str, image_url: str = None, user_id: str = "guest", user_details: dict = None) -> str:
+AGENTS_BY_INTENT = {
+    "sales": sales_agent,
+    "support": support_agent,
+    "visual": visual_search_agent,
+}
+
+intent_classifier = IntentClassifier.load_or_train()
+router_llm = get_groq_client(temperature=0)
+# Deadline and circuit breaker of its own: a degraded model must not hold up routing
+router_caller = get_caller("router", deadline_seconds=settings.INTENT_LLM_DEADLINE_SECONDS)
+
+ROUTER_PROMPT = """Classify the customer message for a fashion store into exactly one intent:
+- sales: browsing, product questions, recommendations, greetings, buying
+- support: orders, delivery, tracking, returns, refunds, complaints, account or payment problems
+- visual: wants to find products from a photo, picture or screenshot
+
+Reply with one word: sales, support or visual.
+
+Message: {text}"""
+
+async def classify_intent(text: str) -> Tuple[str, float]:
+    """
+    Returns (intent, confidence) from the local classifier, asking the LLM
+    only when the classifier isn't confident enough. If the LLM times out, fails
+    or its circuit is open, the classifier's pick stands.
+    """
+    intent, confidence = intent_classifier.predict(text)
+    if confidence >= settings.INTENT_CONFIDENCE_THRESHOLD or not settings.INTENT_LLM_FALLBACK:
+        return intent, confidence
+
+    try:
+        prompt = [HumanMessage(content=ROUTER_PROMPT.format(text=text))]
+        response = await router_caller.call(lambda: router_llm.ainvoke(prompt), canned=None, priority=Priority.CHAT)
+        if response is None:
+            print(f"[Router] LLM unavailable, keeping {intent}")
+            return intent, confidence
+        answer = response.content.strip().lower()
+        for label in LABELS:
+            if label in answer:
+                print(f"[Router] Low confidence ({confidence:.2f} {intent}), LLM chose {label}")
+                return label, confidence
+    except Exception as e:
+        print(f"[Router] LLM fallback failed, keeping {intent}: {e}")
+    return intent, confidence
+
+async def _route_text(text: str) -> Tuple[BaseAgent, float]:
+    intent, confidence = await classify_intent(text)
+    print(f"[Router] Intent {intent} ({confidence:.2f})")
+    return AGENTS_BY_INTENT[intent], confidence
+
+async def select_text_agent(text: str) -> BaseAgent:
+    """
+    Picks the agent for a text-only message.
+    """
+    agent, _ = await _route_text(text)
+    return agent
+
+async def select_agent(text: str, image_url: str = None) -> Tuple[BaseAgent, float | None]:
+    """
+    Picks the agent for a message (images always go to visual search).
+    Returns it with the routing confidence (None for images), which feeds model tiering.
+    """
+    if image_url:
+        return visual_search_agent, None
+    return await _route_text(text)
+
+async def route_and_process(text: str, image_url: str = None, user_id: str = "guest", user_details: dict = None,
+                            agent: BaseAgent = None, **run_kwargs) -> str:
     """
     Core routing logic to determine which agent handles the request.
     Returns the agent's response as a string.
+    Callers that already routed the message (e.g. batch jobs) can pass `agent`;
+    extra keyword arguments go to the agent's run().
     """
-    
+
     # 1. Handle Images (Visual Search)
     if image_url:
         print(f"[Router] Dispatching to VisualSearchAgent. Image: {image_url}")
-        return await visual_search_agent.run_with_image(text, image_url, user_id=user_id, user_details=user_details)
-    
+        with sql_instrumentation.scope(f"turn {visual_search_agent.name}"):
+            return await visual_search_agent.run_with_image(text, image_url, user_id=user_id, user_details=user_details, **run_kwargs)
+
     # 2. Handle Text Router
-    message_lower = text.lower()
-    
-    # Simple keyword-based routing for V1
-    # In V2, we use an LLM RouterAgent
-    if any(x in message_lower for x in ["order", "refund", "return", "track", "help", "late"]):
-        print(f"[Router] Dispatching to SupportAgent: {text}")
-        return await support_agent.run(text, user_id=user_id, user_details=user_details)
-    else:
-        # Default to sales for broad queries
-        print(f"[Router] Dispatching to SalesAgent: {text}")
-        return await sales_agent.run(text, user_id=user_id, user_details=user_details)
+    if agent is None:
+        # Routing confidence also feeds the agent's model tiering
+        agent, run_kwargs["route_confidence"] = await _route_text(text)
+    print(f"[Router] Dispatching to {agent.name}: {text}")
+    # Each turn's statements are reported on their own (and still count toward the request)
+    with sql_instrumentation.scope(f"turn {agent.name}"):
+        return await agent.run(text, user_id=user_id, user_details=user_details, **run_kwargs)
+
+async def route_and_stream(text: str, image_url: str = None, user_id: str = "guest", user_details: dict = None) -> AsyncIterator[str]:
+    """
+    Streaming counterpart of route_and_process.
+    Yields the routed agent's response tokens as they are generated.
+    """
+    if image_url:
+        print(f"[Router] Streaming from VisualSearchAgent. Image: {image_url}")
+        with sql_instrumentation.scope(f"turn {visual_search_agent.name}"):
+            async for token in visual_search_agent.stream_with_image(text, image_url, user_id=user_id, user_details=user_details):
+                yield token
+        return
+
+    agent, confidence = await _route_text(text)
+    print(f"[Router] Streaming from {agent.name}: {text}")
+    with sql_instrumentation.scope(f"turn {agent.name}"):
+        async for token in agent.stream(text, user_id=user_id, user_details=user_details, route_confidence=confidence):
+            yield token
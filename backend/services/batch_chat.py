@@ -0,0 +1,145 @@
+"""
+Batch Chat Processing
+Runs large sets of chat requests (QA replays, backfills, campaign replies)
+through route_and_process with bounded parallelism.
+
+Requests are grouped per user: each user's messages run in order against one
+history fetch, and all of that user's turns are saved in one transaction.
+Different users run in parallel.
+
+CLI (reads ChatRequest JSON lines, writes NDJSON results):
+    python -m backend.services.batch_chat requests.jsonl > results.ndjson
+"""
+import asyncio
+import time
+from collections import Counter, OrderedDict
+from typing import Any, AsyncIterator, Dict, Iterable, List, Tuple
+from backend.config import settings
+from backend.services.agent_router import route_and_process, select_agent
+from backend.services.chat_history import chat_history
+
+HISTORY_WINDOW = 10
+
+
+async def _process_user(user_id: str, entries: List[Tuple[int, Any]], queue: asyncio.Queue, agent_counts: Counter):
+    """
+    Processes one user's messages in order; results are put on the queue as they finish.
+    """
+    first = entries[0][1]
+    turns = []
+    pending = list(entries)
+    try:
+        memory_ctx = await chat_history.aget_context(user_id, full_name=first.user_name, email=first.email)
+        memory_ctx["history"] = list(memory_ctx.get("history", []))
+
+        while pending:
+            index, item = pending.pop(0)
+            started = time.perf_counter()
+            try:
+                agent, route_confidence = await select_agent(item.message, item.image_url)
+                reply_meta = {}
+                response = await route_and_process(
+                    item.message,
+                    item.image_url,
+                    user_id=user_id,
+                    user_details={"full_name": item.user_name, "email": item.email},
+                    agent=agent,
+                    memory_ctx=memory_ctx,
+                    persist=False,
+                    route_confidence=route_confidence,
+                    turn_meta=reply_meta
+                )
+                turns.append((item.message, response, reply_meta))
+                memory_ctx["history"] = (memory_ctx["history"] + [
+                    {"sender": "user", "content": item.message},
+                    {"sender": "agent", "content": response},
+                ])[-HISTORY_WINDOW:]
+                agent_counts[agent.name] += 1
+                result = {"index": index, "user_id": user_id, "status": "ok", "agent": agent.name,
+                          "model_tier": reply_meta.get("model_tier"), "response": response}
+            except Exception as e:
+                result = {"index": index, "user_id": user_id, "status": "error", "error": str(e)}
+            result["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+            await queue.put(result)
+    except Exception as e:
+        # History fetch failed: report every remaining message for this user
+        for index, _ in pending:
+            await queue.put({"index": index, "user_id": user_id, "status": "error", "error": str(e), "elapsed_ms": 0.0})
+    finally:
+        if turns:
+            try:
+                await chat_history.asave_interactions(user_id, turns)
+            except Exception as e:
+                print(f"[Batch] Failed to save {len(turns)} turns for {user_id}: {e}")
+
+
+async def process_batch(requests: Iterable[Any], concurrency: int = None) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Processes chat requests (objects with ChatRequest's fields) and yields one
+    result dict per request as it completes, followed by a final summary dict.
+    """
+    items = list(requests)
+    concurrency = max(concurrency or settings.BATCH_CHAT_CONCURRENCY, 1)
+
+    by_user: "OrderedDict[str, List[Tuple[int, Any]]]" = OrderedDict()
+    for index, item in enumerate(items):
+        by_user.setdefault(item.user_id or "guest", []).append((index, item))
+
+    queue: asyncio.Queue = asyncio.Queue()
+    semaphore = asyncio.Semaphore(concurrency)
+    agent_counts: Counter = Counter()
+
+    async def run_user(user_id: str, entries: List[Tuple[int, Any]]):
+        async with semaphore:
+            await _process_user(user_id, entries, queue, agent_counts)
+
+    started = time.perf_counter()
+    tasks = [asyncio.create_task(run_user(user_id, entries)) for user_id, entries in by_user.items()]
+    errors = 0
+    try:
+        for _ in range(len(items)):
+            result = await queue.get()
+            errors += result["status"] == "error"
+            yield result
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    yield {
+        "summary": {
+            "total": len(items),
+            "succeeded": len(items) - errors,
+            "failed": errors,
+            "users": len(by_user),
+            "per_agent": dict(agent_counts),
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1)
+        }
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+    import contextlib
+    import json
+    import sys
+    from backend.api.v1.endpoints.chat import ChatRequest
+
+    parser = argparse.ArgumentParser(description="Run a JSONL file of chat requests and print NDJSON results.")
+    parser.add_argument("path", help="JSONL file, one ChatRequest object per line")
+    parser.add_argument("--concurrency", type=int, default=None)
+    args = parser.parse_args()
+
+    with open(args.path, encoding="utf-8") as f:
+        batch = [ChatRequest(**json.loads(line)) for line in f if line.strip()]
+
+    out = sys.stdout
+
+    async def main():
+        async for result in process_batch(batch, args.concurrency):
+            out.write(json.dumps(result, default=str) + "\n")
+            out.flush()
+
+    # Keep agent/router logging off the NDJSON stream
+    with contextlib.redirect_stdout(sys.stderr):
+        asyncio.run(main())
@@ -0,0 +1,301 @@
+"""
+Bulk Catalog Import
+Streams a supplier catalog (CSV with a header row, or JSON Lines) into products
+without loading it into memory:
+
+  - each row is validated against ProductCreate; CSV list columns (size_options,
+    color_options) take "S|M|L", "S,M,L" or a JSON list
+  - rows are deduplicated by SKU, or by name for rows without one, against the
+    database and against earlier rows of the file; duplicates are skipped, or
+    update the existing product in "update" mode
+  - rows are written in batches of `batch_size`, each batch in one transaction
+    together with its rows' errors and the import's progress (rows_done), so an
+    interrupted import resumes after the last committed row
+  - every product inserted (or whose text / image an update changed) gets an
+    enrichment job, so vision descriptions fan out over the enrichment queue's
+    bounded worker pool instead of running in the import
+
+Entry points: POST /products/import (upload, runs in a background thread) and
+import_catalog.py (CLI).
+"""
+import csv
+import io
+import json
+import os
+import threading
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+import logging
+from pydantic import ValidationError
+from sqlalchemy import select
+from backend.api.v1.endpoints.products import ProductCreate
+from backend.config import settings
+from backend.database import SessionLocal, sql_instrumentation
+from backend.models import CatalogImport, CatalogImportError, EnrichmentStatus, Product
+from backend.services.product_enrichment import enrichment_queue, new_job
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {".csv": "csv", ".jsonl": "jsonl", ".ndjson": "jsonl"}
+MODES = ("skip", "update")
+LIST_FIELDS = ("size_options", "color_options")
+ENRICHED_FIELDS = ("name", "description", "category", "image_url") # an update to these needs re-enrichment
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def detect_format(filename: str) -> str:
+    ext = os.path.splitext(filename or "")[1].lower()
+    if ext not in FORMATS:
+        raise ValueError(f"Unsupported catalog format {ext or '(none)'}: use .csv, .jsonl or .ndjson")
+    return FORMATS[ext]
+
+
+def iter_rows(text: io.TextIOBase, fmt: str) -> Iterator[Tuple[int, Optional[Dict[str, Any]], Optional[str], str]]:
+    """Yields (row number, data, parse error, raw text) one row at a time."""
+    if fmt == "csv":
+        for row_number, row in enumerate(csv.DictReader(text), 1):
+            raw = json.dumps(row, default=str)
+            if None in row:
+                yield row_number, None, "More fields than the header has columns", raw
+            else:
+                yield row_number, row, None, raw
+        return
+    for row_number, line in enumerate(text, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            data = json.loads(line)
+        except ValueError as e:
+            yield row_number, None, f"Invalid JSON: {e}", line
+            continue
+        if not isinstance(data, dict):
+            yield row_number, None, "Expected a JSON object", line
+        else:
+            yield row_number, data, None, line
+
+
+def _split_list(value: str) -> List[str]:
+    value = value.strip()
+    if value.startswith("["):
+        return json.loads(value)
+    separator = "|" if "|" in value else ","
+    return [part.strip() for part in value.split(separator) if part.strip()]
+
+
+def parse_row(data: Dict[str, Any], fmt: str) -> ProductCreate:
+    """Validates one row; CSV cells are strings, so blanks fall back to field defaults and lists get split."""
+    if fmt == "csv":
+        fields = ProductCreate.model_fields
+        cleaned = {}
+        for key, value in data.items():
+            key = (key or "").strip()
+            value = value.strip() if isinstance(value, str) else value
+            if value == "" and key in fields and not fields[key].is_required():
+                continue
+            if key in LIST_FIELDS and isinstance(value, str):
+                value = _split_list(value)
+            cleaned[key] = value
+        data = cleaned
+    product = ProductCreate(**data)
+    if product.sku is not None:
+        product.sku = product.sku.strip() or None
+    return product
+
+
+def _describe(error: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(map(str, e['loc']))}: {e['msg']}" for e in error.errors())
+
+
+def import_summary(imp: CatalogImport, errors: List[CatalogImportError] = ()) -> Dict[str, Any]:
+    return {
+        "id": imp.id,
+        "filename": imp.filename,
+        "format": imp.format,
+        "mode": imp.mode,
+        "status": imp.status,
+        "progress": round(min(imp.bytes_read / imp.file_bytes, 1.0), 3) if imp.file_bytes else None,
+        "rows_done": imp.rows_done,
+        "inserted": imp.inserted,
+        "updated": imp.updated,
+        "duplicates": imp.duplicates,
+        "invalid": imp.invalid,
+        "error": imp.error,
+        "created_at": imp.created_at,
+        "updated_at": imp.updated_at,
+        "finished_at": imp.finished_at,
+        "errors": [{"row": e.row_number, "error": e.error, "raw": e.raw} for e in errors],
+    }
+
+
+class CatalogImporter:
+    def __init__(self, batch_size: int = 500, stale_seconds: float = 120):
+        self.batch_size = batch_size
+        self.stale_seconds = stale_seconds
+        self._active = set() # import ids running in this process
+        self._lock = threading.Lock()
+
+    def create(self, filename: str, path: str, mode: str = "skip") -> int:
+        """Records a new import of the file at `path` (not started yet)."""
+        if mode not in MODES:
+            raise ValueError(f"Unknown mode {mode}: use one of {', '.join(MODES)}")
+        fmt = detect_format(filename)
+        with SessionLocal() as db:
+            imp = CatalogImport(
+                filename=filename, path=os.path.abspath(path), format=fmt, mode=mode,
+                status="running", file_bytes=os.path.getsize(path), updated_at=_now()
+            )
+            db.add(imp)
+            db.commit()
+            return imp.id
+
+    def check_resumable(self, import_id: int, force: bool = False):
+        """
+        Raises LookupError / ValueError unless the import exists and nothing is running it.
+        `force` skips the staleness check (you know the process that ran it is gone).
+        """
+        with SessionLocal() as db:
+            imp = db.get(CatalogImport, import_id)
+            if imp is None:
+                raise LookupError(f"Import {import_id} not found")
+            if imp.status == "done":
+                raise ValueError(f"Import {import_id} already finished")
+            with self._lock:
+                if import_id in self._active:
+                    raise ValueError(f"Import {import_id} is running")
+            if imp.status == "running" and imp.updated_at is not None and not force:
+                updated_at = imp.updated_at if imp.updated_at.tzinfo else imp.updated_at.replace(tzinfo=timezone.utc)
+                idle = (_now() - updated_at).total_seconds()
+                if idle < self.stale_seconds:
+                    raise ValueError(f"Import {import_id} made progress {idle:.0f}s ago; another process may be running it "
+                                     f"(resume after {self.stale_seconds:.0f}s idle)")
+            if not os.path.exists(imp.path):
+                raise ValueError(f"Import {import_id}: file {imp.path} is gone")
+
+    def start(self, import_id: int):
+        """Runs the import in a background thread."""
+        threading.Thread(target=self.run, args=(import_id,), name=f"catalog-import-{import_id}", daemon=True).start()
+
+    def run(self, import_id: int, progress: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """Imports (or resumes) `import_id` in the calling thread; `progress` gets a summary after each batch."""
+        with self._lock:
+            if import_id in self._active:
+                raise ValueError(f"Import {import_id} is running")
+            self._active.add(import_id)
+        try:
+            with sql_instrumentation.scope("catalog import"), SessionLocal() as db:
+                imp = db.get(CatalogImport, import_id)
+                imp.status = "running"
+                imp.error = None
+                db.commit()
+                try:
+                    self._run(db, imp, progress)
+                except Exception as e:
+                    db.rollback()
+                    imp.status = "failed"
+                    imp.error = f"{type(e).__name__}: {e}"[:2000]
+                    db.commit()
+                    logger.error(f"[Import] Catalog import {import_id} stopped after row {imp.rows_done}: {e}")
+                    return import_summary(imp)
+                if os.path.dirname(imp.path) == os.path.abspath(settings.CATALOG_IMPORT_DIR):
+                    os.remove(imp.path) # our copy of an upload; files imported from the CLI are left alone
+                return import_summary(imp)
+        finally:
+            with self._lock:
+                self._active.discard(import_id)
+
+    def _run(self, db, imp: CatalogImport, progress):
+        resume_after = imp.rows_done
+        if resume_after:
+            print(f"[Import] Resuming catalog import {imp.id} after row {resume_after}")
+        seen = set() # dedupe keys of earlier rows in this run (earlier runs' rows are in the database)
+        batch, errors = [], []
+        with open(imp.path, "rb") as raw:
+            text = io.TextIOWrapper(raw, encoding="utf-8-sig", newline="")
+            last_row = resume_after
+            for row_number, data, error, raw_row in iter_rows(text, imp.format):
+                if row_number <= resume_after:
+                    continue
+                last_row = row_number
+                if error is None:
+                    try:
+                        batch.append(parse_row(data, imp.format))
+                    except ValidationError as e:
+                        error = _describe(e)
+                    except ValueError as e: # a malformed JSON list cell
+                        error = str(e)
+                if error is not None:
+                    errors.append(CatalogImportError(import_id=imp.id, row_number=row_number, error=error, raw=raw_row[:1000]))
+                if len(batch) + len(errors) >= self.batch_size:
+                    self._commit_batch(db, imp, batch, errors, seen, last_row, raw.tell())
+                    batch, errors = [], []
+                    if progress:
+                        progress(import_summary(imp))
+            imp.status = "done"
+            imp.finished_at = _now()
+            self._commit_batch(db, imp, batch, errors, seen, last_row, imp.file_bytes or raw.tell())
+        if progress:
+            progress(import_summary(imp))
+
+    def _commit_batch(self, db, imp: CatalogImport, batch: List[ProductCreate], errors: List[CatalogImportError],
+                      seen: set, last_row: int, bytes_read: int):
+        """Writes one batch, its errors and the import's progress in a single transaction."""
+        skus = {p.sku for p in batch if p.sku}
+        names = {p.name for p in batch if not p.sku}
+        existing = {}
+        if skus:
+            existing.update({("sku", p.sku): p for p in db.scalars(select(Product).where(Product.sku.in_(skus)))})
+        if names:
+            for p in db.scalars(select(Product).where(Product.name.in_(names)).order_by(Product.id)):
+                existing.setdefault(("name", p.name), p)
+
+        inserted, to_enrich = [], []
+        for item in batch:
+            key = ("sku", item.sku) if item.sku else ("name", item.name)
+            current = existing.get(key)
+            if key in seen or (current is not None and imp.mode == "skip"):
+                imp.duplicates += 1
+                continue
+            seen.add(key)
+            if current is None:
+                product = Product(**item.dict(), enrichment_status=EnrichmentStatus.PENDING)
+                inserted.append(product)
+                continue
+            # Only fields the row supplies; a row matched by name without a SKU keeps the product's SKU
+            supplied = item.dict(exclude_unset=True)
+            if supplied.get("sku") is None:
+                supplied.pop("sku", None)
+            changed = {k for k, v in supplied.items() if getattr(current, k) != v}
+            if not changed:
+                imp.duplicates += 1
+                continue
+            for k in changed:
+                setattr(current, k, supplied[k])
+            if "image_url" in changed:
+                current.visual_description = None # describe the new image
+            if changed & set(ENRICHED_FIELDS):
+                current.enrichment_status = EnrichmentStatus.PENDING
+                to_enrich.append(current)
+            imp.updated += 1
+
+        db.add_all(inserted)
+        db.add_all(errors)
+        db.flush()
+        db.add_all([new_job(p.id) for p in inserted + to_enrich])
+        imp.inserted += len(inserted)
+        imp.invalid += len(errors)
+        imp.rows_done = last_row
+        imp.bytes_read = bytes_read
+        imp.updated_at = _now()
+        db.commit()
+        if inserted or to_enrich:
+            enrichment_queue.notify()
+
+
+catalog_importer = CatalogImporter(
+    batch_size=settings.CATALOG_IMPORT_BATCH_SIZE,
+    stale_seconds=settings.CATALOG_IMPORT_STALE_SECONDS
+)
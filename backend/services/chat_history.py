@@ -1,12 +1,62 @@
+import asyncio
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+from sqlalchemy import and_, bindparam, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from backend.models import Conversation, Message, User
-from backend.database import SessionLocal
+from backend.database import AsyncSessionLocal, SessionLocal
 from backend.llm.groq_client import get_groq_client
+from backend.llm.scheduler import Priority
+from backend.llm.resilience import get_caller
+from backend.services.message_writer import MessageWriter
+from backend.services.summary_worker import SummaryWorker
+from backend.services.context_cache import ContextCache, make_backend
+from backend.config import settings
 from langchain_core.messages import SystemMessage, HumanMessage
 
 class ChatHistoryService:
+    HISTORY_LIMIT = 10 # recent messages returned with the summary
+
     def __init__(self):
         self.llm = get_groq_client(model="llama-3.3-70b-versatile")
+        self.fallback_llm = get_groq_client(model=settings.GROQ_FALLBACK_MODEL) if settings.GROQ_FALLBACK_MODEL else None
+        self.llm_caller = get_caller("summary")
+        self._context_stmt = self._build_context_stmt()
+        # Turns are saved write-behind: journaled, then inserted in grouped transactions off the request path
+        self.writer = None
+        if settings.MESSAGE_WRITE_BEHIND_ENABLED:
+            self.writer = MessageWriter(
+                self._write_turns,
+                max_latency_ms=settings.MESSAGE_FLUSH_MAX_LATENCY_MS,
+                batch_size=settings.MESSAGE_FLUSH_BATCH_SIZE,
+                max_attempts=settings.MESSAGE_FLUSH_MAX_ATTEMPTS,
+                journal_dir=settings.MESSAGE_JOURNAL_DIR or None,
+                fsync=settings.MESSAGE_JOURNAL_FSYNC,
+                on_flushed=self._schedule_summaries
+            )
+        # Per-user context (conversation, summary, recent messages), kept current write-through.
+        # An in-process cache goes stale across uvicorn workers, so by default it needs a shared backend
+        self.context_cache = None
+        cache_enabled = settings.CONTEXT_CACHE_ENABLED
+        if cache_enabled is None:
+            cache_enabled = bool(settings.CONTEXT_CACHE_BACKEND)
+        if cache_enabled:
+            self.context_cache = ContextCache(
+                make_backend(settings.CONTEXT_CACHE_BACKEND, settings.CONTEXT_CACHE_MAX_ENTRIES, settings.CONTEXT_CACHE_MAX_MB),
+                history_limit=self.HISTORY_LIMIT,
+                ttl_seconds=settings.CONTEXT_CACHE_TTL_SECONDS,
+                settle_seconds=settings.MESSAGE_FLUSH_MAX_LATENCY_MS / 1000 + 1
+            )
+        # Summaries are refreshed in the background, every few messages or once a conversation goes idle
+        self.summaries = SummaryWorker(
+            self.summarize_conversation,
+            every_messages=settings.SUMMARY_EVERY_MESSAGES,
+            idle_seconds=settings.SUMMARY_IDLE_SECONDS,
+            max_retries=settings.SUMMARY_MAX_RETRIES,
+            retry_backoff=settings.SUMMARY_RETRY_BACKOFF_SECONDS
+        )
 
     def get_db(self):
         return SessionLocal()
@@ -60,10 +110,13 @@ class ChatHistoryService:
             content=content
         )
         db.add(msg)
+        db.flush()
         
-        # Update conversation timestamp
+        # Update conversation timestamp and counters
         conv = db.query(Conversation).get(conversation_id)
         conv.last_message_at = func.now() # handled by server_default but good to be explicit if using onupdate
+        conv.message_count = Conversation.message_count + 1
+        conv.last_message_id = msg.id
         
         db.commit()
 
@@ -71,94 +124,402 @@ class ChatHistoryService:
         """
         Retrieves the summary and recent messages for a user.
         Can optionally update user details.
+
+        Served from the context cache when possible. Otherwise existing users are served by a
+        single read-only query; the user and conversation are only created (or details updated)
+        when that finds nothing to return.
         """
-        db = self.get_db()
-        try:
-            user = self.get_or_create_user(db, identifier, full_name, email)
-            conv = self.get_or_create_conversation(db, user.id)
-            
-            # Fetch summary
-            summary = conv.summary or ""
-            
-            # Fetch recent messages (last 10)
-            messages = db.query(Message).filter(
-                Message.conversation_id == conv.id
-            ).order_by(Message.timestamp.desc()).limit(10).all()
-            
-            # They are in reverse order (newest first), flip them for context
-            history_msgs = []
-            for m in reversed(messages):
-                history_msgs.append({"sender": m.sender, "content": m.content})
-                
-            return {
-                "conversation_id": conv.id,
-                "summary": summary,
-                "history": history_msgs
-            }
-        finally:
-            db.close()
+        cached = self._cached_context(identifier, full_name, email)
+        if cached is not None:
+            return cached
 
-    def save_interaction(self, identifier: str, user_msg: str, agent_msg: str):
+        read_started = time.time()
         db = self.get_db()
         try:
-            user = self.get_or_create_user(db, identifier)
-            conv = self.get_or_create_conversation(db, user.id)
-            
-            self.add_message(db, conv.id, "user", user_msg)
-            self.add_message(db, conv.id, "agent", agent_msg)
-            
-            # Check for summarization trigger
-            # simple logic: if message count > 10 and no summary in last 5 messages...
-            # simplified: Retrieve all messages, if count > 15, summarize first 10.
-            
-            total_msgs = db.query(Message).filter(Message.conversation_id == conv.id).count()
-            if total_msgs > 10:
-                self._summarize_updates(db, conv)
-                
+            if self.writer is None:
+                context = self._read_context(db, identifier, full_name, email)
+                pending = []
+            else:
+                # Include turns still queued for the DB so the next turn sees the previous one
+                context, pending = self.writer.read_with_pending(
+                    identifier, lambda: self._read_context(db, identifier, full_name, email)
+                )
+            if context is None:
+                context = self._get_or_create_context(db, identifier, full_name, email)
+            return self._finish_context(identifier, context, pending, read_started)
         finally:
             db.close()
 
-    def _summarize_updates(self, db: Session, conv: Conversation):
+    def _cached_context(self, identifier: str, full_name: str = None, email: str = None) -> Optional[dict]:
+        if self.context_cache is None:
+            return None
+        cached = self.context_cache.get(identifier)
+        if cached is None or (full_name and full_name != cached["full_name"]) or (email and email != cached["email"]):
+            return None
+        return self._public_context(cached)
+
+    def _finish_context(self, identifier: str, context: dict, pending: List[Dict[str, str]], read_started: float) -> dict:
+        """Appends still-queued turns, caches the result and returns its public part."""
+        if pending:
+            context["history"] = (context["history"] + pending)[-self.HISTORY_LIMIT:]
+        if self.context_cache is not None:
+            self.context_cache.fill(identifier, context, read_started)
+        return self._public_context(context)
+
+    @staticmethod
+    def _public_context(context: dict) -> dict:
+        return {
+            "conversation_id": context["conversation_id"],
+            "summary": context["summary"],
+            "history": list(context["history"])
+        }
+
+    def _build_context_stmt(self):
         """
-        Summarize the conversation to reduce context window.
+        User + latest conversation + its last HISTORY_LIMIT messages, one row per message
+        (built once; the identifier is a bind parameter).
         """
-        # Get current summary
-        current_summary = conv.summary or "No summary."
-        
-        # Get messages to summarize (e.g., all messages except the last 3 to keep recent context fresh)
-        # Actually, standard practice is: Summary + Last K Messages. 
-        # So we update the summary with the 'middle' messages that are falling out of the window.
+        latest_conv_id = (
+            select(Conversation.id)
+            .where(Conversation.customer_id == User.id, Conversation.platform == "general")
+            .order_by(Conversation.last_message_at.desc(), Conversation.id.desc())
+            .limit(1)
+            .correlate(User)
+            .scalar_subquery()
+        )
+        recent_msg_ids = (
+            select(Message.id)
+            .where(Message.conversation_id == Conversation.id)
+            .order_by(Message.timestamp.desc(), Message.id.desc())
+            .limit(self.HISTORY_LIMIT)
+            .correlate(Conversation)
+        )
+        return (
+            select(
+                User.id.label("user_id"), User.phone_number, User.full_name, User.email,
+                Conversation.id.label("conversation_id"), Conversation.summary,
+                Message.id.label("message_id"), Message.sender, Message.content, Message.timestamp
+            )
+            .select_from(User)
+            .outerjoin(Conversation, Conversation.id == latest_conv_id)
+            .outerjoin(Message, and_(Message.conversation_id == Conversation.id, Message.id.in_(recent_msg_ids)))
+            .where(or_(User.phone_number == bindparam("identifier"), User.email == bindparam("identifier")))
+        )
+
+    def _read_context(self, db: Session, identifier: str, full_name: str = None, email: str = None) -> Optional[dict]:
+        """
+        Resolves user, latest conversation, summary and last messages in one joined SELECT (no commit).
+        Returns None when the user or conversation doesn't exist yet or the given details differ.
+        """
+        rows = db.execute(self._context_stmt, {"identifier": identifier}).all()
+        return self._context_from_rows(rows, identifier, full_name, email)
+
+    async def _aread_context(self, db: AsyncSession, identifier: str, full_name: str = None, email: str = None) -> Optional[dict]:
+        """_read_context on the async engine."""
+        rows = (await db.execute(self._context_stmt, {"identifier": identifier})).all()
+        return self._context_from_rows(rows, identifier, full_name, email)
+
+    def _context_from_rows(self, rows, identifier: str, full_name: str = None, email: str = None) -> Optional[dict]:
+        if not rows:
+            return None
+
+        # Same precedence as get_or_create_user: a phone match wins over an email match
+        user_id = next((r.user_id for r in rows if r.phone_number == identifier), rows[0].user_id)
+        rows = [r for r in rows if r.user_id == user_id]
+        first = rows[0]
+        if first.conversation_id is None:
+            return None
+        if (full_name and full_name != first.full_name) or (email and email != first.email):
+            return None
+
+        messages = sorted((r for r in rows if r.message_id is not None), key=lambda r: (r.timestamp, r.message_id))
+        return {
+            "user_id": user_id,
+            "full_name": first.full_name,
+            "email": first.email,
+            "conversation_id": first.conversation_id,
+            "summary": first.summary or "",
+            "history": [{"sender": r.sender, "content": r.content} for r in messages]
+        }
+
+    def _get_or_create_context(self, db: Session, identifier: str, full_name: str = None, email: str = None) -> dict:
+        """
+        Write path for get_context: creates the user/conversation (or updates user details) first.
+        """
+        user = self.get_or_create_user(db, identifier, full_name, email)
+        conv = self.get_or_create_conversation(db, user.id)
         
-        # For hackathon simplicity: Just regenerate summary from last 20 messages every time it grows? 
-        # No, that's expensive.
-        # Let's do: New Summary = LLM(Old Summary + New Recent Messages)
+        # Fetch summary
+        summary = conv.summary or ""
         
+        # Fetch recent messages
         messages = db.query(Message).filter(
             Message.conversation_id == conv.id
-        ).order_by(Message.timestamp.asc()).all()
+        ).order_by(Message.timestamp.desc(), Message.id.desc()).limit(self.HISTORY_LIMIT).all()
         
-        # If we have a lot of messages, let's condense.
-        text_to_summarize = f"Current Summary: {current_summary}\n\nRecent Interaction:\n"
-        for m in messages[-5:]: # Just take last 5 to verify concept
-             text_to_summarize += f"{m.sender}: {m.content}\n"
-             
+        # They are in reverse order (newest first), flip them for context
+        history_msgs = []
+        for m in reversed(messages):
+            history_msgs.append({"sender": m.sender, "content": m.content})
+            
+        return {
+            "user_id": user.id,
+            "full_name": user.full_name,
+            "email": user.email,
+            "conversation_id": conv.id,
+            "summary": summary,
+            "history": history_msgs
+        }
+
+    def save_interaction(self, identifier: str, user_msg: str, agent_msg: str, reply_meta: dict = None):
+        self.save_interactions(identifier, [(user_msg, agent_msg, reply_meta)])
+
+    def save_interactions(self, identifier: str, turns: List[tuple]):
+        """
+        Saves several (user message, agent reply[, reply meta]) turns for one user.
+        Reply meta may carry the `model`, `model_tier` and `latency_ms` that produced the reply.
+
+        With write-behind enabled the turns are journaled and queued (written within
+        MESSAGE_FLUSH_MAX_LATENCY_MS); otherwise they're written here in one transaction.
+        """
+        if self.writer is not None:
+            self.writer.enqueue(identifier, turns)
+        else:
+            self._schedule_summaries(self._write_turns([(identifier, turns, datetime.now(timezone.utc))]))
+        self._append_to_cache(identifier, turns)
+
+    def _append_to_cache(self, identifier: str, turns: List[tuple]):
+        if self.context_cache is not None:
+            messages = []
+            for user_msg, agent_msg, *_ in turns:
+                messages.append({"sender": "user", "content": user_msg})
+                messages.append({"sender": "agent", "content": agent_msg})
+            self.context_cache.append(identifier, messages)
+
+    def invalidate_context(self, *identifiers: str):
+        """Drops cached context for these identifiers (phone / email), e.g. after an admin edit."""
+        if self.context_cache is not None:
+            for identifier in identifiers:
+                if identifier:
+                    self.context_cache.invalidate(identifier)
+
+    def _write_turns(self, entries: List[tuple]) -> Dict[int, int]:
+        """
+        Writes (identifier, turns, queued_at) entries in one transaction: users and their
+        latest conversations are resolved (or created) in bulk, messages inserted, and each
+        conversation's last_message_at, message_count and last_message_id moved forward.
+        Returns {conversation id: messages written}.
+        """
+        db = self.get_db()
+        try:
+            written = self._write_turns_in(db, entries)
+            db.commit()
+            return written
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _write_turns_in(self, db: Session, entries: List[tuple]) -> Dict[int, int]:
+        """Body of _write_turns; the caller commits (sync session, or AsyncSession.run_sync)."""
+        identifiers = {identifier for identifier, _, _ in entries}
+
+        # Users: same precedence as get_or_create_user (phone match over email match)
+        by_identifier: Dict[str, User] = {}
+        for user in db.query(User).filter(or_(User.phone_number.in_(identifiers), User.email.in_(identifiers))):
+            if user.phone_number in identifiers:
+                by_identifier[user.phone_number] = user
+            if user.email in identifiers:
+                by_identifier.setdefault(user.email, user)
+        for identifier in identifiers - by_identifier.keys():
+            user = User(full_name="Guest", phone_number=identifier, email=f"{identifier}@example.com")
+            db.add(user)
+            by_identifier[identifier] = user
+        db.flush()
+
+        # Latest conversation per user
+        user_ids = {user.id for user in by_identifier.values()}
+        conv_by_user: Dict[int, Conversation] = {}
+        for conv in db.query(Conversation).filter(
+            Conversation.customer_id.in_(user_ids), Conversation.platform == "general"
+        ).order_by(Conversation.last_message_at.desc(), Conversation.id.desc()):
+            conv_by_user.setdefault(conv.customer_id, conv)
+        for user_id in user_ids - conv_by_user.keys():
+            conv = Conversation(customer_id=user_id, platform="general")
+            db.add(conv)
+            conv_by_user[user_id] = conv
+        db.flush()
+
+        written: Dict[int, int] = {}
+        inserted: Dict[int, List[Message]] = {}
+        for identifier, turns, queued_at in entries:
+            conv = conv_by_user[by_identifier[identifier].id]
+            msgs = inserted.setdefault(conv.id, [])
+            for user_msg, agent_msg, *meta in turns:
+                reply_meta = (meta[0] if meta else None) or {}
+                msgs.append(Message(conversation_id=conv.id, sender="user", content=user_msg, timestamp=queued_at))
+                msgs.append(Message(
+                    conversation_id=conv.id,
+                    sender="agent",
+                    content=agent_msg,
+                    timestamp=queued_at,
+                    model=reply_meta.get("model"),
+                    model_tier=reply_meta.get("model_tier"),
+                    latency_ms=reply_meta.get("latency_ms")
+                ))
+            conv.last_message_at = queued_at
+            written[conv.id] = written.get(conv.id, 0) + 2 * len(turns)
+        for msgs in inserted.values():
+            db.add_all(msgs)
+        db.flush()
+
+        # Counters move in the same transaction as the inserts (relative update, safe across workers)
+        for conv in conv_by_user.values():
+            if conv.id in written:
+                conv.message_count = Conversation.message_count + written[conv.id]
+                conv.last_message_id = max(m.id for m in inserted[conv.id])
+        return written
+
+    def _schedule_summaries(self, written: Dict[int, int]):
+        """Tells the summary worker how many messages each conversation just received."""
+        for conversation_id, new_messages in written.items():
+            self.summaries.notify(conversation_id, new_messages)
+
+    def start(self):
+        """Starts the background writer (replaying its journal) and summary worker."""
+        if self.writer is not None:
+            self.writer.start()
+        self.summaries.start()
+
+    def shutdown(self):
+        """Flushes queued turns, then stops the summary worker."""
+        if self.writer is not None:
+            self.writer.stop()
+        self.summaries.stop()
+
+    async def _off_loop(self, fn, *args):
+        """Runs a context cache call; shared backends (SQLite file, Redis) do blocking I/O, so off the loop."""
+        if self.context_cache.backend.shared:
+            return await asyncio.to_thread(fn, *args)
+        return fn(*args)
+
+    async def aget_context(self, identifier: str, full_name: str = None, email: str = None) -> dict:
+        """
+        Async variant of get_context for use inside request handlers: reads go through the
+        async engine, so waiting on the database doesn't hold up the event loop.
+        """
+        if self.context_cache is not None:
+            cached = await self._off_loop(self._cached_context, identifier, full_name, email)
+            if cached is not None:
+                return cached
+
+        read_started = time.time()
+        async with AsyncSessionLocal() as db:
+            if self.writer is None:
+                context = await self._aread_context(db, identifier, full_name, email)
+                pending = []
+            else:
+                context, pending = await self.writer.aread_with_pending(
+                    identifier, lambda: self._aread_context(db, identifier, full_name, email)
+                )
+            if context is None:
+                context = await db.run_sync(self._get_or_create_context, identifier, full_name, email)
+        if self.context_cache is not None:
+            return await self._off_loop(self._finish_context, identifier, context, pending, read_started)
+        return self._finish_context(identifier, context, pending, read_started)
+
+    async def asave_interaction(self, identifier: str, user_msg: str, agent_msg: str, reply_meta: dict = None):
+        """
+        Async variant of save_interaction.
+        """
+        await self.asave_interactions(identifier, [(user_msg, agent_msg, reply_meta)])
+
+    async def asave_interactions(self, identifier: str, turns: List[tuple]):
+        """
+        Async variant of save_interactions. The journal append (fsync) runs in a worker thread;
+        without write-behind the turns are written through the async engine.
+        """
+        if self.writer is not None:
+            await asyncio.to_thread(self.save_interactions, identifier, turns)
+            return
+
+        entries = [(identifier, turns, datetime.now(timezone.utc))]
+        async with AsyncSessionLocal() as db:
+            written = await db.run_sync(self._write_turns_in, entries)
+            await db.commit()
+        self._schedule_summaries(written)
+        if self.context_cache is not None:
+            await self._off_loop(self._append_to_cache, identifier, turns)
+
+    def summarize_conversation(self, conversation_id: int) -> int:
+        """
+        Folds the messages after the conversation's watermark (`summarized_through_id`)
+        into its summary and advances the watermark. Returns the number of messages folded.
+        Raises if the LLM fails, so the summary worker can retry.
+        """
+        db = self.get_db()
+        try:
+            conv = db.query(Conversation).get(conversation_id)
+            if conv is None:
+                return 0
+            # Short conversations fit in the recent-history window; nothing to condense yet
+            if conv.message_count <= self.HISTORY_LIMIT:
+                return 0
+
+            watermark = conv.summarized_through_id or 0
+            if conv.last_message_id is not None and conv.last_message_id <= watermark:
+                return 0
+            current_summary = conv.summary or "No summary."
+            # Newest first, bounded: a large backlog (e.g. pre-watermark history) is mostly
+            # covered by the existing summary already
+            new_msgs = db.query(Message).filter(
+                Message.conversation_id == conversation_id,
+                Message.id > watermark
+            ).order_by(Message.id.desc()).limit(settings.SUMMARY_MAX_MESSAGES).all()
+            new_msgs.reverse()
+            if not new_msgs:
+                return 0
+            new_text = "".join(f"{m.sender}: {m.content}\n" for m in new_msgs)
+            through_id = new_msgs[-1].id
+            identifiers = (conv.customer.phone_number, conv.customer.email) if conv.customer else ()
+        finally:
+            db.close() # Don't hold a connection across the LLM call
+
         prompt = f"""
-        You are a memory manager for an AI assistant. Update the conversation summary based on the recent interaction.
+        You are a memory manager for an AI assistant. Update the conversation summary with the new messages.
         Keep important details (user preferences, names, orders, styles). 
         Condensed Summary only.
         
-        {text_to_summarize}
+        Current Summary: {current_summary}
+
+        New Messages:
+        {new_text}
         """
-        
+
+        response = self.llm_caller.call_sync(
+            lambda: self.llm.invoke([HumanMessage(content=prompt)]),
+            fallback=(lambda: self.fallback_llm.invoke([HumanMessage(content=prompt)])) if self.fallback_llm else None,
+            priority=Priority.SUMMARY
+        )
+
+        db = self.get_db()
         try:
-            response = self.llm.invoke([HumanMessage(content=prompt)])
-            new_summary = response.content
-            
-            conv.summary = new_summary
+            # Only advance if nobody else moved the watermark meanwhile (other workers/processes)
+            updated = db.query(Conversation).filter(
+                Conversation.id == conversation_id,
+                func.coalesce(Conversation.summarized_through_id, 0) == watermark
+            ).update({"summary": response.content, "summarized_through_id": through_id}, synchronize_session=False)
             db.commit()
-            print(f"[Memory] Updated summary for Conv {conv.id}")
-        except Exception as e:
-            print(f"[Memory] Failed to summarize: {e}")
+        finally:
+            db.close()
+        if updated:
+            print(f"[Memory] Folded {len(new_msgs)} messages into summary for Conv {conversation_id}")
+            if self.context_cache is not None:
+                for identifier in identifiers:
+                    if identifier:
+                        self.context_cache.set_summary(identifier, conversation_id, response.content)
+        return len(new_msgs) if updated else 0
 
 from sqlalchemy import func
 chat_history = ChatHistoryService()
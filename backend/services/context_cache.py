@@ -0,0 +1,289 @@
+"""
+Conversation Context Cache
+Caches what ChatHistoryService.get_context returns for a user (user id,
+latest conversation, summary and a ring buffer of recent messages), kept
+current write-through by save_interaction so a turn doesn't rebuild it from
+the database.
+
+Backends: an in-process LRU (default), or a store shared by all uvicorn
+workers: "sqlite:///./context_cache.db" or "redis://host:6379/0" (needs the
+`redis` package).
+
+Staleness guard: writes to an uncached user, and invalidations, leave a
+tombstone. A fill is discarded unless its DB read started after the tombstone
+(plus `settle_seconds` with a shared backend, since another worker's turns can
+still be queued for the database).
+"""
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+Updater = Callable[[Optional[Dict[str, Any]]], Optional[Dict[str, Any]]]
+
+
+def _entry_size(value: Dict[str, Any]) -> int:
+    """Rough in-memory footprint (bytes) of a cached entry."""
+    return 200 + len(value.get("summary") or "") + sum(len(m["content"]) + 40 for m in value.get("history", []))
+
+
+class LocalBackend:
+    """In-process LRU bounded by entry count and approximate memory."""
+    shared = False
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict() # key -> (value, expires_at, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._get(key)
+
+    def _get(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[1] < time.time():
+            self._drop(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def update(self, key: str, fn: Updater, ttl: float):
+        with self._lock:
+            value = fn(self._get(key))
+            if value is None:
+                return
+            self._drop(key)
+            size = _entry_size(value)
+            self._entries[key] = (value, time.time() + ttl, size)
+            self._bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _drop(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[2]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": "memory", "entries": len(self._entries), "max_entries": self.max_entries,
+                "approx_mb": round(self._bytes / 1_048_576, 2), "max_mb": round(self.max_bytes / 1_048_576, 2),
+                "evictions": self.evictions}
+
+
+class SQLiteBackend:
+    """Shared by workers on one host; updates run in IMMEDIATE transactions."""
+    shared = True
+
+    def __init__(self, path: str, max_entries: int):
+        self.path = path
+        self.max_entries = max_entries
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS context_cache (key TEXT PRIMARY KEY, value TEXT, expires_at REAL)"
+        )
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM context_cache WHERE key = ? AND expires_at >= ?", (key, time.time())
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def update(self, key: str, fn: Updater, ttl: float):
+        with self._lock:
+            now = time.time()
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT value FROM context_cache WHERE key = ? AND expires_at >= ?", (key, now)
+                ).fetchone()
+                value = fn(json.loads(row[0]) if row else None)
+                if value is not None:
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO context_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                        (key, json.dumps(value), now + ttl)
+                    )
+                    self._writes += 1
+                    if self._writes % 100 == 0:
+                        self._prune(now)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _prune(self, now: float):
+        self._conn.execute("DELETE FROM context_cache WHERE expires_at < ?", (now,))
+        self._conn.execute(
+            "DELETE FROM context_cache WHERE key IN (SELECT key FROM context_cache ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM context_cache")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM context_cache").fetchone()[0]
+        return {"backend": "sqlite", "path": self.path, "entries": entries, "max_entries": self.max_entries}
+
+
+class RedisBackend:
+    """Redis-compatible server; updates use WATCH/MULTI optimistic transactions. Size is bounded by TTL/maxmemory."""
+    shared = True
+
+    def __init__(self, url: str):
+        import redis # Optional dependency, only needed for this backend
+        self.url = url
+        self._client = redis.Redis.from_url(url)
+        self._watch_error = redis.WatchError
+        self._prefix = "ctx:"
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        raw = self._client.get(self._prefix + key)
+        return json.loads(raw) if raw else None
+
+    def update(self, key: str, fn: Updater, ttl: float):
+        name = self._prefix + key
+        with self._client.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(name)
+                    raw = pipe.get(name)
+                    value = fn(json.loads(raw) if raw else None)
+                    if value is None:
+                        pipe.unwatch()
+                        return
+                    pipe.multi()
+                    pipe.set(name, json.dumps(value), ex=max(1, int(ttl)))
+                    pipe.execute()
+                    return
+                except self._watch_error:
+                    continue # Concurrent update; re-read and retry
+
+    def clear(self):
+        for name in self._client.scan_iter(match=self._prefix + "*"):
+            self._client.delete(name)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": "redis", "url": self.url.split("@")[-1]}
+
+
+class ContextCache:
+    def __init__(self, backend, history_limit: int, ttl_seconds: float, settle_seconds: float = 0.0):
+        self.backend = backend
+        self.history_limit = history_limit
+        self.ttl_seconds = ttl_seconds
+        self.settle_seconds = settle_seconds if backend.shared else 0.0
+        self.hits = 0
+        self.misses = 0
+        self.fills = 0
+        self.stale_fills = 0
+        self.write_throughs = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _tombstone() -> Dict[str, Any]:
+        return {"tombstone": True, "at": time.time()}
+
+    def get(self, identifier: str) -> Optional[Dict[str, Any]]:
+        """Cached entry for a user, or None on a miss."""
+        try:
+            value = self.backend.get(identifier)
+        except Exception as e:
+            logger.error(f"Context cache read error: {e}")
+            value = None
+        if value is None or value.get("tombstone"):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value
+
+    def fill(self, identifier: str, entry: Dict[str, Any], read_started: float):
+        """
+        Caches an entry built from a DB read that started at `read_started` (time.time()),
+        unless a write or invalidation for this user happened since.
+        """
+        def apply(current):
+            if current is not None and current.get("at", 0) + self.settle_seconds > read_started:
+                self.stale_fills += 1
+                return None
+            self.fills += 1
+            return {**entry, "history": entry["history"][-self.history_limit:], "at": read_started}
+        self._update(identifier, apply)
+
+    def append(self, identifier: str, messages: List[Dict[str, str]]):
+        """Write-through for a saved turn; an uncached user gets a tombstone so in-flight fills are dropped."""
+        def apply(current):
+            if current is None or current.get("tombstone"):
+                return self._tombstone()
+            history = (current["history"] + messages)[-self.history_limit:]
+            return {**current, "history": history, "at": time.time()}
+        self.write_throughs += 1
+        self._update(identifier, apply)
+
+    def set_summary(self, identifier: str, conversation_id: int, summary: str):
+        def apply(current):
+            if current is None or current.get("tombstone") or current.get("conversation_id") != conversation_id:
+                return None
+            return {**current, "summary": summary}
+        self._update(identifier, apply)
+
+    def invalidate(self, identifier: str):
+        self.invalidations += 1
+        self._update(identifier, lambda current: self._tombstone())
+
+    def clear(self):
+        self.invalidations += 1
+        self.backend.clear()
+
+    def _update(self, identifier: str, fn: Updater):
+        try:
+            self.backend.update(identifier, fn, self.ttl_seconds)
+        except Exception as e:
+            logger.error(f"Context cache write error: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "fills": self.fills,
+            "stale_fills_discarded": self.stale_fills,
+            "write_throughs": self.write_throughs,
+            "invalidations": self.invalidations,
+            "ttl_seconds": self.ttl_seconds,
+            **self.backend.stats()
+        }
+
+
+def make_backend(url: Optional[str], max_entries: int, max_mb: float):
+    """Backend from a CONTEXT_CACHE_BACKEND url (None = in-process)."""
+    if not url:
+        return LocalBackend(max_entries, int(max_mb * 1_048_576))
+    if url.startswith("sqlite:///"):
+        return SQLiteBackend(url[len("sqlite:///"):], max_entries)
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBackend(url)
+    raise ValueError(f"Unsupported CONTEXT_CACHE_BACKEND: {url}")
@@ -0,0 +1,151 @@
+"""
+Intent Classifier
+Fast local router for text messages: TF-IDF features (word unigrams + bigrams)
+and a multinomial logistic regression, trained offline and serialized to JSON.
+Pure Python so it adds no heavy dependencies; a prediction takes microseconds.
+
+Retrain after editing backend/data/intent_training.jsonl:
+    python -m backend.services.intent_classifier
+"""
+import json
+import math
+import os
+import random
+import re
+from collections import Counter
+from typing import Dict, List, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+LABELS = ["sales", "support", "visual"]
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
+TRAINING_DATA_PATH = os.path.join(DATA_DIR, "intent_training.jsonl")
+MODEL_PATH = os.path.join(DATA_DIR, "intent_model.json")
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word unigrams plus adjacent-word bigrams."""
+    words = _TOKEN_RE.findall(text.lower())
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+def load_examples(path: str) -> List[Tuple[str, str]]:
+    """Reads a JSONL file of {"text": ..., "label": ...} rows."""
+    examples = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                row = json.loads(line)
+                examples.append((row["text"], row["label"]))
+    return examples
+
+
+class IntentClassifier:
+    """
+    TF-IDF + softmax linear model over LABELS.
+    `weights` maps feature -> one weight per label.
+    """
+
+    def __init__(self, labels: List[str], idf: Dict[str, float], weights: Dict[str, List[float]], bias: List[float]):
+        self.labels = labels
+        self.idf = idf
+        self.weights = weights
+        self.bias = bias
+
+    @staticmethod
+    def _features(tokens: List[str], idf: Dict[str, float]) -> Dict[str, float]:
+        counts = Counter(t for t in tokens if t in idf)
+        vec = {t: (1.0 + math.log(c)) * idf[t] for t, c in counts.items()}
+        norm = math.sqrt(sum(v * v for v in vec.values()))
+        if norm:
+            vec = {t: v / norm for t, v in vec.items()}
+        return vec
+
+    @staticmethod
+    def _softmax(scores: List[float]) -> List[float]:
+        top = max(scores)
+        exps = [math.exp(s - top) for s in scores]
+        total = sum(exps)
+        return [e / total for e in exps]
+
+    def _probabilities(self, vec: Dict[str, float]) -> List[float]:
+        scores = list(self.bias)
+        for feature, value in vec.items():
+            for i, w in enumerate(self.weights[feature]):
+                scores[i] += w * value
+        return self._softmax(scores)
+
+    def predict(self, text: str) -> Tuple[str, float]:
+        """Returns (label, confidence)."""
+        probs = self._probabilities(self._features(tokenize(text), self.idf))
+        best = max(range(len(probs)), key=probs.__getitem__)
+        return self.labels[best], probs[best]
+
+    @classmethod
+    def train(cls, examples: List[Tuple[str, str]], labels: List[str] = LABELS, epochs: int = 60,
+              learning_rate: float = 0.5, l2: float = 1e-4, seed: int = 13) -> "IntentClassifier":
+        """SGD on the cross-entropy loss."""
+        docs = [tokenize(text) for text, _ in examples]
+        doc_freq = Counter(t for tokens in docs for t in set(tokens))
+        n_docs = len(docs)
+        idf = {t: math.log((1 + n_docs) / (1 + df)) + 1.0 for t, df in doc_freq.items()}
+
+        rows = [(cls._features(tokens, idf), labels.index(label)) for tokens, (_, label) in zip(docs, examples)]
+        model = cls(labels, idf, {t: [0.0] * len(labels) for t in idf}, [0.0] * len(labels))
+
+        rng = random.Random(seed)
+        for epoch in range(epochs):
+            rng.shuffle(rows)
+            lr = learning_rate / (1.0 + 0.05 * epoch)
+            for vec, target in rows:
+                probs = model._probabilities(vec)
+                for i in range(len(labels)):
+                    grad = probs[i] - (1.0 if i == target else 0.0)
+                    model.bias[i] -= lr * grad
+                    for feature, value in vec.items():
+                        w = model.weights[feature]
+                        w[i] -= lr * (grad * value + l2 * w[i])
+        return model
+
+    def save(self, path: str = MODEL_PATH):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({
+                "labels": self.labels,
+                "bias": [round(b, 6) for b in self.bias],
+                "idf": {t: round(v, 6) for t, v in self.idf.items()},
+                "weights": {t: [round(x, 6) for x in w] for t, w in self.weights.items()}
+            }, f, separators=(",", ":"), sort_keys=True)
+
+    @classmethod
+    def load(cls, path: str = MODEL_PATH) -> "IntentClassifier":
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["labels"], data["idf"], data["weights"], data["bias"])
+
+    @classmethod
+    def load_or_train(cls, path: str = MODEL_PATH) -> "IntentClassifier":
+        """Loads the serialized model, training it from the seed data if it's missing."""
+        if os.path.exists(path):
+            return cls.load(path)
+        logger.warning(f"Intent model not found at {path}; training from {TRAINING_DATA_PATH}")
+        model = cls.train(load_examples(TRAINING_DATA_PATH))
+        try:
+            model.save(path)
+        except OSError as e:
+            logger.warning(f"Could not save intent model: {str(e)}")
+        return model
+
+
+if __name__ == "__main__":
+    examples = load_examples(TRAINING_DATA_PATH)
+    model = IntentClassifier.train(examples)
+    model.save(MODEL_PATH)
+    correct = sum(model.predict(text)[0] == label for text, label in examples)
+    print(f"Trained on {len(examples)} examples, {len(model.idf)} features")
+    print(f"Training accuracy: {correct / len(examples):.1%}")
+    print(f"Saved model to {MODEL_PATH}")
@@ -0,0 +1,403 @@
+"""
+Write-Behind Message Writer
+Chat turns are appended to a local journal and queued in memory; a background
+thread writes them to the database in grouped transactions once the oldest
+queued turn reaches the max latency (or the batch fills up).
+
+Delivery is at-least-once: a crash between the DB commit and the journal
+truncation replays that batch on the next start.
+
+Each flush writes at most batch_size turns. After a failed flush the batch is
+halved until the failing entry is alone; an entry that keeps failing while the
+entries behind it write fine is set aside (<dir>/rejected.jsonl) so it can't
+block the queue.
+
+Each process journals to its own file (<dir>/journal-<pid>.jsonl); on start a
+process picks up the files left behind by processes that are no longer running
+(under a file lock, so workers starting together don't replay the same file).
+"""
+import asyncio
+import atexit
+import contextlib
+import glob
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# (identifier, turns, queued_at) entries -> {conversation id: messages written}
+WriteFn = Callable[[List[Tuple[str, List[list], datetime]]], Dict[int, int]]
+
+
+class MessageWriter:
+    def __init__(self, write_fn: WriteFn, max_latency_ms: int = 500, batch_size: int = 200,
+                 journal_dir: Optional[str] = None, fsync: bool = True, max_attempts: int = 3,
+                 on_flushed: Callable[[Dict[int, int]], None] = None):
+        self.write_fn = write_fn
+        self.on_flushed = on_flushed
+        self.max_latency = max_latency_ms / 1000
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.journal_dir = journal_dir
+        self.fsync = fsync
+
+        self._pending: List[Dict[str, Any]] = []
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._generation = 0 # odd while a flush is committing (see read_with_pending)
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self._journal = None
+        self._backoff = 0.0
+        self._batch_limit = batch_size # halved after a failed flush, doubled back after a good one
+
+        self.enqueued_turns = 0
+        self.flushed_turns = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.rejected_turns = 0
+        self.recovered_turns = 0
+        self.max_batch_turns = 0
+        self.last_flush_ms = 0.0
+
+    # --- Lifecycle ---
+
+    def start(self):
+        """Recovers journals left by dead processes and starts the flush thread (idempotent)."""
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._stopping = False
+            if self.journal_dir:
+                os.makedirs(self.journal_dir, exist_ok=True)
+                self._recover()
+            self._thread = threading.Thread(target=self._run, name="message-writer", daemon=True)
+            self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self, timeout: float = 10.0):
+        """Flushes everything still queued and stops the flush thread."""
+        with self._cond:
+            thread = self._thread
+            self._stopping = True
+            self._cond.notify_all()
+        if thread is not None:
+            thread.join(timeout)
+        while self._pending and self.flush():
+            pass
+        with self._cond:
+            self._thread = None
+            if self._pending:
+                logger.error(f"[MessageWriter] {len(self._pending)} entries left unflushed; kept in the journal")
+
+    # --- Producer side ---
+
+    def enqueue(self, identifier: str, turns: List[tuple]):
+        """Journals and queues (user message, agent reply[, reply meta]) turns for one user."""
+        if self._thread is None:
+            self.start()
+        queued_at = datetime.now(timezone.utc)
+        entry = {
+            "identifier": identifier,
+            "turns": [[user_msg, agent_msg, (meta[0] if meta else None) or {}] for user_msg, agent_msg, *meta in turns],
+            "at": queued_at.isoformat(),
+            "queued_at": queued_at,
+            "monotonic": time.monotonic(),
+            "strikes": 0
+        }
+        with self._cond:
+            self._journal_append(entry)
+            self._pending.append(entry)
+            self.enqueued_turns += len(entry["turns"])
+            # Wake the flusher to arm the latency timer (first entry) or flush a full batch
+            if len(self._pending) == 1 or self._pending_turns() >= self.batch_size:
+                self._cond.notify_all()
+
+    def pending_messages(self, identifier: str) -> List[Dict[str, str]]:
+        """Queued (not yet written) messages for one user, oldest first."""
+        with self._cond:
+            messages = []
+            for entry in self._pending:
+                if entry["identifier"] == identifier:
+                    for user_msg, agent_msg, _ in entry["turns"]:
+                        messages.append({"sender": "user", "content": user_msg})
+                        messages.append({"sender": "agent", "content": agent_msg})
+            return messages
+
+    def read_with_pending(self, identifier: str, read: Callable[[], Any]) -> Tuple[Any, List[Dict[str, str]]]:
+        """
+        Runs a DB read and returns it with the user's queued messages, taken so
+        that no turn is seen twice (already committed and still queued) or missed.
+        """
+        for _ in range(3):
+            generation = self._generation
+            if generation % 2 == 0:
+                pending = self.pending_messages(identifier)
+                result = read()
+                if self._generation == generation:
+                    return result, pending
+        # Flushes keep landing in between: read while holding off the next one
+        with self._flush_lock:
+            return read(), self.pending_messages(identifier)
+
+    async def aread_with_pending(self, identifier: str, read: Callable[[], Awaitable[Any]]) -> Tuple[Any, List[Dict[str, str]]]:
+        """read_with_pending for an async DB read."""
+        for _ in range(3):
+            generation = self._generation
+            if generation % 2 == 0:
+                pending = self.pending_messages(identifier)
+                result = await read()
+                if self._generation == generation:
+                    return result, pending
+        # Wait for the flush lock off the event loop
+        await asyncio.to_thread(self._flush_lock.acquire)
+        try:
+            return await read(), self.pending_messages(identifier)
+        finally:
+            self._flush_lock.release()
+
+    # --- Flushing ---
+
+    def _pending_turns(self) -> int:
+        return sum(len(entry["turns"]) for entry in self._pending)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._stopping:
+                    self._cond.wait()
+                if self._stopping:
+                    return
+                # Wait for the oldest entry's deadline unless the batch fills up first
+                deadline = max(self._pending[0]["monotonic"] + self.max_latency, time.monotonic() + self._backoff)
+                while not self._stopping and (self._pending_turns() < self.batch_size or self._backoff):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                if self._stopping:
+                    return
+            self.flush()
+
+    def flush(self) -> int:
+        """Writes queued turns (at most batch_size) in one transaction. Returns the number of turns written."""
+        touched: Dict[int, int] = {}
+        with self._flush_lock:
+            with self._cond:
+                batch = self._take_batch()
+            if not batch:
+                return 0
+            written = self._write(batch, touched)
+            if not written and len(batch) == 1:
+                # The oldest entry failed on its own: if the next one writes, the database is
+                # fine and the entry itself is bad - set it aside once it has failed max_attempts times
+                with self._cond:
+                    probe = self._pending[1:2]
+                if probe and self._write(probe, touched):
+                    written = len(probe[0]["turns"])
+                    batch[0]["strikes"] += 1
+                    if batch[0]["strikes"] >= self.max_attempts:
+                        self._reject(batch[0])
+
+        if touched and self.on_flushed is not None:
+            try:
+                self.on_flushed(touched)
+            except Exception as e:
+                logger.error(f"[MessageWriter] Post-flush hook failed: {e}")
+        return written
+
+    def _take_batch(self) -> List[Dict[str, Any]]:
+        """Oldest entries up to the current batch limit in turns, at least one (caller holds _cond)."""
+        batch, turns = [], 0
+        for entry in self._pending:
+            if batch and turns + len(entry["turns"]) > self._batch_limit:
+                break
+            batch.append(entry)
+            turns += len(entry["turns"])
+        return batch
+
+    def _write(self, batch: List[Dict[str, Any]], touched: Dict[int, int]) -> int:
+        """Writes one batch and drops it from the queue and the journal. Returns turns written (0 on failure)."""
+        turns = sum(len(entry["turns"]) for entry in batch)
+        started = time.perf_counter()
+        self._generation += 1
+        try:
+            result = self.write_fn([(e["identifier"], e["turns"], e["queued_at"]) for e in batch])
+        except Exception as e:
+            self._generation += 1
+            self.failed_flushes += 1
+            self._backoff = min(max(self._backoff * 2, 0.5), 30.0)
+            self._batch_limit = max(turns // 2, 1)
+            logger.error(f"[MessageWriter] Flush of {turns} turns failed (retrying in {self._backoff:.1f}s): {e}")
+            return 0
+
+        with self._cond:
+            # Entries queued during the write stay for the next flush
+            self._remove(batch)
+            self._generation += 1
+        self._backoff = 0.0
+        self._batch_limit = min(self._batch_limit * 2, self.batch_size)
+        self.flushes += 1
+        self.flushed_turns += turns
+        self.max_batch_turns = max(self.max_batch_turns, turns)
+        self.last_flush_ms = round((time.perf_counter() - started) * 1000, 1)
+        for conversation_id, count in (result or {}).items():
+            touched[conversation_id] = touched.get(conversation_id, 0) + count
+        return turns
+
+    def _remove(self, entries: List[Dict[str, Any]]):
+        """Drops entries from the queue and rewrites the journal (caller holds _cond)."""
+        done = {id(entry) for entry in entries}
+        self._pending[:] = [entry for entry in self._pending if id(entry) not in done]
+        self._journal_rewrite()
+
+    def _reject(self, entry: Dict[str, Any]):
+        """Sets aside an entry that can't be written, so it stops blocking the queue."""
+        turns = len(entry["turns"])
+        record = {"identifier": entry["identifier"], "turns": entry["turns"], "at": entry["at"]}
+        if self.journal_dir:
+            with open(os.path.join(self.journal_dir, "rejected.jsonl"), "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+            logger.error(f"[MessageWriter] Set aside {turns} turns for {entry['identifier']} after "
+                         f"{entry['strikes']} failed writes (see rejected.jsonl)")
+        else:
+            logger.error(f"[MessageWriter] Dropped {turns} turns after {entry['strikes']} failed writes: {json.dumps(record)}")
+        with self._cond:
+            self._remove([entry])
+        self.rejected_turns += turns
+
+    # --- Journal ---
+
+    def _journal_path(self) -> str:
+        return os.path.join(self.journal_dir, f"journal-{os.getpid()}.jsonl")
+
+    def _journal_append(self, entry: Dict[str, Any]):
+        if not self.journal_dir:
+            return
+        if self._journal is None:
+            self._journal = open(self._journal_path(), "a", encoding="utf-8")
+        record = {"identifier": entry["identifier"], "turns": entry["turns"], "at": entry["at"]}
+        self._journal.write(json.dumps(record) + "\n")
+        self._journal.flush()
+        if self.fsync:
+            os.fsync(self._journal.fileno())
+
+    def _journal_rewrite(self):
+        """Replaces this process's journal with the still-pending entries (caller holds _cond)."""
+        if not self.journal_dir:
+            return
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+        path = self._journal_path()
+        if not self._pending:
+            if os.path.exists(path):
+                os.remove(path)
+            return
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for entry in self._pending:
+                f.write(json.dumps({"identifier": entry["identifier"], "turns": entry["turns"], "at": entry["at"]}) + "\n")
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def _recover(self):
+        """Queues entries from this process's old journal and from journals of dead processes (caller holds _cond)."""
+        with _file_lock(os.path.join(self.journal_dir, "recover.lock")):
+            self._recover_locked()
+        if self.recovered_turns:
+            print(f"[MessageWriter] Recovered {self.recovered_turns} journaled turns")
+
+    def _recover_locked(self):
+        own_path = self._journal_path()
+        for path in sorted(glob.glob(os.path.join(self.journal_dir, "journal-*.jsonl"))):
+            if path != own_path:
+                try:
+                    pid = int(os.path.basename(path)[len("journal-"):-len(".jsonl")])
+                except ValueError:
+                    continue
+                if _pid_alive(pid):
+                    continue
+            entries = []
+            try:
+                with open(path, encoding="utf-8") as f:
+                    for line in f:
+                        try:
+                            record = json.loads(line)
+                        except ValueError:
+                            continue # torn final line from a crash mid-write
+                        queued_at = datetime.fromisoformat(record["at"])
+                        entries.append({**record, "queued_at": queued_at, "monotonic": time.monotonic(), "strikes": 0})
+            except FileNotFoundError:
+                continue # already replayed by another process
+            if path != own_path:
+                for entry in entries:
+                    self._journal_append(entry)
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(path)
+            self._pending.extend(entries)
+            self.recovered_turns += sum(len(entry["turns"]) for entry in entries)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            queued = self._pending_turns()
+            oldest = time.monotonic() - self._pending[0]["monotonic"] if self._pending else 0.0
+        return {
+            "running": self._thread is not None,
+            "queued_turns": queued,
+            "oldest_queued_ms": round(oldest * 1000, 1),
+            "enqueued_turns": self.enqueued_turns,
+            "flushed_turns": self.flushed_turns,
+            "flushes": self.flushes,
+            "avg_batch_turns": round(self.flushed_turns / self.flushes, 1) if self.flushes else 0.0,
+            "max_batch_turns": self.max_batch_turns,
+            "failed_flushes": self.failed_flushes,
+            "rejected_turns": self.rejected_turns,
+            "recovered_turns": self.recovered_turns,
+            "last_flush_ms": self.last_flush_ms,
+            "max_latency_ms": self.max_latency * 1000,
+            "journal": self.journal_dir
+        }
+
+
+@contextlib.contextmanager
+def _file_lock(path: str):
+    """Exclusive lock on a file shared by every process using the journal directory."""
+    with open(path, "a+b") as f:
+        if os.name == "nt":
+            import msvcrt
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1) # gives up after ~10s
+                    break
+                except OSError:
+                    continue
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if os.name == "nt":
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
@@ -0,0 +1,308 @@
+"""
+Product Enrichment Queue
+New products are saved right away with enrichment_status "pending" and a row in
+`enrichment_jobs`; a pool of worker threads then runs the slow steps off the
+request path:
+
+  describe - vision model description of the product image (if any)
+  embed    - embedding of the product text (name, description, visual description)
+  index    - upsert into the vector index; the vector id is stored on the product
+
+Jobs live in the database, so they survive restarts and can be drained by any
+process: workers claim a job with a conditional UPDATE (safe on SQLite and
+Postgres), and a claim older than the lease (crashed worker) is requeued.
+Steps are idempotent, so a retried job redoes at most the step that failed.
+Failures retry with exponential backoff up to `max_attempts`.
+
+Usage (dedicated worker process, with ENRICHMENT_WORKERS=0 on the API):
+    python -m backend.services.product_enrichment
+    python -m backend.services.product_enrichment --once   # drain due jobs and exit (cron)
+
+Serverless deployments (no worker threads) drain the queue from a cron job,
+with --once or through /api/v1/admin/enrichment/drain.
+"""
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+import logging
+from sqlalchemy import func, select, update
+from backend.config import settings
+from backend.database import SessionLocal, sql_instrumentation
+from backend.models import EnrichmentJob, EnrichmentStatus, Product
+
+logger = logging.getLogger(__name__)
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def product_text(product: Product) -> str:
+    """Text that gets embedded for a product."""
+    parts = [product.name, product.category, product.description, product.visual_description]
+    return "\n".join(p for p in parts if p)
+
+
+def new_job(product_id: int) -> EnrichmentJob:
+    """Job row to add in the same transaction as the product it enriches."""
+    return EnrichmentJob(product_id=product_id, status=EnrichmentStatus.PENDING, run_after=_now())
+
+
+class EnrichmentQueue:
+    def __init__(self, workers: int = 2, max_attempts: int = 5, retry_backoff: float = 10.0,
+                 poll_seconds: float = 5.0, lease_seconds: float = 300.0):
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.poll_seconds = poll_seconds
+        self.lease_seconds = lease_seconds
+
+        self._cond = threading.Condition()
+        self._threads = []
+        self._stopping = False
+        self._lock = threading.Lock()
+
+        self.completed = 0
+        self.retries = 0
+        self.failed = 0
+        self.requeued_stale = 0
+        self.step_seconds: Dict[str, float] = {"describe": 0.0, "embed": 0.0, "index": 0.0}
+        self.step_runs: Dict[str, int] = {"describe": 0, "embed": 0, "index": 0}
+
+    def start(self, workers: Optional[int] = None):
+        workers = self.workers if workers is None else workers
+        with self._cond:
+            if self._threads or workers <= 0:
+                return
+            self._stopping = False
+            self._threads = [
+                threading.Thread(target=self._run, name=f"enrichment-worker-{i}", daemon=True)
+                for i in range(workers)
+            ]
+        self.requeue_stale()
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """Stops the workers after their current job; unfinished jobs stay queued in the database."""
+        with self._cond:
+            threads = self._threads
+            self._stopping = True
+            self._cond.notify_all()
+        for thread in threads:
+            thread.join(timeout)
+        with self._cond:
+            self._threads = []
+
+    def notify(self):
+        """Wakes an idle worker (call after committing a new job)."""
+        with self._cond:
+            self._cond.notify()
+
+    # --- Claiming ---
+
+    def requeue_stale(self) -> int:
+        """Puts jobs claimed longer ago than the lease back in the queue."""
+        with SessionLocal() as db:
+            requeued = db.execute(
+                update(EnrichmentJob)
+                .where(EnrichmentJob.status == EnrichmentStatus.PROCESSING,
+                       EnrichmentJob.locked_at < _now() - timedelta(seconds=self.lease_seconds))
+                .values(status=EnrichmentStatus.PENDING, locked_at=None, run_after=_now())
+            ).rowcount
+            db.commit()
+        if requeued:
+            with self._lock:
+                self.requeued_stale += requeued
+            logger.warning(f"[Enrichment] Requeued {requeued} job(s) left by a stopped worker")
+        return requeued
+
+    def _claim(self) -> Optional[int]:
+        """Claims the oldest due job; the conditional UPDATE makes sure only one worker gets it."""
+        with SessionLocal() as db:
+            while True:
+                now = _now()
+                job_id = db.execute(
+                    select(EnrichmentJob.id)
+                    .where(EnrichmentJob.status == EnrichmentStatus.PENDING, EnrichmentJob.run_after <= now)
+                    .order_by(EnrichmentJob.run_after, EnrichmentJob.id)
+                    .limit(1)
+                ).scalar()
+                if job_id is None:
+                    return None
+                claimed = db.execute(
+                    update(EnrichmentJob)
+                    .where(EnrichmentJob.id == job_id, EnrichmentJob.status == EnrichmentStatus.PENDING)
+                    .values(status=EnrichmentStatus.PROCESSING, locked_at=now, attempts=EnrichmentJob.attempts + 1)
+                ).rowcount
+                db.commit()
+                if claimed:
+                    return job_id
+                # Another worker won the race; look again
+
+    def _run(self):
+        last_stale_check = time.monotonic()
+        while True:
+            with self._cond:
+                if self._stopping:
+                    return
+            try:
+                job_id = self._claim()
+                if time.monotonic() - last_stale_check > self.lease_seconds:
+                    last_stale_check = time.monotonic()
+                    self.requeue_stale()
+            except Exception as e:
+                logger.error(f"[Enrichment] Could not claim a job: {e}")
+                job_id = None
+            if job_id is None:
+                with self._cond:
+                    if not self._stopping:
+                        self._cond.wait(self.poll_seconds)
+                continue
+            try:
+                with sql_instrumentation.scope("enrichment job"):
+                    self.process(job_id)
+            except Exception as e:
+                # Couldn't even record the outcome (database down?); the lease requeues the job
+                logger.error(f"[Enrichment] Job {job_id} crashed: {e}")
+
+    def drain(self, max_seconds: float = 20.0, max_jobs: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Processes due jobs in the calling thread until none are left or the time budget
+        is spent (a job already started is finished). For deployments without workers.
+        """
+        started = time.monotonic()
+        self.requeue_stale()
+        processed = 0
+        while time.monotonic() - started < max_seconds and (max_jobs is None or processed < max_jobs):
+            job_id = self._claim()
+            if job_id is None:
+                break
+            with sql_instrumentation.scope("enrichment job"):
+                self.process(job_id)
+            processed += 1
+        with SessionLocal() as db:
+            remaining = db.scalar(select(func.count(EnrichmentJob.id)).where(EnrichmentJob.status == EnrichmentStatus.PENDING))
+        return {"processed": processed, "pending": remaining, "elapsed_ms": round((time.monotonic() - started) * 1000, 1)}
+
+    # --- Processing ---
+
+    def _timed(self, step: str, fn, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with self._lock:
+                self.step_seconds[step] += time.perf_counter() - started
+                self.step_runs[step] += 1
+
+    def process(self, job_id: int):
+        """Runs the steps of a claimed job, recording progress after each one."""
+        with SessionLocal() as db:
+            job = db.get(EnrichmentJob, job_id)
+            product = db.get(Product, job.product_id)
+            try:
+                from backend.rag.rag_service import rag_service
+                from backend.services.vision_service import vision_service
+
+                if product is None:
+                    raise LookupError(f"Product {job.product_id} no longer exists")
+                product.enrichment_status = EnrichmentStatus.PROCESSING
+                db.commit()
+
+                if product.image_url and not product.visual_description:
+                    product.visual_description = self._timed(
+                        "describe", vision_service.analyze_image, product.image_url, raise_errors=True
+                    )
+                job.step = "describe"
+                db.commit()
+
+                text = product_text(product)
+                embedding = self._timed("embed", rag_service.embeddings.embed_documents, [text])[0]
+                job.step = "embed"
+
+                metadata = {"id": product.id, "name": product.name, "category": product.category, "price": product.price}
+                product.embedding_id = self._timed("index", rag_service.add_product_to_index, text, metadata, embedding=embedding)
+                job.step = "index"
+
+                job.status = product.enrichment_status = EnrichmentStatus.DONE
+                job.locked_at = None
+                job.last_error = None
+                job.finished_at = _now()
+                db.commit()
+                with self._lock:
+                    self.completed += 1
+            except Exception as e:
+                db.rollback()
+                self._fail(db, job, product, e)
+
+    def _fail(self, db, job: EnrichmentJob, product: Optional[Product], error: Exception):
+        job.last_error = f"{type(error).__name__}: {error}"[:2000]
+        job.locked_at = None
+        if product is None or job.attempts >= self.max_attempts:
+            job.status = EnrichmentStatus.FAILED
+            job.finished_at = _now()
+            if product is not None:
+                product.enrichment_status = EnrichmentStatus.FAILED
+            with self._lock:
+                self.failed += 1
+            logger.error(f"[Enrichment] Giving up on product {job.product_id} after {job.attempts} attempt(s): {error}")
+        else:
+            delay = self.retry_backoff * 2 ** (job.attempts - 1)
+            job.status = product.enrichment_status = EnrichmentStatus.PENDING
+            job.run_after = _now() + timedelta(seconds=delay)
+            with self._lock:
+                self.retries += 1
+            logger.warning(f"[Enrichment] Product {job.product_id} failed at attempt {job.attempts}, retrying in {delay:.1f}s: {error}")
+        db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with SessionLocal() as db:
+            by_status = dict(db.execute(
+                select(EnrichmentJob.status, func.count()).group_by(EnrichmentJob.status)
+            ).all())
+        with self._lock:
+            return {
+                "workers": len(self._threads),
+                "jobs": {status.value: by_status.get(status.value, 0) for status in EnrichmentStatus},
+                "completed": self.completed,
+                "retries": self.retries,
+                "failed": self.failed,
+                "requeued_stale": self.requeued_stale,
+                "avg_step_ms": {
+                    step: round(self.step_seconds[step] / runs * 1000, 1) if runs else None
+                    for step, runs in self.step_runs.items()
+                },
+                "max_attempts": self.max_attempts,
+            }
+
+
+enrichment_queue = EnrichmentQueue(
+    workers=settings.ENRICHMENT_WORKERS,
+    max_attempts=settings.ENRICHMENT_MAX_ATTEMPTS,
+    retry_backoff=settings.ENRICHMENT_RETRY_BACKOFF_SECONDS,
+    poll_seconds=settings.ENRICHMENT_POLL_SECONDS,
+    lease_seconds=settings.ENRICHMENT_LEASE_SECONDS
+)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run product enrichment workers.")
+    parser.add_argument("--once", action="store_true", help="drain the jobs that are due, then exit")
+    parser.add_argument("--max-seconds", type=float, default=300.0, help="time budget for --once")
+    args = parser.parse_args()
+    if args.once:
+        print(f"[Enrichment] {enrichment_queue.drain(args.max_seconds)}")
+        raise SystemExit(0)
+
+    workers = max(settings.ENRICHMENT_WORKERS, 1)
+    print(f"[Enrichment] Running {workers} worker(s); Ctrl+C to stop")
+    enrichment_queue.start(workers)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        enrichment_queue.stop()
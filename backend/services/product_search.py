@@ -0,0 +1,275 @@
+"""
+Product Full-Text Search
+Full-text index over products.name, category, description and visual_description,
+kept in sync by database triggers (so every writer - API, catalog import,
+enrichment worker, admin scripts - updates it without going through this module):
+
+  SQLite   - FTS5 external-content table `products_fts` (porter stemming, prefix
+             indexes for 2-3 character prefixes); ranked by BM25
+  Postgres - weighted `products.search_vector` tsvector with a GIN index; ranked
+             by ts_rank_cd (Postgres has no built-in BM25)
+
+Name matches weigh most, then category, description and the vision description.
+A query matches all of its terms; when nothing does, it falls back to any term
+(leaving out words that most of the catalog contains).
+
+Created by create_all on new databases (see models.py) and by migration 10 on
+existing ones.
+"""
+import re
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncSession
+
+HIGHLIGHT = ("**", "**") # snippet markers around matched terms (Markdown bold)
+MAX_TERMS = 12
+SNIPPET_TOKENS = 16
+# BM25 column weights, in products_fts column order
+SQLITE_WEIGHTS = (10.0, 5.0, 2.0, 1.0)
+# Plus chat filler, since agents search with the customer's message as typed
+STOPWORDS = frozenset(
+    "a an and any are as at be but by can could do does for from get got has have hello hey hi i im in is it "
+    "its like looking me my need of on or our please show so some something that the there this to want was "
+    "we what with would you your".split()
+)
+
+SQLITE_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+        name, category, description, visual_description,
+        content='products', content_rowid='id',
+        tokenize='porter unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS products_fts_insert AFTER INSERT ON products BEGIN
+        INSERT INTO products_fts (rowid, name, category, description, visual_description)
+        VALUES (new.id, new.name, new.category, new.description, new.visual_description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS products_fts_delete AFTER DELETE ON products BEGIN
+        INSERT INTO products_fts (products_fts, rowid, name, category, description, visual_description)
+        VALUES ('delete', old.id, old.name, old.category, old.description, old.visual_description);
+    END""",
+    # Only the indexed columns: stock and enrichment status updates leave the index alone
+    """CREATE TRIGGER IF NOT EXISTS products_fts_update
+    AFTER UPDATE OF name, category, description, visual_description ON products BEGIN
+        INSERT INTO products_fts (products_fts, rowid, name, category, description, visual_description)
+        VALUES ('delete', old.id, old.name, old.category, old.description, old.visual_description);
+        INSERT INTO products_fts (rowid, name, category, description, visual_description)
+        VALUES (new.id, new.name, new.category, new.description, new.visual_description);
+    END""",
+]
+
+POSTGRES_DDL = [
+    "ALTER TABLE products ADD COLUMN IF NOT EXISTS search_vector tsvector",
+    """CREATE OR REPLACE FUNCTION products_search_vector(name text, category text, description text, visual_description text)
+    RETURNS tsvector LANGUAGE sql IMMUTABLE AS $$
+        SELECT setweight(to_tsvector('english', coalesce(name, '')), 'A')
+            || setweight(to_tsvector('english', coalesce(category, '')), 'B')
+            || setweight(to_tsvector('english', coalesce(description, '')), 'C')
+            || setweight(to_tsvector('english', coalesce(visual_description, '')), 'D')
+    $$""",
+    """CREATE OR REPLACE FUNCTION products_search_vector_update() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        NEW.search_vector := products_search_vector(NEW.name, NEW.category, NEW.description, NEW.visual_description);
+        RETURN NEW;
+    END
+    $$""",
+    "DROP TRIGGER IF EXISTS products_search_vector_update ON products",
+    """CREATE TRIGGER products_search_vector_update
+    BEFORE INSERT OR UPDATE OF name, category, description, visual_description ON products
+    FOR EACH ROW EXECUTE FUNCTION products_search_vector_update()""",
+    # Migration 10 builds it CONCURRENTLY first; this covers fresh tables from create_all
+    "CREATE INDEX IF NOT EXISTS ix_products_search_vector ON products USING gin (search_vector)",
+]
+
+# Fills search_vector for rows that predate the trigger (Backfill of migration 10, Postgres only)
+POSTGRES_BACKFILL = """
+    UPDATE products SET search_vector = products_search_vector(name, category, description, visual_description)
+    WHERE id > :low AND id <= :high
+"""
+
+
+def install_search_index(conn: Connection):
+    """
+    Creates the index and its triggers (idempotent). On SQLite a newly created
+    index is filled from the existing rows; Postgres rows are filled by the backfill.
+    """
+    if conn.dialect.name == "postgresql":
+        for ddl in POSTGRES_DDL:
+            conn.exec_driver_sql(ddl)
+        print("  Product search: tsvector column, trigger and GIN index ready")
+        return
+    if conn.dialect.name != "sqlite":
+        print(f"  Product search: no full-text index for {conn.dialect.name}")
+        return
+    exists = conn.exec_driver_sql("SELECT 1 FROM sqlite_master WHERE name = 'products_fts'").first()
+    for ddl in SQLITE_DDL:
+        conn.exec_driver_sql(ddl)
+    if not exists:
+        # After the triggers, so rows written meanwhile aren't missed
+        conn.exec_driver_sql("INSERT INTO products_fts (products_fts) VALUES ('rebuild')")
+    print("  Product search: FTS5 index and triggers ready")
+
+
+def query_terms(query: str) -> List[str]:
+    """Search terms of a free-text query: its words, without stopwords (a query of filler words finds nothing)."""
+    words = [w for w in re.findall(r"\w+", query.lower()) if len(w) > 1 or w.isdigit()]
+    terms = [w for w in words if w not in STOPWORDS]
+    return list(dict.fromkeys(terms))[:MAX_TERMS]
+
+
+def sqlite_match(terms: List[str], any_terms: bool, prefix: bool) -> str:
+    # Terms are \w+ only, and quoted, so user input can't inject FTS5 syntax
+    parts = [f'"{t}"' for t in terms]
+    if prefix and len(terms[-1]) >= 2:
+        parts[-1] += "*"
+    return (" OR " if any_terms else " ").join(parts)
+
+
+def postgres_tsquery(terms: List[str], any_terms: bool, prefix: bool) -> str:
+    parts = list(terms)
+    if prefix and len(terms[-1]) >= 2:
+        parts[-1] += ":*"
+    return (" | " if any_terms else " & ").join(parts)
+
+
+class ProductSearch:
+    def __init__(self, common_share: float = 0.5, stats_ttl: float = 300.0):
+        # Any-term queries drop words found in more than `common_share` of the products: they'd
+        # match most of the catalog (every match gets scored) while adding next to nothing to the
+        # ranking (BM25 gives such terms an IDF of ~0). Document counts are cached for `stats_ttl`.
+        self.common_share = common_share
+        self.stats_ttl = stats_ttl
+        self._doc_counts: Dict[str, Tuple[int, float]] = {} # match expression -> (documents, expires at)
+
+        self.searches = 0
+        self.fallbacks = 0 # all-terms queries with no hits, retried with any term
+        self.pruned_terms = 0
+        self.total_seconds = 0.0
+
+    async def search(self, db: AsyncSession, query: str, limit: int = 20, category: Optional[str] = None,
+                     available_only: bool = False, prefix: bool = True, any_terms: bool = False) -> Dict[str, Any]:
+        """
+        Best matches for `query`, best first. `prefix` lets the last term match as a
+        prefix (search-as-you-type). `matched` says whether hits contain all terms or any.
+        """
+        started = time.perf_counter()
+        terms = query_terms(query)
+        items, matched = [], None
+        if terms:
+            matched = "any" if any_terms else "all"
+            if any_terms:
+                items = await self._run_any(db, terms, prefix, limit, category, available_only)
+            else:
+                items = await self._run(db, terms, False, prefix, limit, category, available_only)
+            if not items and matched == "all" and len(terms) > 1:
+                matched = "any"
+                self.fallbacks += 1
+                items = await self._run_any(db, terms, prefix, limit, category, available_only)
+        self.searches += 1
+        self.total_seconds += time.perf_counter() - started
+        return {"query": query, "terms": terms, "matched": matched if items else None, "items": items}
+
+    async def _run_any(self, db: AsyncSession, terms: List[str], prefix: bool, limit: int,
+                       category: Optional[str], available_only: bool) -> List[Dict[str, Any]]:
+        if len(terms) > 1:
+            total = await self._count(db, None)
+            counts = [await self._count(db, [t], prefix and i == len(terms) - 1) for i, t in enumerate(terms)]
+            kept = [i for i, n in enumerate(counts) if n <= total * self.common_share]
+            if len(kept) < len(terms):
+                kept = kept or [min(range(len(terms)), key=counts.__getitem__)] # all common: the rarest one
+                self.pruned_terms += len(terms) - len(kept)
+                prefix = prefix and kept[-1] == len(terms) - 1
+                terms = [terms[i] for i in kept]
+        return await self._run(db, terms, True, prefix, limit, category, available_only)
+
+    async def _count(self, db: AsyncSession, terms: Optional[List[str]], prefix: bool = False) -> int:
+        """Products matching `terms` (all products for None), cached for `stats_ttl`."""
+        postgres = db.bind.dialect.name == "postgresql"
+        if terms is None:
+            key, stmt, params = "*", text("SELECT count(*) FROM products"), {}
+        elif postgres:
+            key = postgres_tsquery(terms, False, prefix)
+            stmt = text("SELECT count(*) FROM products WHERE search_vector @@ to_tsquery('english', :query)")
+            params = {"query": key}
+        else:
+            key = sqlite_match(terms, False, prefix)
+            stmt = text("SELECT count(*) FROM products_fts WHERE products_fts MATCH :query")
+            params = {"query": key}
+        cached = self._doc_counts.get(key)
+        if cached and cached[1] > time.monotonic():
+            return cached[0]
+        count = (await db.execute(stmt, params)).scalar()
+        if len(self._doc_counts) > 10_000:
+            self._doc_counts.clear()
+        self._doc_counts[key] = (count, time.monotonic() + self.stats_ttl)
+        return count
+
+    async def _run(self, db: AsyncSession, terms: List[str], any_terms: bool, prefix: bool, limit: int,
+                   category: Optional[str], available_only: bool) -> List[Dict[str, Any]]:
+        params = {"limit": limit}
+        filters = ""
+        if category:
+            params["category"] = category
+            filters += " AND p.category = :category"
+        if available_only:
+            filters += " AND p.is_available"
+
+        if db.bind.dialect.name == "postgresql":
+            params["query"] = postgres_tsquery(terms, any_terms, prefix)
+            params["headline"] = (f"StartSel={HIGHLIGHT[0]}, StopSel={HIGHLIGHT[1]}, "
+                                  f"MaxWords={SNIPPET_TOKENS}, MinWords={SNIPPET_TOKENS // 2}, ShortWord=2")
+            # Headlines are costly (they re-parse the text): only for the page of hits
+            stmt = text(f"""
+                SELECT hits.*, ts_headline('english', concat_ws(' ', hits.description, hits.visual_description),
+                                           to_tsquery('english', :query), :headline) AS snippet
+                FROM (
+                    SELECT p.id, p.sku, p.name, p.category, p.price, p.image_url, p.stock_quantity, p.is_available,
+                           p.description, p.visual_description,
+                           ts_rank_cd(p.search_vector, to_tsquery('english', :query), 1) AS score
+                    FROM products p
+                    WHERE p.search_vector @@ to_tsquery('english', :query){filters}
+                    ORDER BY score DESC, p.id
+                    LIMIT :limit
+                ) hits
+                ORDER BY hits.score DESC, hits.id
+            """)
+        else:
+            params["query"] = sqlite_match(terms, any_terms, prefix)
+            # "ORDER BY rank" is sorted inside FTS5, so snippets are only built for the rows returned
+            stmt = text(f"""
+                SELECT p.id, p.sku, p.name, p.category, p.price, p.image_url, p.stock_quantity, p.is_available,
+                       -products_fts.rank AS score,
+                       snippet(products_fts, -1, '{HIGHLIGHT[0]}', '{HIGHLIGHT[1]}', '…', {SNIPPET_TOKENS}) AS snippet
+                FROM products_fts JOIN products p ON p.id = products_fts.rowid
+                WHERE products_fts MATCH :query AND products_fts.rank MATCH 'bm25({", ".join(map(str, SQLITE_WEIGHTS))})'{filters}
+                ORDER BY products_fts.rank
+                LIMIT :limit
+            """)
+        rows = (await db.execute(stmt, params)).mappings().all()
+        return [
+            {
+                "id": row["id"],
+                "sku": row["sku"],
+                "name": row["name"],
+                "category": row["category"],
+                "price": row["price"],
+                "image_url": row["image_url"],
+                "stock_quantity": row["stock_quantity"],
+                "is_available": bool(row["is_available"]),
+                "score": round(float(row["score"]), 4),
+                "snippet": row["snippet"],
+            }
+            for row in rows
+        ]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "searches": self.searches,
+            "fallbacks_to_any_term": self.fallbacks,
+            "common_terms_dropped": self.pruned_terms,
+            "avg_ms": round(self.total_seconds / self.searches * 1000, 2) if self.searches else None,
+        }
+
+
+product_search = ProductSearch()
@@ -0,0 +1,125 @@
+"""
+Response Cache
+Caches agent replies for repeated, context-free prompts ("what sizes do you have")
+so identical questions don't each cost a full LLM call.
+"""
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+from backend.config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """
+    LRU + TTL reply cache keyed on (agent name, system prompt hash, normalized input).
+    Optionally backed by a SQLite file so entries survive restarts and are shared
+    between workers on the same host.
+    """
+
+    def __init__(self, max_entries: int = 1000, ttl_seconds: int = 3600, sqlite_path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        self._store = None
+        if sqlite_path:
+            self._store = sqlite3.connect(sqlite_path, check_same_thread=False)
+            self._store.execute(
+                "CREATE TABLE IF NOT EXISTS response_cache (key TEXT PRIMARY KEY, response TEXT, created_at REAL)"
+            )
+            self._store.commit()
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """Lowercase, collapse whitespace and drop trailing punctuation."""
+        text = re.sub(r"\s+", " ", text.lower()).strip()
+        return text.rstrip("?!. ")
+
+    def make_key(self, agent_name: str, system_prompt: str, user_input: str) -> str:
+        prompt_hash = hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()[:16]
+        return f"{agent_name}:{prompt_hash}:{self.normalize(user_input)}"
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and now - entry[1] < self.ttl_seconds:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry:
+                del self._entries[key]
+
+            if self._store is not None:
+                row = self._store.execute(
+                    "SELECT response, created_at FROM response_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row and now - row[1] < self.ttl_seconds:
+                    self._remember(key, row[0], row[1])
+                    self.hits += 1
+                    return row[0]
+
+            self.misses += 1
+            return None
+
+    def set(self, key: str, response: str):
+        if not response:
+            return
+        now = time.time()
+        with self._lock:
+            self._remember(key, response, now)
+            if self._store is not None:
+                try:
+                    self._store.execute(
+                        "INSERT OR REPLACE INTO response_cache (key, response, created_at) VALUES (?, ?, ?)",
+                        (key, response, now)
+                    )
+                    self._store.execute(
+                        "DELETE FROM response_cache WHERE created_at < ?", (now - self.ttl_seconds,)
+                    )
+                    self._store.commit()
+                except sqlite3.Error as e:
+                    logger.error(f"Response cache store error: {str(e)}")
+
+    def _remember(self, key: str, response: str, created_at: float):
+        self._entries[key] = (response, created_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._store is not None:
+                self._store.execute("DELETE FROM response_cache")
+                self._store.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "sqlite_backed": self._store is not None
+        }
+
+
+# Singleton instance (None when disabled)
+response_cache = ResponseCache(
+    max_entries=settings.RESPONSE_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.RESPONSE_CACHE_TTL_SECONDS,
+    sqlite_path=settings.RESPONSE_CACHE_SQLITE_PATH
+) if settings.RESPONSE_CACHE_ENABLED else None
@@ -4,6 +4,7 @@ Provides market intelligence, competitor analysis, and product trend research.
 """
 from typing import Dict, List, Optional, Any
 from serpapi import GoogleSearch
+from backend.services.single_flight import serpapi_flight
 import os
 from datetime import datetime
 import logging
@@ -19,6 +20,13 @@ class SerpAPIService:
         if not self.api_key:
             logger.warning("SERPAPI_API_KEY not set. Web scouting features will be disabled.")
     
+    def _search(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Run a SerpAPI query. Identical concurrent queries share one upstream call.
+        """
+        key = serpapi_flight.make_key(*sorted((k, v) for k, v in params.items() if k != "api_key"))
+        return serpapi_flight.do_sync(key, lambda: GoogleSearch(params).get_dict())
+    
     def search_products(
         self, 
         query: str, 
@@ -48,8 +56,7 @@ class SerpAPIService:
                 "api_key": self.api_key
             }
             
-            search = GoogleSearch(params)
-            results = search.get_dict()
+            results = self._search(params)
             
             # Extract shopping results
             shopping_results = results.get("shopping_results", [])
@@ -107,8 +114,7 @@ class SerpAPIService:
                 "api_key": self.api_key
             }
             
-            search = GoogleSearch(params)
-            results = search.get_dict()
+            results = self._search(params)
             
             organic_results = results.get("organic_results", [])
             
@@ -160,8 +166,7 @@ class SerpAPIService:
                 "api_key": self.api_key
             }
             
-            search = GoogleSearch(params)
-            results = search.get_dict()
+            results = self._search(params)
             
             # Extract interest over time
             interest_over_time = results.get("interest_over_time", {})
@@ -209,8 +214,7 @@ class SerpAPIService:
                 "api_key": self.api_key
             }
             
-            search = GoogleSearch(params)
-            results = search.get_dict()
+            results = self._search(params)
             
             news_results = results.get("news_results", [])
             
@@ -260,8 +264,7 @@ class SerpAPIService:
                 "api_key": self.api_key
             }
             
-            search = GoogleSearch(params)
-            results = search.get_dict()
+            results = self._search(params)
             
             shopping_results = results.get("shopping_results", [])
             
@@ -0,0 +1,99 @@
+"""
+Single-Flight Request Coalescing
+Concurrent identical requests share one upstream call (Groq, SerpAPI) and all
+callers receive its result.
+"""
+import asyncio
+import hashlib
+import threading
+from typing import Any, Awaitable, Callable, Dict
+
+
+class _SyncCall:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesces in-flight calls by key.
+    `do()` is for coroutines on the event loop, `do_sync()` for blocking calls
+    that may run concurrently in worker threads.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._tasks: Dict[str, asyncio.Future] = {}
+        self._calls: Dict[str, _SyncCall] = {}
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.executions = 0
+        self.deduplicated = 0
+
+    @staticmethod
+    def make_key(*parts: Any) -> str:
+        raw = "\x1f".join(str(p) for p in parts)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        with self._lock:
+            self.requests += 1
+            task = self._tasks.get(key)
+            if task is not None:
+                self.deduplicated += 1
+            else:
+                self.executions += 1
+                task = asyncio.ensure_future(fn())
+                self._tasks[key] = task
+                task.add_done_callback(lambda _: self._forget_task(key, task))
+        # Shield so one cancelled caller doesn't cancel the shared call for the others
+        return await asyncio.shield(task)
+
+    def _forget_task(self, key: str, task: asyncio.Future):
+        with self._lock:
+            if self._tasks.get(key) is task:
+                del self._tasks[key]
+
+    def do_sync(self, key: str, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            self.requests += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                self.executions += 1
+                call = _SyncCall()
+                self._calls[key] = call
+            else:
+                self.deduplicated += 1
+
+        if leader:
+            try:
+                call.result = fn()
+            except Exception as e:
+                call.error = e
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+        else:
+            call.done.wait()
+
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "requests": self.requests,
+            "upstream_calls": self.executions,
+            "deduplicated": self.deduplicated,
+            "in_flight": len(self._tasks) + len(self._calls)
+        }
+
+
+# Shared instances
+llm_flight = SingleFlight("llm")
+serpapi_flight = SingleFlight("serpapi")
@@ -0,0 +1,140 @@
+"""
+Background Summarization Worker
+Conversation summaries are refreshed off the request path, debounced per
+conversation: a run is due once `every_messages` new messages have arrived, or
+once the conversation has been idle for `idle_seconds` with anything unsummarized.
+Failed runs are retried with exponential backoff.
+
+The summarize function owns the persisted watermark, so pending work lost on a
+restart is simply picked up by the conversation's next run.
+"""
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class SummaryWorker:
+    def __init__(self, summarize_fn: Callable[[int], int], every_messages: int = 6, idle_seconds: float = 120,
+                 max_retries: int = 3, retry_backoff: float = 5.0):
+        self.summarize_fn = summarize_fn # conversation id -> messages folded into the summary
+        self.every_messages = every_messages
+        self.idle_seconds = idle_seconds
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+
+        self._state: Dict[int, Dict[str, Any]] = {}
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+
+        self.notified_messages = 0
+        self.runs = 0
+        self.noop_runs = 0
+        self.failures = 0
+        self.dropped = 0
+        self.messages_folded = 0
+
+    def start(self):
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="summary-worker", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """Stops the worker; queued work is dropped (the watermark keeps it for next time)."""
+        with self._cond:
+            thread = self._thread
+            self._stopping = True
+            self._cond.notify_all()
+        if thread is not None:
+            thread.join(timeout)
+        with self._cond:
+            self._thread = None
+
+    def notify(self, conversation_id: int, new_messages: int = 1):
+        """Records new messages for a conversation and (re)arms its idle timer."""
+        if self._thread is None:
+            self.start()
+        with self._cond:
+            state = self._state.setdefault(conversation_id, {"pending": 0, "attempts": 0, "retry_at": None})
+            state["pending"] += new_messages
+            state["last_activity"] = time.monotonic()
+            self.notified_messages += new_messages
+            self._cond.notify_all()
+
+    def _due_at(self, state: Dict[str, Any]) -> float:
+        if state["retry_at"] is not None:
+            return state["retry_at"]
+        if state["pending"] >= self.every_messages:
+            return 0.0
+        return state["last_activity"] + self.idle_seconds
+
+    def _next_due(self) -> Optional[int]:
+        """Waits for the next due conversation (caller holds _cond). None when stopping."""
+        while not self._stopping:
+            now = time.monotonic()
+            due = min(((self._due_at(s), cid) for cid, s in self._state.items()), default=None)
+            if due is not None and due[0] <= now:
+                return due[1]
+            self._cond.wait(due[0] - now if due else None)
+        return None
+
+    def _run(self):
+        while True:
+            with self._cond:
+                conversation_id = self._next_due()
+                if conversation_id is None:
+                    return
+                state = self._state[conversation_id]
+                pending_at_start = state["pending"]
+
+            try:
+                folded = self.summarize_fn(conversation_id)
+            except Exception as e:
+                with self._cond:
+                    self.failures += 1
+                    state["attempts"] += 1
+                    if state["attempts"] > self.max_retries:
+                        self.dropped += 1
+                        del self._state[conversation_id]
+                        logger.error(f"[Summary] Giving up on conversation {conversation_id} after {state['attempts']} attempts: {e}")
+                    else:
+                        delay = self.retry_backoff * 2 ** (state["attempts"] - 1)
+                        state["retry_at"] = time.monotonic() + delay
+                        logger.warning(f"[Summary] Conversation {conversation_id} failed, retrying in {delay:.1f}s: {e}")
+                continue
+
+            with self._cond:
+                self.runs += 1
+                self.noop_runs += folded == 0
+                self.messages_folded += folded
+                # Messages that arrived during the run stay pending
+                state["pending"] -= pending_at_start
+                state["attempts"] = 0
+                state["retry_at"] = None
+                if state["pending"] <= 0:
+                    del self._state[conversation_id]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            pending = len(self._state)
+            retrying = sum(1 for s in self._state.values() if s["retry_at"] is not None)
+        return {
+            "running": self._thread is not None,
+            "pending_conversations": pending,
+            "retrying_conversations": retrying,
+            "notified_messages": self.notified_messages,
+            "runs": self.runs,
+            "noop_runs": self.noop_runs,
+            "llm_summaries": self.runs - self.noop_runs,
+            "messages_folded": self.messages_folded,
+            "failures": self.failures,
+            "dropped": self.dropped,
+            "every_messages": self.every_messages,
+            "idle_seconds": self.idle_seconds
+        }
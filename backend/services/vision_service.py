@@ -1,15 +1,18 @@
 import os
 from groq import Groq
 from backend.config import settings
+from backend.llm.resilience import get_caller
 
 class VisionService:
     def __init__(self):
-        self.client = Groq(api_key=settings.GROQ_API_KEY)
+        self.client = Groq(api_key=settings.GROQ_API_KEY, base_url=settings.GROQ_BASE_URL, timeout=settings.LLM_DEADLINE_SECONDS)
+        self.llm_caller = get_caller("vision")
         self.model = "llama-3.2-11b-vision-preview" # Using Llama 3.2 Vision
 
-    def analyze_image(self, image_url: str) -> str:
+    def analyze_image(self, image_url: str, raise_errors: bool = False) -> str:
         """
         Analyzes an image and returns a detailed visual description suitable for search matching.
+        Failures return "" unless `raise_errors` (callers that retry, like the enrichment queue).
         """
         if not image_url:
             return ""
@@ -39,6 +42,8 @@ class VisionService:
                 # Validate file exists
                 if not os.path.exists(file_path):
                      print(f"File not found for vision analysis: {file_path}")
+                     if raise_errors:
+                         raise FileNotFoundError(f"Image file not found for analysis: {file_path}")
                      return "Image file not found for analysis."
 
                 with open(file_path, "rb") as image_file:
@@ -48,7 +53,8 @@ class VisionService:
             else:
                 image_url_obj = image_url
 
-            chat_completion = self.client.chat.completions.create(
+            # Deadline + circuit breaker; an empty description just means no visual matches
+            chat_completion = self.llm_caller.call_sync(lambda: self.client.chat.completions.create(
                 messages=[
                     {
                         "role": "user",
@@ -64,11 +70,17 @@ class VisionService:
                     }
                 ],
                 model=self.model,
-            )
+            ), canned=None)
+            if chat_completion is None:
+                if raise_errors:
+                    raise RuntimeError("Vision model unavailable (circuit open or deadline exceeded)")
+                return ""
             description = chat_completion.choices[0].message.content
             return description
         except Exception as e:
             print(f"Error in Vision Service: {e}")
+            if raise_errors:
+                raise
             return ""
 
 vision_service = VisionService()
@@ -0,0 +1,127 @@
+"""
+Event-loop benchmark: sync vs async database sessions in async handlers
+Runs N concurrent "turns" on one event loop, each reading a user's conversation
+context and then awaiting a simulated LLM call, three ways:
+
+  sync in loop   - sync SessionLocal called directly in the coroutine (blocks the loop)
+  to_thread      - sync session in a worker thread (asyncio.to_thread)
+  async engine   - AsyncSessionLocal (aiosqlite / asyncpg)
+
+A ticker task measures event-loop lag (how late a 5 ms sleep wakes up), which is
+what every other request on the worker feels while a handler blocks.
+
+Usage:
+    python benchmark_async_db.py --users 200 --concurrency 100 --turns 1000
+    DATABASE_URL=postgresql://... python benchmark_async_db.py   # against a real server (seeds rows!)
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+
+_tmp_dir = tempfile.mkdtemp(prefix="crm_bench_")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_tmp_dir, 'bench.db')}")
+os.environ.setdefault("GROQ_API_KEY", "benchmark")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ["CONTEXT_CACHE_ENABLED"] = "false" # measure the database path
+os.environ["MESSAGE_WRITE_BEHIND_ENABLED"] = "false"
+
+
+def seed(db, num_users: int, num_messages: int):
+    from backend.models import User, Conversation, Message
+
+    for i in range(num_users):
+        user = User(full_name=f"Bench User {i}", phone_number=f"bench-{i}", email=f"bench-{i}@example.com")
+        db.add(user)
+        db.flush()
+        conv = Conversation(customer_id=user.id, platform="general", summary=f"User {i} likes linen shirts.")
+        db.add(conv)
+        db.flush()
+        db.add_all([
+            Message(conversation_id=conv.id, sender="user" if j % 2 == 0 else "agent", content=f"message {j} for user {i}")
+            for j in range(num_messages)
+        ])
+    db.commit()
+
+
+async def run_mode(name, read, identifiers, concurrency: int, llm_ms: float):
+    semaphore = asyncio.Semaphore(concurrency)
+    durations = []
+    lags = []
+    done = asyncio.Event()
+
+    async def ticker():
+        while not done.is_set():
+            started = time.perf_counter()
+            await asyncio.sleep(0.005)
+            lags.append(time.perf_counter() - started - 0.005)
+
+    async def turn(identifier):
+        async with semaphore:
+            started = time.perf_counter()
+            await read(identifier)
+            durations.append(time.perf_counter() - started)
+            await asyncio.sleep(llm_ms / 1000) # the LLM call the context is for
+
+    tick = asyncio.create_task(ticker())
+    started = time.perf_counter()
+    await asyncio.gather(*(turn(i) for i in identifiers))
+    wall = time.perf_counter() - started
+    done.set()
+    await tick
+
+    durations.sort()
+    lags.sort()
+    print(f"{name:<16} wall {wall:6.2f}s   {len(identifiers) / wall:7.1f} turns/s   "
+          f"read p50 {durations[len(durations) // 2] * 1000:6.2f} ms  p99 {durations[int(len(durations) * 0.99)] * 1000:7.2f} ms   "
+          f"loop lag p99 {lags[int(len(lags) * 0.99)] * 1000:6.2f} ms  max {lags[-1] * 1000:6.2f} ms")
+
+
+async def main(num_users: int, num_messages: int, turns: int, concurrency: int, llm_ms: float):
+    from backend.database import Base, engine, SessionLocal, AsyncSessionLocal
+    from backend.services.chat_history import chat_history
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        seed(db, num_users, num_messages)
+    finally:
+        db.close()
+
+    random.seed(7)
+    identifiers = [f"bench-{random.randrange(num_users)}" for _ in range(turns)]
+
+    async def sync_in_loop(identifier):
+        return chat_history.get_context(identifier)
+
+    async def in_thread(identifier):
+        return await asyncio.to_thread(chat_history.get_context, identifier)
+
+    async def async_engine(identifier):
+        return await chat_history.aget_context(identifier)
+
+    # Same answer from all paths
+    for identifier in identifiers[:20]:
+        assert chat_history.get_context(identifier) == await chat_history.aget_context(identifier), identifier
+
+    print("=" * 130)
+    print(f"{num_users} users x {num_messages} messages, {turns} turns, concurrency {concurrency}, "
+          f"simulated LLM {llm_ms:.0f} ms ({engine.url.get_backend_name()})")
+    await run_mode("sync in loop", sync_in_loop, identifiers, concurrency, llm_ms)
+    await run_mode("to_thread", in_thread, identifiers, concurrency, llm_ms)
+    await run_mode("async engine", async_engine, identifiers, concurrency, llm_ms)
+    print("=" * 130)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--messages", type=int, default=40)
+    parser.add_argument("--turns", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--llm-ms", type=float, default=50)
+    args = parser.parse_args()
+    asyncio.run(main(args.users, args.messages, args.turns, args.concurrency, args.llm_ms))
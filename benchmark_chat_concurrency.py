@@ -0,0 +1,100 @@
+"""
+Concurrency benchmark for /chat/message
+Fires N concurrent chat requests against the app (in-process, no network) with the
+Groq client replaced by a fake model that takes a fixed time to answer.
+
+Runs with the configured scheduler limits (LLM_MAX_CONCURRENCY, rate limit): with a
+non-blocking agent path the batch finishes in about ceil(N / concurrency) LLM
+latencies; if anything blocks the event loop it degrades to N x latency.
+
+Usage:
+    python benchmark_chat_concurrency.py --requests 20 --latency 1.0
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+# Isolated throwaway database + dummy credentials so the app can boot offline
+_tmp_dir = tempfile.mkdtemp(prefix="crm_bench_")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_tmp_dir, 'bench.db')}")
+os.environ.setdefault("GROQ_API_KEY", "benchmark")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ.setdefault("MESSAGE_JOURNAL_DIR", os.path.join(_tmp_dir, "journal"))
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+
+class SlowFakeChatModel(BaseChatModel):
+    """Chat model that sleeps for `latency` seconds and echoes the last message."""
+    latency: float = 1.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "slow-fake"
+
+    def _reply(self, messages) -> ChatResult:
+        text = f"echo: {messages[-1].content}"
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        time.sleep(self.latency)
+        return self._reply(messages)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        await asyncio.sleep(self.latency)
+        return self._reply(messages)
+
+
+async def run_benchmark(num_requests: int, latency: float):
+    import math
+    import httpx
+    from backend.main import app
+    from backend.llm.scheduler import llm_scheduler
+    from backend.services import agent_router
+
+    fake = SlowFakeChatModel(latency=latency)
+    for agent in (agent_router.sales_agent, agent_router.support_agent, agent_router.visual_search_agent):
+        agent.llm = fake
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def one(i: int) -> float:
+            started = time.perf_counter()
+            resp = await client.post(
+                "/api/v1/chat/message",
+                json={"message": f"show me dresses #{i}", "user_id": f"bench-user-{i}"},
+                timeout=None,
+            )
+            resp.raise_for_status()
+            return time.perf_counter() - started
+
+        # Warm up (table creation, first connection)
+        await one(-1)
+
+        started = time.perf_counter()
+        durations = await asyncio.gather(*(one(i) for i in range(num_requests)))
+        wall = time.perf_counter() - started
+
+    print("=" * 60)
+    print(f"Concurrent requests : {num_requests}")
+    print(f"Fake LLM latency    : {latency:.2f}s")
+    print(f"Wall time           : {wall:.2f}s ({wall / latency:.1f}x LLM latency)")
+    print(f"Per-request avg/max : {sum(durations) / len(durations):.2f}s / {max(durations):.2f}s")
+    print(f"Scheduler limits    : {llm_scheduler.max_concurrency} concurrent, "
+          f"{llm_scheduler.rate_per_second * 60:g}/min (0 = unlimited)")
+    print(f"Expected (no block) : {math.ceil(num_requests / llm_scheduler.max_concurrency) * latency:.2f}s"
+          + (" + rate limit waits" if llm_scheduler.rate_per_second else ""))
+    print(f"Serial lower bound  : {num_requests * latency:.2f}s")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=1.0)
+    args = parser.parse_args()
+    asyncio.run(run_benchmark(args.requests, args.latency))
@@ -0,0 +1,124 @@
+"""
+Per-turn DB benchmark for ChatHistoryService.get_context
+Compares the original write path (get_or_create_user + get_or_create_conversation,
+with their commits and refreshes) against the single-query read path and the
+context cache, on a seeded throwaway database. Both DB paths must return the same context.
+
+Usage:
+    python benchmark_chat_history.py --users 200 --messages 40 --turns 2000
+    DATABASE_URL=postgresql://... python benchmark_chat_history.py   # against a real server (seeds rows!)
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+_tmp_dir = tempfile.mkdtemp(prefix="crm_bench_")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_tmp_dir, 'bench.db')}")
+os.environ.setdefault("GROQ_API_KEY", "benchmark")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ.setdefault("CONTEXT_CACHE_ENABLED", "true") # single process: the in-process cache is fine
+
+from sqlalchemy import event
+
+
+def seed(db, num_users: int, num_messages: int):
+    from backend.models import User, Conversation, Message
+
+    for i in range(num_users):
+        user = User(full_name=f"Bench User {i}", phone_number=f"bench-{i}", email=f"bench-{i}@example.com")
+        db.add(user)
+        db.flush()
+        conv = Conversation(customer_id=user.id, platform="general", summary=f"User {i} likes linen shirts.")
+        db.add(conv)
+        db.flush()
+        db.add_all([
+            Message(conversation_id=conv.id, sender="user" if j % 2 == 0 else "agent", content=f"message {j} for user {i}")
+            for j in range(num_messages)
+        ])
+    db.commit()
+
+
+class StatementCounter:
+    def __init__(self, engine):
+        self.statements = 0
+        self.commits = 0
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+        event.listen(engine, "commit", self._on_commit)
+
+    def _on_execute(self, *args):
+        self.statements += 1
+
+    def _on_commit(self, *args):
+        self.commits += 1
+
+    def reset(self):
+        self.statements = 0
+        self.commits = 0
+
+
+def run_path(name, fn, identifiers, counter):
+    counter.reset()
+    durations = []
+    for identifier in identifiers:
+        started = time.perf_counter()
+        fn(identifier)
+        durations.append(time.perf_counter() - started)
+    turns = len(identifiers)
+    durations.sort()
+    print(f"{name:<28} avg {statistics.mean(durations) * 1000:7.3f} ms   "
+          f"p95 {durations[int(turns * 0.95)] * 1000:7.3f} ms   "
+          f"{counter.statements / turns:4.1f} statements/turn   {counter.commits / turns:4.1f} commits/turn")
+    return statistics.mean(durations)
+
+
+def main(num_users: int, num_messages: int, turns: int):
+    from backend.database import Base, engine, SessionLocal
+    from backend.services.chat_history import chat_history
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        seed(db, num_users, num_messages)
+    finally:
+        db.close()
+
+    random.seed(7)
+    identifiers = [f"bench-{random.randrange(num_users)}" for _ in range(turns)]
+    counter = StatementCounter(engine)
+
+    def before(identifier):
+        session = SessionLocal()
+        try:
+            return chat_history._get_or_create_context(session, identifier)
+        finally:
+            session.close()
+
+    # Same answer from both paths
+    context_cache, chat_history.context_cache = chat_history.context_cache, None
+    for identifier in identifiers[:20]:
+        expected = before(identifier)
+        assert {k: expected[k] for k in ("conversation_id", "summary", "history")} == chat_history.get_context(identifier), identifier
+
+    print("=" * 100)
+    print(f"{num_users} users x {num_messages} messages, {turns} get_context calls ({engine.url.get_backend_name()})")
+    slow = run_path("before (get_or_create)", before, identifiers, counter)
+    fast = run_path("after (joined read)", chat_history.get_context, identifiers, counter)
+    cached = None
+    if context_cache is not None:
+        chat_history.context_cache = context_cache
+        cached = run_path("after (context cache)", chat_history.get_context, identifiers, counter)
+    print(f"Speed-up: {slow / fast:.1f}x" + (f" ({slow / cached:.0f}x with the context cache, "
+                                              f"hit rate {context_cache.stats()['hit_rate']:.0%})" if cached else ""))
+    print("=" * 100)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--messages", type=int, default=40)
+    parser.add_argument("--turns", type=int, default=2000)
+    args = parser.parse_args()
+    main(args.users, args.messages, args.turns)
@@ -0,0 +1,75 @@
+"""
+Offline accuracy / latency benchmark for the intent router
+Compares the legacy keyword routing against the local TF-IDF classifier on the
+held-out set in backend/data/intent_eval.jsonl. No API keys or network needed.
+
+Usage:
+    python benchmark_intent_router.py [--threshold 0.6] [--repeat 200]
+"""
+import argparse
+import os
+import statistics
+import time
+
+from backend.services.intent_classifier import IntentClassifier, load_examples, DATA_DIR
+
+EVAL_PATH = os.path.join(DATA_DIR, "intent_eval.jsonl")
+
+
+def keyword_route(text: str) -> str:
+    """The original V1 substring router (no visual route for text)."""
+    message_lower = text.lower()
+    if any(x in message_lower for x in ["order", "refund", "return", "track", "help", "late"]):
+        return "support"
+    return "sales"
+
+
+def time_per_call(fn, examples, repeat: int):
+    samples = []
+    for _ in range(repeat):
+        for text, _ in examples:
+            started = time.perf_counter()
+            fn(text)
+            samples.append((time.perf_counter() - started) * 1_000_000)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.99) - 1]
+
+
+def main(threshold: float, repeat: int):
+    examples = load_examples(EVAL_PATH)
+    model = IntentClassifier.load_or_train()
+
+    keyword_correct = sum(keyword_route(text) == label for text, label in examples)
+
+    predictions = [(model.predict(text), label) for text, label in examples]
+    model_correct = sum(pred == label for (pred, _), label in predictions)
+    confident = [(pred, label) for (pred, conf), label in predictions if conf >= threshold]
+    confident_correct = sum(pred == label for pred, label in confident)
+
+    kw_p50, kw_p99 = time_per_call(keyword_route, examples, repeat)
+    clf_p50, clf_p99 = time_per_call(model.predict, examples, repeat)
+
+    print("=" * 60)
+    print(f"Eval examples            : {len(examples)}")
+    print(f"Keyword router accuracy  : {keyword_correct / len(examples):.1%}")
+    print(f"Classifier accuracy      : {model_correct / len(examples):.1%}")
+    print(f"Confident (>= {threshold:.2f})      : {len(confident)}/{len(examples)} "
+          f"({len(examples) - len(confident)} would go to the LLM)")
+    if confident:
+        print(f"Accuracy when confident  : {confident_correct / len(confident):.1%}")
+    print(f"Keyword latency p50/p99  : {kw_p50:.1f}us / {kw_p99:.1f}us")
+    print(f"Classifier latency p50/p99: {clf_p50:.1f}us / {clf_p99:.1f}us")
+    print("=" * 60)
+
+    print("Misrouted by classifier:")
+    for ((pred, conf), label), (text, _) in zip(predictions, examples):
+        if pred != label:
+            print(f"  [{label} -> {pred} @ {conf:.2f}] {text}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threshold", type=float, default=0.6)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+    main(args.threshold, args.repeat)
@@ -0,0 +1,164 @@
+"""
+Product search latency benchmark on a synthetic catalog
+Seeds N products (through the sync triggers, so index maintenance is part of
+the seed time), then times product_search.search() for several query shapes:
+common and rare terms, multi-term, search-as-you-type prefixes, any-term
+fallback and filtered searches. A LIKE '%term%' scan over the same columns
+(what a search without the index has to do) is timed for comparison.
+
+Usage:
+    python benchmark_product_search.py --products 100000 --repeat 200
+    DATABASE_URL=postgresql://... python benchmark_product_search.py   # against a real server (seeds rows!)
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+
+_tmp_dir = tempfile.mkdtemp(prefix="crm_bench_")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_tmp_dir, 'bench.db')}")
+os.environ.setdefault("GROQ_API_KEY", "benchmark")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ.setdefault("SQL_INSTRUMENTATION_ENABLED", "false") # no slow-query log lines in the output
+
+COLORS = ["black", "white", "red", "navy", "blue", "green", "beige", "grey", "pink", "olive", "burgundy", "mustard"]
+MATERIALS = ["cotton", "linen", "denim", "silk", "wool", "leather", "polyester", "cashmere", "velvet", "chiffon"]
+STYLES = ["classic", "slim", "oversized", "vintage", "casual", "formal", "floral", "striped", "cropped", "pleated"]
+ITEMS = {
+    "dresses": ["dress", "maxi dress", "midi dress", "wrap dress", "shirt dress"],
+    "shirts": ["shirt", "oxford shirt", "blouse", "polo", "tee"],
+    "trousers": ["trousers", "chinos", "jeans", "cargo pants", "shorts"],
+    "jackets": ["jacket", "blazer", "bomber", "trench coat", "parka"],
+    "shoes": ["sneakers", "loafers", "boots", "sandals", "heels"],
+    "accessories": ["scarf", "belt", "handbag", "cap", "sunglasses"],
+}
+OCCASIONS = ["weddings", "the office", "summer evenings", "weekends", "travel", "date night", "the gym", "parties"]
+
+
+def synthetic_products(count: int, seed: int = 7):
+    rng = random.Random(seed)
+    categories = list(ITEMS)
+    for i in range(count):
+        category = rng.choice(categories)
+        item = rng.choice(ITEMS[category])
+        color, material, style = rng.choice(COLORS), rng.choice(MATERIALS), rng.choice(STYLES)
+        row = {
+            "sku": f"BENCH-{i:07d}",
+            "name": f"{style.title()} {color.title()} {material.title()} {item.title()} {10000 + i}",
+            "category": category,
+            "description": f"A {style} {item} in {color} {material}. Made for {rng.choice(OCCASIONS)}, "
+                           f"pairs well with {rng.choice(COLORS)} {rng.choice(ITEMS[rng.choice(categories)])}.",
+            "price": round(rng.uniform(5, 400), 2),
+            "stock_quantity": rng.randrange(0, 50),
+            "is_available": rng.random() > 0.1,
+            "enrichment_status": "done",
+            "visual_description": None,
+        }
+        if rng.random() < 0.6: # enriched products have a vision description
+            row["visual_description"] = (f"{color} {item} with a {rng.choice(['relaxed', 'fitted', 'flowing', 'boxy'])} "
+                                         f"silhouette, {rng.choice(['matte', 'glossy', 'textured'])} {material} finish")
+        yield row
+
+
+def seed(engine, count: int, batch: int = 5000) -> float:
+    from sqlalchemy import insert
+    from backend.models import Product
+
+    started = time.perf_counter()
+    rows = []
+    with engine.begin() as conn:
+        for row in synthetic_products(count):
+            rows.append(row)
+            if len(rows) == batch:
+                conn.execute(insert(Product.__table__), rows)
+                rows = []
+        if rows:
+            conn.execute(insert(Product.__table__), rows)
+    return time.perf_counter() - started
+
+
+QUERIES = [
+    # (label, query, search kwargs)
+    ("common term", "dress", {}),
+    ("two terms", "red linen", {}),
+    ("three terms", "navy wool blazer", {}),
+    ("prefix (typing)", "vintage den", {}),
+    ("short prefix", "ca", {}),
+    ("rare term", "10042", {}),
+    ("any-term fallback", "burgundy tuxedo", {}),
+    ("visual words, any", "flowing silhouette glossy silk", {"any_terms": True}),
+    ("filtered", "floral silk", {"category": "dresses", "available_only": True}),
+    ("no match", "zzzyx", {}),
+]
+
+
+async def time_queries(repeat: int):
+    from backend.database import AsyncSessionLocal
+    from backend.services.product_search import product_search
+
+    print(f"{'query':<20} {'text':<32} {'hits':>4} {'match':>5}  {'p50':>8} {'p95':>8} {'p99':>8}")
+    async with AsyncSessionLocal() as db:
+        for label, query, kwargs in QUERIES:
+            result = await product_search.search(db, query, **kwargs) # warm up
+            durations = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                await product_search.search(db, query, **kwargs)
+                durations.append(time.perf_counter() - started)
+            durations.sort()
+            print(f"{label:<20} {query!r:<32} {len(result['items']):>4} {result['matched'] or '-':>5}  "
+                  f"{statistics.median(durations) * 1000:6.2f}ms {durations[int(repeat * 0.95)] * 1000:6.2f}ms "
+                  f"{durations[min(int(repeat * 0.99), repeat - 1)] * 1000:6.2f}ms")
+            if label == "two terms":
+                top = result["items"][0]
+                print(f"{'':<20} top hit: {top['name']} - {top['snippet']}")
+
+
+def time_like_scan(engine, repeat: int):
+    from sqlalchemy import text
+
+    stmt = text(
+        "SELECT id, name FROM products WHERE "
+        + " AND ".join(
+            f"(name LIKE :t{i} OR category LIKE :t{i} OR description LIKE :t{i} OR visual_description LIKE :t{i})"
+            for i in range(2)
+        )
+        + " LIMIT 20"
+    )
+    for label, terms in (("LIKE two terms", ("red", "linen")), ("LIKE no match", ("zzzyx", "zzzyx"))):
+        durations = []
+        with engine.connect() as conn:
+            for _ in range(repeat):
+                started = time.perf_counter()
+                conn.execute(stmt, {f"t{i}": f"%{t}%" for i, t in enumerate(terms)}).all()
+                durations.append(time.perf_counter() - started)
+        durations.sort()
+        print(f"{label:<20} {' '.join(terms)!r:<32} {'':>4} {'':>5}  "
+              f"{statistics.median(durations) * 1000:6.2f}ms {durations[int(repeat * 0.95)] * 1000:6.2f}ms  (unranked)")
+
+
+def main(num_products: int, repeat: int):
+    from backend.database import Base, engine
+    from backend import models # register tables (and the search index hook) for create_all
+
+    Base.metadata.create_all(bind=engine)
+    elapsed = seed(engine, num_products)
+    print("=" * 100)
+    print(f"{num_products} products seeded in {elapsed:.1f}s ({num_products / elapsed:.0f} rows/s, "
+          f"index kept in sync by triggers) - {engine.url.get_backend_name()}, {repeat} runs per query")
+    print("=" * 100)
+    asyncio.run(time_queries(repeat))
+    print("-" * 100)
+    time_like_scan(engine, max(repeat // 20, 5))
+    print("=" * 100)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+    main(args.products, args.repeat)
@@ -0,0 +1,4 @@
+#!/bin/bash
+# Lets the db-replica service stream WAL from the primary (runs once, on a fresh data volume)
+set -e
+echo "host replication all all scram-sha-256" >> "$PGDATA/pg_hba.conf"
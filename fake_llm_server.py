@@ -0,0 +1,141 @@
+"""
+Fake LLM server
+A stand-in for the Groq API (OpenAI-compatible chat completions, plain and
+streamed) with configurable latency, errors and hangs, for exercising the
+deadline / hedging / fallback / circuit-breaker path without a real provider.
+
+Point the app at it:
+    python fake_llm_server.py --port 8090 --latency 0.5 --fail-rate 0.2 --hang-rate 0.1
+    GROQ_BASE_URL=http://localhost:8090 uvicorn backend.main:app
+
+Per-model overrides let the fallback model behave differently from the primary:
+    python fake_llm_server.py --fail-model llama-3.3-70b-versatile
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+COMPLETIONS_PATH = "/openai/v1/chat/completions"
+
+
+class FakeLLMHandler(BaseHTTPRequestHandler):
+    config = None
+    counts = {"requests": 0, "failed": 0, "hung": 0}
+    lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        if self.config.verbose:
+            super().log_message(format, *args)
+
+    def _count(self, key: str):
+        with self.lock:
+            self.counts[key] += 1
+
+    def _json(self, status: int, body: dict):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        if self.path == "/stats":
+            self._json(200, dict(self.counts))
+        else:
+            self._json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        if self.path.rstrip("/") != COMPLETIONS_PATH:
+            self._json(404, {"error": {"message": "not found"}})
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        model = request.get("model", "fake")
+        self._count("requests")
+
+        cfg = self.config
+        roll = random.random()
+        if model in cfg.hang_model or roll < cfg.hang_rate:
+            self._count("hung")
+            time.sleep(cfg.hang_seconds)
+            return
+        if model in cfg.fail_model or roll < cfg.hang_rate + cfg.fail_rate:
+            self._count("failed")
+            self._json(500, {"error": {"message": "fake upstream failure", "type": "internal_server_error"}})
+            return
+
+        time.sleep(max(0.0, random.gauss(cfg.latency, cfg.jitter)))
+        last = request.get("messages", [{}])[-1].get("content", "")
+        if isinstance(last, list):
+            last = " ".join(part.get("text", "") for part in last if isinstance(part, dict))
+        text = f"[{model}] echo: {last}"
+
+        if request.get("stream"):
+            self._stream(model, text)
+        else:
+            self._json(200, {
+                "id": f"chatcmpl-{uuid.uuid4().hex}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": 1, "completion_tokens": len(text.split()), "total_tokens": 1 + len(text.split())}
+            })
+
+    def _stream(self, model: str, text: str):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+
+        def send(delta: dict, finish_reason=None):
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        send({"role": "assistant", "content": ""})
+        for word in text.split(" "):
+            send({"content": word + " "})
+            time.sleep(self.config.token_delay)
+        send({}, finish_reason="stop")
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+def serve(args):
+    FakeLLMHandler.config = args
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), FakeLLMHandler)
+    server.daemon_threads = True
+    print(f"Fake LLM server on http://127.0.0.1:{args.port} (latency={args.latency}s, "
+          f"fail={args.fail_rate:.0%}, hang={args.hang_rate:.0%})")
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency", type=float, default=0.3, help="mean response latency (seconds)")
+    parser.add_argument("--jitter", type=float, default=0.05, help="latency standard deviation (seconds)")
+    parser.add_argument("--token-delay", type=float, default=0.01, help="delay between streamed tokens")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="fraction of requests answered with HTTP 500")
+    parser.add_argument("--hang-rate", type=float, default=0.0, help="fraction of requests that never answer")
+    parser.add_argument("--hang-seconds", type=float, default=600.0)
+    parser.add_argument("--fail-model", action="append", default=[], help="always fail this model (repeatable)")
+    parser.add_argument("--hang-model", action="append", default=[], help="always hang this model (repeatable)")
+    parser.add_argument("--verbose", action="store_true")
+    server = serve(parser.parse_args())
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -2,6 +2,8 @@ import streamlit as st
 import requests
 import pandas as pd
 import os
+import time
+from datetime import timedelta
 
 # Configuration - Support both Streamlit Cloud secrets and local env vars
 def get_config(key, default):
@@ -40,25 +42,52 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # Helper Functions
-def fetch_conversations():
+def fetch_page(path, what, params=None):
+    """One page of a cursor-paginated list: (items, next_cursor). Empty filters are dropped."""
+    params = {k: v for k, v in (params or {}).items() if v not in (None, "", "All")}
     try:
-        resp = requests.get(f"{BACKEND_URL}/admin/conversations")
+        resp = requests.get(f"{BACKEND_URL}{path}", params=params)
         if resp.status_code == 200:
-            return resp.json()
-        return []
+            data = resp.json()
+            return data["items"], data.get("next_cursor")
+        return [], None
     except Exception as e:
-        st.error(f"Error fetching conversations: {e}")
-        return []
+        st.error(f"Error fetching {what}: {e}")
+        return [], None
 
-def fetch_orders():
-    try:
-        resp = requests.get(f"{BACKEND_URL}/admin/orders")
-        if resp.status_code == 200:
-            return resp.json()
-        return []
-    except Exception as e:
-        st.error(f"Error fetching orders: {e}")
-        return []
+def page_cursor(key, filters):
+    """Cursor for the page being viewed; going back to page 1 when the filters change."""
+    if st.session_state.get(f"{key}_filters") != filters:
+        st.session_state[f"{key}_filters"] = filters
+        st.session_state[f"{key}_cursors"] = [None]
+    return st.session_state[f"{key}_cursors"][-1]
+
+def pager(key, next_cursor):
+    """Previous / Next buttons; the cursors of the pages visited are kept in session state."""
+    cursors = st.session_state[f"{key}_cursors"]
+    col_prev, col_page, col_next = st.columns([1, 2, 1])
+    if col_prev.button("◀ Previous", key=f"{key}_prev", disabled=len(cursors) == 1):
+        cursors.pop()
+        st.rerun()
+    col_page.markdown(f"<div style='text-align: center'>Page {len(cursors)}</div>", unsafe_allow_html=True)
+    if col_next.button("Next ▶", key=f"{key}_next", disabled=not next_cursor):
+        cursors.append(next_cursor)
+        st.rerun()
+
+def date_filters(key):
+    """Optional From / To date inputs, as ISO datetimes for the since / until filters."""
+    col_from, col_to = st.columns(2)
+    start = col_from.date_input("From", value=None, key=f"{key}_from")
+    end = col_to.date_input("To (inclusive)", value=None, key=f"{key}_to")
+    since = f"{start.isoformat()}T00:00:00" if start else None
+    until = f"{(end + timedelta(days=1)).isoformat()}T00:00:00" if end else None
+    return since, until
+
+def fetch_conversations(params=None):
+    return fetch_page("/admin/conversations", "conversations", params)
+
+def fetch_orders(params=None):
+    return fetch_page("/admin/orders", "orders", params)
 
 def update_order_status(order_id, status):
     try:
@@ -84,14 +113,70 @@ def create_product(product_data):
         st.error(f"Error creating product: {e}")
         return None
 
-def fetch_products():
+def fetch_enrichment(product_id):
     try:
-        resp = requests.get(f"{BACKEND_URL}/products/")
+        resp = requests.get(f"{BACKEND_URL}/products/{product_id}/enrichment")
         if resp.status_code == 200:
             return resp.json()
+        st.error(f"Failed to fetch enrichment status: {resp.text}")
+    except Exception as e:
+        st.error(f"Error fetching enrichment status: {e}")
+    return None
+
+def retry_enrichment(product_id):
+    try:
+        resp = requests.post(f"{BACKEND_URL}/products/{product_id}/enrichment")
+        if resp.status_code == 200:
+            st.success("Enrichment queued again.")
+        else:
+            st.error(f"Failed to queue enrichment: {resp.text}")
+    except Exception as e:
+        st.error(f"Error queueing enrichment: {e}")
+
+def show_enrichment_progress(product_id, timeout=90, interval=1.5):
+    """Polls the product's enrichment status in place until it finishes (or `timeout` seconds pass)."""
+    placeholder = st.empty()
+    deadline = time.time() + timeout
+    while True:
+        status = fetch_enrichment(product_id)
+        if status is None:
+            return None
+        state = status["enrichment_status"]
+        job = status.get("job") or {}
+        with placeholder.container():
+            if state == "done":
+                st.success(f"✨ Product #{product_id} enriched and indexed.")
+                if status.get("visual_description"):
+                    st.info(f"✨ AI Visual Description: {status['visual_description']}")
+                else:
+                    st.warning("No visual description generated (or image missing).")
+            elif state == "failed":
+                st.error(f"Enrichment failed after {job.get('attempts')} attempt(s): {job.get('last_error')}")
+            elif time.time() > deadline:
+                st.info("Still enriching in the background; the description will show up under View Products.")
+            else:
+                st.info(f"⏳ Enriching product #{product_id}: {state} "
+                        f"(last step: {job.get('step') or 'none yet'}, attempt {job.get('attempts') or 0})")
+                if job.get("last_error"):
+                    st.caption(f"Retrying after: {job['last_error']}")
+        if state in ("done", "failed") or time.time() > deadline:
+            return state
+        time.sleep(interval)
+
+def fetch_products(params=None):
+    return fetch_page("/products/", "products", params)
+
+def search_products(query, params=None):
+    """Full-text search hits (best first), with highlighted snippets."""
+    params = {k: v for k, v in (params or {}).items() if v not in (None, "", "All")}
+    try:
+        resp = requests.get(f"{BACKEND_URL}/products/search", params={**params, "q": query, "limit": 50})
+        if resp.status_code == 200:
+            return resp.json()["items"]
+        st.error(f"Search failed: {resp.json().get('detail', resp.text)}")
         return []
     except Exception as e:
-        st.error(f"Error fetching products: {e}")
+        st.error(f"Error searching products: {e}")
         return []
 
 def upload_image(file):
@@ -145,28 +230,45 @@ else:
     if page == "Dashboard":
         st.title("📊 Admin Dashboard")
         
-        convs = fetch_conversations()
+        with st.expander("Filters"):
+            fcol1, fcol2 = st.columns(2)
+            platform = fcol1.selectbox("Platform", ["All", "general", "whatsapp", "web"])
+            customer = fcol2.text_input("Customer phone or email")
+            since, until = date_filters("convs")
+        filters = {"platform": platform, "customer": customer.strip(), "since": since, "until": until}
+        cursor = page_cursor("convs", filters)
+        convs, next_cursor = fetch_conversations({**filters, "cursor": cursor})
         
-        col1, col2 = st.columns(2)
+        col1, col2, col3 = st.columns(3)
         with col1:
-            st.metric("Active Conversations", len(convs))
+            st.metric("Conversations (this page)", len(convs))
         with col2:
+            st.metric("Messages", sum(c.get("message_count") or 0 for c in convs))
+        with col3:
             st.metric("System Status", "Online 🟢")
 
         st.subheader("Recent Conversations")
         if convs:
             df = pd.DataFrame(convs)
             # Simplify display
-            display_df = df[['id', 'customer', 'platform', 'summary', 'last_active']]
+            display_df = df[['id', 'customer', 'platform', 'message_count', 'last_sender', 'summary', 'last_active']]
             st.dataframe(display_df, use_container_width=True)
         else:
             st.info("No active conversations found.")
+        pager("convs", next_cursor)
 
     # --- ORDER VERIFICATION ---
     elif page == "Order Verification":
         st.title("📦 Order Verification")
         
-        orders = fetch_orders()
+        with st.expander("Filters"):
+            fcol1, fcol2 = st.columns(2)
+            status_filter = fcol1.selectbox("Status", ["All", "pending", "paid", "shipped", "delivered", "cancelled", "returned"])
+            customer_id = fcol2.number_input("Customer ID", min_value=0, step=1, help="0 = all customers")
+            since, until = date_filters("orders")
+        filters = {"status": status_filter, "customer_id": customer_id or None, "since": since, "until": until}
+        cursor = page_cursor("orders", filters)
+        orders, next_cursor = fetch_orders({**filters, "cursor": cursor})
         
         if orders:
             for order in orders:
@@ -197,6 +299,7 @@ else:
                                 update_order_status(order['id'], 'cancelled')
         else:
             st.info("No orders found.")
+        pager("orders", next_cursor)
 
     # --- PRODUCT MANAGEMENT ---
     elif page == "Product Management":
@@ -212,8 +315,14 @@ else:
                 st.session_state.product_added = False
             
             if st.session_state.product_added:
+                product_id = st.session_state.get("enriching_product_id")
+                if product_id and show_enrichment_progress(product_id) == "failed":
+                    if st.button("🔁 Retry Enrichment"):
+                        retry_enrichment(product_id)
+                        st.rerun()
                 if st.button("🔄 Add Another Product"):
                     st.session_state.product_added = False
+                    st.session_state.enriching_product_id = None
                     st.rerun()
                 st.info("Reload to add a new product.")
             else:
@@ -254,36 +363,52 @@ else:
                                 "image_url": image_url
                             }
                             
-                            with st.spinner("Creating product and generating description..."):
+                            with st.spinner("Creating product..."):
                                 result = create_product(product_data)
                             
                             if result:
                                  st.balloons()
                                  st.session_state.product_added = True
-                                 
-                                 st.success("Product Created!")
-                                 st.subheader("Generated Details:")
-                                 st.json(result)
-                                 
-                                 if result.get("visual_description"):
-                                     st.info(f"✨ AI Visual Description: {result['visual_description']}")
-                                 else:
-                                     st.warning("No visual description generated (or image missing).")
-                                     
+                                 # Description, embedding and indexing run in the background; polled above
+                                 st.session_state.enriching_product_id = result["id"]
                                  st.rerun()
 
         with tab2:
             st.header("Product Inventory")
-            products = fetch_products()
-            if products:
-                # Convert to DataFrame for better display
-                df = pd.DataFrame(products)
-                
-                # Reorder columns if they exist
-                cols = ['id', 'name', 'category', 'price', 'stock_quantity', 'visual_description']
-                existing_cols = [c for c in cols if c in df.columns]
-                other_cols = [c for c in df.columns if c not in existing_cols]
-                
-                st.dataframe(df[existing_cols + other_cols], use_container_width=True)
+            search = st.text_input("Search", placeholder="Name, description, category or look, e.g. red linen dress")
+            fcol1, fcol2 = st.columns(2)
+            category_filter = fcol1.text_input("Category filter", placeholder="e.g. suit, dress, shirt")
+            availability = fcol2.selectbox("Availability", ["All", "Available", "Unavailable"])
+            filters = {
+                "category": category_filter.strip(),
+                "available": {"Available": "true", "Unavailable": "false"}.get(availability)
+            }
+            if search.strip():
+                # Search ranks by relevance (no pages); it can only narrow to available products
+                only_available = "true" if availability == "Available" else None
+                hits = search_products(search.strip(), {"category": filters["category"], "available": only_available})
+                if hits:
+                    st.caption(f"{len(hits)} best matches")
+                    for hit in hits:
+                        st.markdown(f"**#{hit['id']} {hit['name']}** · {hit['category']} · ${hit['price']}"
+                                    + ("" if hit["is_available"] else " · unavailable"))
+                        if hit.get("snippet"):
+                            st.caption(hit["snippet"])
+                else:
+                    st.info("No products match your search.")
             else:
-                st.info("No products found in the database. Add some!")
+                cursor = page_cursor("products", filters)
+                products, next_cursor = fetch_products({**filters, "cursor": cursor})
+                if products:
+                    # Convert to DataFrame for better display
+                    df = pd.DataFrame(products)
+                    
+                    # Reorder columns if they exist
+                    cols = ['id', 'name', 'category', 'price', 'stock_quantity', 'enrichment_status', 'visual_description']
+                    existing_cols = [c for c in cols if c in df.columns]
+                    other_cols = [c for c in df.columns if c not in existing_cols]
+                    
+                    st.dataframe(df[existing_cols + other_cols], use_container_width=True)
+                else:
+                    st.info("No products found in the database. Add some!")
+                pager("products", next_cursor)
@@ -0,0 +1,104 @@
+"""
+Bulk catalog import from the command line (see backend/services/catalog_import.py).
+Reads the file in place, in batched transactions; new products get enrichment
+jobs, which the API's enrichment workers pick up (or this process, with --workers).
+
+Usage:
+    python import_catalog.py supplier.csv                  # duplicates (SKU, else name) are skipped
+    python import_catalog.py supplier.jsonl --mode update  # duplicates update the existing product
+    python import_catalog.py supplier.csv --workers 4      # also run 4 enrichment workers until done
+    python import_catalog.py --resume 12                   # continue an interrupted import (--force right after a crash)
+    python import_catalog.py --status 12                   # progress and the first row errors
+"""
+import argparse
+import sys
+import time
+from backend.database import engine, Base, SessionLocal
+from backend import models # register tables for create_all
+from backend.services.catalog_import import catalog_importer, import_summary
+from backend.services.product_enrichment import enrichment_queue
+
+
+def print_progress(summary):
+    progress = f"{summary['progress']:.0%}" if summary["progress"] is not None else "?"
+    print(f"  row {summary['rows_done']:>8} ({progress:>4})  inserted {summary['inserted']}  updated {summary['updated']}  "
+          f"duplicates {summary['duplicates']}  invalid {summary['invalid']}", flush=True)
+
+
+def print_errors(import_id: int, limit: int = 20):
+    with SessionLocal() as db:
+        errors = db.query(models.CatalogImportError).filter_by(import_id=import_id) \
+            .order_by(models.CatalogImportError.row_number).limit(limit).all()
+        for e in errors:
+            print(f"  row {e.row_number}: {e.error}")
+
+
+def wait_for_enrichment(poll_seconds: float = 2.0):
+    while True:
+        stats = enrichment_queue.stats()
+        pending = stats["jobs"]["pending"] + stats["jobs"]["processing"]
+        print(f"  enrichment: {pending} queued, {stats['completed']} done, {stats['failed']} failed", flush=True)
+        if not pending:
+            return
+        time.sleep(poll_seconds)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", nargs="?", help="catalog file (.csv, .jsonl, .ndjson)")
+    parser.add_argument("--mode", choices=["skip", "update"], default="skip")
+    parser.add_argument("--batch-size", type=int, default=None)
+    parser.add_argument("--workers", type=int, default=0, help="enrichment workers to run here until the queue drains")
+    parser.add_argument("--resume", type=int, metavar="IMPORT_ID")
+    parser.add_argument("--force", action="store_true", help="resume even if the import looks like it's still running")
+    parser.add_argument("--status", type=int, metavar="IMPORT_ID")
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    if args.status is not None:
+        with SessionLocal() as db:
+            imp = db.get(models.CatalogImport, args.status)
+            if imp is None:
+                sys.exit(f"Import {args.status} not found")
+            summary = import_summary(imp)
+        print(f"Import {summary['id']} ({summary['filename']}): {summary['status']}" + (f" - {summary['error']}" if summary["error"] else ""))
+        print_progress(summary)
+        print_errors(args.status)
+        return
+
+    if args.batch_size:
+        catalog_importer.batch_size = args.batch_size
+    if args.resume is not None:
+        try:
+            catalog_importer.check_resumable(args.resume, force=args.force)
+        except (LookupError, ValueError) as e:
+            sys.exit(str(e))
+        import_id = args.resume
+    elif args.path:
+        try:
+            import_id = catalog_importer.create(args.path, args.path, args.mode)
+        except (OSError, ValueError) as e:
+            sys.exit(str(e))
+        print(f"Import {import_id}: {args.path} ({args.mode} duplicates)")
+    else:
+        parser.error("a catalog path, --resume or --status is required")
+
+    if args.workers:
+        enrichment_queue.start(args.workers)
+    started = time.perf_counter()
+    summary = catalog_importer.run(import_id, progress=print_progress)
+    elapsed = time.perf_counter() - started
+    print(f"Import {import_id} {summary['status']} in {elapsed:.1f}s ({summary['rows_done'] / max(elapsed, 1e-9):.0f} rows/s)")
+    if summary["error"]:
+        print(f"  {summary['error']}\n  Fix the cause and run: python import_catalog.py --resume {import_id}")
+    if summary["invalid"]:
+        print(f"First row errors (all of them: python import_catalog.py --status {import_id}):")
+        print_errors(import_id, limit=10)
+    if args.workers:
+        wait_for_enrichment()
+        enrichment_queue.stop()
+    sys.exit(0 if summary["status"] == "done" else 1)
+
+
+if __name__ == "__main__":
+    main()
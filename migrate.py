@@ -0,0 +1,37 @@
+"""
+Versioned database migrations (see backend/migrations).
+
+Usage:
+    python migrate.py              # apply all pending migrations
+    python migrate.py --status     # list migrations and whether they're applied
+    python migrate.py --to 5       # apply up to version 5
+
+Re-running after an interruption resumes a half-done backfill where it stopped.
+"""
+import argparse
+from backend.database import engine, Base
+from backend import models # register tables for create_all
+from backend.migrations.runner import MigrationRunner
+from backend.migrations.versions import MIGRATIONS
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--status", action="store_true")
+    parser.add_argument("--to", type=int, default=None, help="target version")
+    args = parser.parse_args()
+
+    runner = MigrationRunner(engine, MIGRATIONS)
+    if args.status:
+        for m in runner.status():
+            state = f"applied {m['applied_at']}" if m["applied_at"] else "pending"
+            if m["backfill_last_key"] is not None:
+                state += f" (backfill at key {m['backfill_last_key']})"
+            print(f"{m['version']:04d}  {m['name']:<62} {state}")
+        return
+
+    # Missing tables are created at the current schema; migrations then only alter older ones
+    Base.metadata.create_all(bind=engine)
+    runner.upgrade(args.to)
+
+if __name__ == "__main__":
+    main()
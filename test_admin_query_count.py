@@ -0,0 +1,128 @@
+"""
+Query-count regression test for the admin list endpoints
+Seeds a throwaway SQLite database and checks that listing conversations and
+orders runs the same number of SQL statements for a 1-row page as for a
+200-row page (no per-row lookups creeping back in).
+
+Run: python test_admin_query_count.py   (or: python -m pytest test_admin_query_count.py)
+"""
+import os
+import tempfile
+
+_tmp_dir = tempfile.mkdtemp(prefix="crm_test_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp_dir, 'test.db')}"
+os.environ.setdefault("GROQ_API_KEY", "test")
+os.environ.setdefault("SECRET_KEY", "test")
+os.environ["DATABASE_REPLICA_URL"] = ""
+
+from sqlalchemy import event
+
+PAGE_SIZES = (1, 10, 50, 200)
+_client = None
+
+
+class StatementCounter:
+    def __init__(self, engine):
+        self.statements = []
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+
+def setup_database(num_customers: int = 250):
+    from backend.database import Base, engine, SessionLocal
+    from backend.models import User, Conversation, Message, Order
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        for i in range(num_customers):
+            user = User(full_name=f"Customer {i}", phone_number=f"+1555{i:06d}", email=f"customer{i}@example.com")
+            db.add(user)
+            db.flush()
+            conv = Conversation(customer_id=user.id, platform="whatsapp" if i % 2 else "general", summary=f"Summary {i}")
+            db.add(conv)
+            db.flush()
+            messages = [
+                Message(conversation_id=conv.id, sender="user" if j % 2 == 0 else "agent", content=f"message {j}")
+                for j in range(3)
+            ]
+            db.add_all(messages)
+            db.flush()
+            conv.message_count = len(messages)
+            conv.last_message_id = messages[-1].id
+            db.add(Order(customer_id=user.id, total_amount=10.0 + i))
+        # A conversation whose customer row is gone still lists, as "Unknown"
+        db.add(Conversation(customer_id=10_000_000, platform="general"))
+        db.commit()
+    finally:
+        db.close()
+
+
+def get_client():
+    global _client
+    if _client is None:
+        from fastapi.testclient import TestClient
+        from backend.main import app
+
+        setup_database()
+        _client = TestClient(app)
+    return _client
+
+
+def count_statements(path: str, limit: int):
+    from backend.database import async_engine
+
+    client = get_client()
+    client.get(path, params={"limit": 1}) # warm up: connection opened, pragmas set
+    counter = StatementCounter(async_engine.sync_engine)
+    try:
+        resp = client.get(path, params={"limit": limit})
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", counter._on_execute)
+    assert resp.status_code == 200, resp.text
+    return len(resp.json()["items"]), counter.statements
+
+
+def assert_constant_statements(path: str):
+    counts = {}
+    for limit in PAGE_SIZES:
+        items, statements = count_statements(path, limit)
+        assert items == limit, (path, limit, items)
+        counts[limit] = len(statements)
+    assert len(set(counts.values())) == 1, f"{path}: statements per page size {counts}"
+    assert counts[PAGE_SIZES[0]] == 1, f"{path}: expected a single SELECT per page, got {statements}"
+    print(f"  {path}: {counts[PAGE_SIZES[0]]} statement(s) for pages of {', '.join(map(str, PAGE_SIZES))} rows")
+
+
+def test_conversation_list_query_count():
+    assert_constant_statements("/api/v1/admin/conversations")
+
+
+def test_conversation_list_content():
+    client = get_client()
+    items = client.get("/api/v1/admin/conversations", params={"limit": 200, "platform": "whatsapp"}).json()["items"]
+    assert items and all(item["platform"] == "whatsapp" for item in items)
+    assert all(item["last_sender"] == "user" and item["message_count"] == 3 for item in items)
+    assert all(item["customer"].startswith("Customer ") for item in items)
+
+    orphan = client.get("/api/v1/admin/conversations", params={"limit": 1}).json()["items"][0]
+    assert orphan["customer"] == "Unknown (N/A)" and orphan["last_sender"] is None
+
+    by_phone = client.get("/api/v1/admin/conversations", params={"customer": "+1555000007"}).json()["items"]
+    assert [item["customer"] for item in by_phone] == ["Customer 7 (+1555000007)"]
+
+
+def test_order_list_query_count():
+    assert_constant_statements("/api/v1/admin/orders")
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("Admin list endpoints: query counts")
+    print("=" * 60)
+    test_conversation_list_query_count()
+    test_conversation_list_content()
+    test_order_list_query_count()
+    print("All checks passed")
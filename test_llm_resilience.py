@@ -0,0 +1,99 @@
+"""
+Circuit breaker regression test for ResilientCaller
+Opens the breaker, lets it go half-open and then cancels the trial call (the way
+an SSE client disconnecting cancels a chat stream). The breaker must re-open with
+a fresh reset period instead of staying half-open, which would short-circuit every
+later call to the canned reply.
+
+Run: python test_llm_resilience.py   (or: python -m pytest test_llm_resilience.py)
+"""
+import asyncio
+import os
+import time
+
+os.environ.setdefault("GROQ_API_KEY", "test")
+os.environ.setdefault("SECRET_KEY", "test")
+
+RESET_SECONDS = 0.05
+
+
+def make_caller():
+    from backend.llm.resilience import ResilientCaller
+    caller = ResilientCaller("test", deadline_seconds=1, hedge=False, failure_threshold=1, reset_seconds=RESET_SECONDS)
+    caller.breaker.record_failure()
+    assert caller.breaker.state == "open"
+    time.sleep(RESET_SECONDS * 1.5)
+    return caller
+
+
+async def ok():
+    return "ok"
+
+
+async def hang():
+    await asyncio.sleep(10)
+    return "late"
+
+
+def test_cancelled_trial_call_reopens():
+    async def run():
+        caller = make_caller()
+        trial = asyncio.ensure_future(caller.call(hang, canned="canned"))
+        await asyncio.sleep(0.01)
+        assert caller.breaker.state == "half_open"
+        trial.cancel()
+        try:
+            await trial
+        except asyncio.CancelledError:
+            pass
+        assert caller.breaker.state == "open", caller.breaker.state
+
+        await asyncio.sleep(RESET_SECONDS * 1.5)
+        replies = [await caller.call(ok, canned="canned") for _ in range(3)]
+        assert replies == ["ok", "ok", "ok"], replies
+        assert caller.breaker.state == "closed"
+    asyncio.run(run())
+
+
+def test_stream_closed_before_first_chunk_reopens():
+    async def tokens():
+        await asyncio.sleep(10)
+        yield "never"
+
+    async def run():
+        caller = make_caller()
+        stream = caller.stream(tokens, canned="canned")
+        first = asyncio.ensure_future(stream.__anext__())
+        await asyncio.sleep(0.01)
+        assert caller.breaker.state == "half_open"
+        first.cancel()
+        try:
+            await first
+        except asyncio.CancelledError:
+            pass
+        assert caller.breaker.state == "open", caller.breaker.state
+    asyncio.run(run())
+
+
+def test_stream_closed_after_chunks_closes():
+    async def tokens():
+        for token in ("a", "b", "c"):
+            yield token
+
+    async def run():
+        caller = make_caller()
+        stream = caller.stream(tokens, canned="canned")
+        assert await stream.__anext__() == "a"
+        await stream.aclose() # client disconnected mid-stream
+        assert caller.breaker.state == "closed", caller.breaker.state
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("LLM circuit breaker: cancelled half-open trials")
+    print("=" * 60)
+    test_cancelled_trial_call_reopens()
+    test_stream_closed_before_first_chunk_reopens()
+    test_stream_closed_after_chunks_closes()
+    print("All checks passed")